@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark the evaluator end to end, offline: a seeded synthetic market provides the prices
+of thousands of tickers (holidays, listings, delistings, gaps, NaN runs, unknown symbols),
+they are downloaded into a temporary price store, `main1` computes the entry and horizon prices
+of the mentions and `main2` the returns of every horizon, against the per-row `apply` of the
+return info CSV it replaced.
+
+Usage:
+    python -m bench.bench_evaluator [tickers] [mentions] [seed]
+"""
+import ast
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from evaluator import evaluate_mentions, get_stock_info, main2
+from service.price_providers import SyntheticMarket, trading_calendar
+from service.prices import PriceStore
+
+
+NDAYS_LIST = [7, 14, 30, 45, 60, 90]
+
+
+def make_mentions(tickers, count, seed=1):
+    rng = np.random.default_rng(seed)
+    days = trading_calendar("2023-01-01", "2025-01-01").strftime("%Y%m%d").astype(int)
+    return pd.DataFrame({
+        "stock": rng.choice(tickers, count),
+        "stock_code": rng.choice(tickers, count),
+        "date": rng.choice(days, count),
+        "opinion": rng.choice(["positive", "neutral", "negative"], count, p=[0.6, 0.3, 0.1]),
+    })
+
+
+def legacy_main2(df, ndays_list):
+    """
+    The returns of the return info CSV, row by row, as `main2` computed them before the return matrix.
+    """
+    df = df.copy()
+    df['price_list'] = df['price_list'].apply(ast.literal_eval)
+    df['return_list'] = df.apply(
+        lambda row: [
+            round((p - row['price_on_mentioned']) / row['price_on_mentioned'] * 100, 2)
+            if p is not None and row['price_on_mentioned'] not in (None, 0)
+            else None
+            for p in row['price_list']
+        ], axis=1)
+    for i, n in enumerate(ndays_list):
+        df[f'nday_{n}_r'] = df['return_list'].apply(lambda x: x[i] if i < len(x) else None)
+    return df
+
+
+def main(tickers=2000, mentions=100000, seed=0):
+    market = SyntheticMarket(seed=seed)
+    names = market.tickers(tickers)
+    df = make_mentions(names, mentions, seed + 1)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = PriceStore(os.path.join(tmp, "prices"))
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            get_stock_info(names, start_date="2022-12-01", end_date="2025-06-01", store=store, provider=market)
+        download = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            matrix = evaluate_mentions(df, NDAYS_LIST, store=store, missing_file=os.path.join(tmp, "none.json"))
+        evaluation = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            main2(matrix, os.path.join(tmp, "return_info2.csv"))
+        returns = time.perf_counter() - start
+
+        legacy_csv = os.path.join(tmp, "return_info.csv")
+        pd.DataFrame(matrix.to_records()).to_csv(legacy_csv, index=False, encoding='utf-8-sig')
+        start = time.perf_counter()
+        legacy_main2(pd.read_csv(legacy_csv, encoding='utf-8-sig'), NDAYS_LIST)
+        legacy = time.perf_counter() - start
+
+        # a second download finds everything in the store
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            get_stock_info(names, start_date="2022-12-01", end_date="2025-06-01", store=store, provider=market)
+        cached = time.perf_counter() - start
+        stored = len(store)
+
+    print(f"{tickers:,} synthetic tickers ({stored:,} with prices), {mentions:,} mentions x {len(NDAYS_LIST)} horizons")
+    print(f"download into the store: {download:8.3f}s, again from the cache: {cached:.3f}s")
+    print(f"main1:                   {evaluation:8.3f}s for {len(matrix):,} mentions "
+          f"({len(matrix) / evaluation:,.0f} mentions/s)")
+    print(f"main2:                   {returns:8.3f}s including the CSV, legacy per-row apply: {legacy:.3f}s "
+          f"({legacy / returns:.0f}x)")
+    return download, evaluation
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(*args)
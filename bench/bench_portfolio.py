@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark the portfolio backtest offline: the mentions of several channels over several years
+on a seeded synthetic market are evaluated, then a grid of rules (opinion, source, holding
+period, weighting) is simulated over the same aligned closes.
+
+Usage:
+    python -m bench.bench_portfolio [tickers] [mentions] [years] [channels]
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from evaluator import evaluate_mentions, get_stock_info
+from service.portfolio import PortfolioBacktest, PortfolioRules
+from service.price_providers import SyntheticMarket, trading_calendar
+from service.prices import PriceStore
+
+
+def make_mentions(tickers, count, start, end, channels, seed=1):
+    rng = np.random.default_rng(seed)
+    days = trading_calendar(start, end).strftime("%Y%m%d").astype(int)
+    return pd.DataFrame({
+        "stock_code": rng.choice(tickers, count),
+        "date": rng.choice(days, count),
+        "opinion": rng.choice(["positive", "neutral", "negative"], count, p=[0.6, 0.3, 0.1]),
+        "source": rng.choice(["host", "quoted"], count, p=[0.7, 0.3]),
+        "channel": rng.choice([f"channel{i}" for i in range(channels)], count),
+    })
+
+
+def make_rules():
+    rules = []
+    for holding_days in (7, 30, 90):
+        for weighting in ("equal", "conviction"):
+            rules.append(PortfolioRules(holding_days=holding_days, weighting=weighting))
+            rules.append(PortfolioRules(opinions=("positive", "negative"), sources=None, holding_days=holding_days,
+                                        weighting=weighting, cost_bps=5))
+    return rules
+
+
+def main(tickers=2000, mentions=100000, years=5, channels=4):
+    start, end = "2019-01-01", f"{2019 + years}-01-01"
+    market = SyntheticMarket(seed=0)
+    names = market.tickers(tickers)
+    df = make_mentions(names, mentions, start, end, channels)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = PriceStore(os.path.join(tmp, "prices"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            get_stock_info(names, start_date=start, end_date=f"{2019 + years}-06-01", store=store, provider=market)
+            matrix = evaluate_mentions(df, [30], store=store, missing_file=os.path.join(tmp, "none.json"))
+
+        begin = time.perf_counter()
+        backtest = PortfolioBacktest(df, matrix, store)
+        setup = time.perf_counter() - begin
+
+        rules = make_rules()
+        begin = time.perf_counter()
+        summary = backtest.compare(rules)
+        simulation = time.perf_counter() - begin
+
+    print(f"{mentions:,} mentions of {channels} channels over {years} years, "
+          f"{len(backtest.dates):,} days x {len(backtest.tickers):,} tickers")
+    print(f"align the closes: {setup:.3f}s")
+    print(f"{len(rules)} rules:         {simulation:.3f}s ({simulation / len(rules) * 1000:.0f} ms per rule)")
+    with pd.option_context("display.width", 200, "display.max_columns", 20):
+        print(summary[["trades", "total_return", "annual_volatility", "max_drawdown", "avg_turnover"]].round(3))
+    return setup, simulation
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(*args)
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Report the token reduction and the recall of the candidate-mention prefilter.
+The labeled sample is the most recent share of the videos that have both a cleaned transcript
+and a full-transcript extraction; the dictionary is built from the older extractions only, as
+it would be when new videos come in. Without local data, a synthetic sample is used.
+
+Usage:
+    python -m bench.bench_prefilter [model] [holdout_fraction]
+"""
+import json
+import os
+import random
+import sys
+import time
+
+from service.prefilter import Prefilter, evaluate, load_dictionary
+
+
+FILLER = ("welcome back to the channel today we are going to talk about the economy the fed "
+          "inflation rates and what it means for you this video is sponsored by our partner "
+          "please like and subscribe so basically you know the macro picture is really").split()
+COMPANIES = [("Tesla", "TSLA"), ("Nvidia", "NVDA"), ("Apple", "AAPL"), ("Palantir", "PLTR"),
+             ("Microsoft", "MSFT"), ("Amazon", "AMZN"), ("Meta", "META"), ("Broadcom", "AVGO")]
+
+
+def load_samples(model, cleaned_dir="output/cleaned", extracted_dir="output/extracted"):
+    """
+    Load the (video_id, transcript, mentions) samples extracted with `model`, oldest first.
+    """
+    samples = []
+    if not os.path.isdir(cleaned_dir):
+        return samples
+    for file in sorted(os.listdir(cleaned_dir)):
+        if not file.endswith(".txt"):
+            continue
+        video_id = file.split(".")[0]
+        extracted = os.path.join(extracted_dir, f"{video_id}_{model}.json")
+        if not os.path.exists(extracted):
+            continue
+        with open(os.path.join(cleaned_dir, file), "r", encoding="utf-8") as f:
+            text = f.read().strip()
+        with open(extracted, "r", encoding="utf-8") as f:
+            mentions = json.load(f)
+        samples.append((video_id, text, [m for m in mentions if isinstance(m, dict)]))
+    return samples
+
+
+def make_synthetic_samples(count=40, words=6000, seed=0):
+    """
+    Build transcripts of mostly macro talk with a few stock mentions, and their labels.
+    Returns:
+        tuple: (samples, dictionary terms)
+    """
+    rng = random.Random(seed)
+    samples = []
+    for idx in range(count):
+        tokens = [rng.choice(FILLER) for _ in range(words)]
+        mentions = []
+        if idx % 5:  # one video in five has no stock at all
+            for name, ticker in rng.sample(COMPANIES, rng.randint(1, 3)):
+                quote = f"i think {name.lower()} is a great long term bet"
+                tokens.insert(rng.randrange(len(tokens)), quote)
+                mentions.append({"stock": name, "stock_code": ticker, "quote": quote})
+        samples.append((f"synthetic_{idx:03d}", " ".join(tokens), mentions))
+    terms = {name.lower(): ("company", ticker) for name, ticker in COMPANIES}
+    return samples, terms
+
+
+def main(model="gpt-4.1-mini", holdout=0.2):
+    samples = load_samples(model)
+    if samples:
+        split = max(1, int(len(samples) * (1 - holdout)))
+        sample = samples[split:] or samples[-1:]
+        exclude = {f"{video_id}_{model}.json" for video_id, _, _ in sample}
+        terms = load_dictionary(exclude=exclude)
+        print(f"Labeled sample: {len(sample)} of {len(samples)} videos extracted with {model}, "
+              f"dictionary of {len(terms)} terms from the others")
+    else:
+        sample, terms = make_synthetic_samples()
+        print(f"No local extractions for {model}, using {len(sample)} synthetic transcripts")
+
+    prefilter = Prefilter(terms)
+    start = time.perf_counter()
+    report = evaluate(prefilter, sample, model)
+    elapsed = time.perf_counter() - start
+    size_mb = sum(len(text.encode("utf-8")) for _, text, _ in sample) / 1024 / 1024
+
+    print(f"Transcripts: {report['transcripts']}, skipped (no candidate): {report['skipped']}")
+    print(f"Tokens: {report['original_tokens']} -> {report['filtered_tokens']} "
+          f"({report['token_reduction']:.1%} reduction)")
+    print(f"Recall: {report['recalled']}/{report['mentions']} mentions ({report['recall']:.1%})")
+    print(f"Prefilter speed: {size_mb / elapsed:.1f} MB/s")
+    for video_id, stock, ticker in report["missed"][:20]:
+        print(f"  missed {video_id}: {stock} ({ticker})")
+    return report
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(args[0] if args else "gpt-4.1-mini", float(args[1]) if len(args) > 1 else 0.2)
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark loading the prices of one ticker: the grouped CSV files (parse the whole group,
+then `xs` the ticker) against the per-ticker memory-mapped store.
+The groups are synthetic yfinance downloads of 20 tickers each.
+
+Usage:
+    python -m bench.bench_prices [tickers] [days] [lookups]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from service.prices import PriceStore, migrate_group_csv
+
+
+def make_group(tickers, days, seed):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2020-01-01", periods=days)
+    columns = pd.MultiIndex.from_product([["Close", "High", "Low", "Open", "Volume"], tickers],
+                                         names=["Price", "Ticker"])
+    values = rng.uniform(10, 100, size=(days, len(columns))).round(2)
+    return pd.DataFrame(values, index=pd.Index(dates, name="Date"), columns=columns)
+
+
+def main(tickers=400, days=1300, lookups=100):
+    names = [f"T{i:04d}" for i in range(tickers)]
+    groups = [names[i:i + 20] for i in range(0, tickers, 20)]
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for idx, group in enumerate(groups):
+            paths.append(os.path.join(tmp, f"stock_group{idx}_2025_06_08_00_47_58.csv"))
+            make_group(group, days, idx).to_csv(paths[-1], encoding="utf-8-sig")
+        store = PriceStore(os.path.join(tmp, "prices"))
+        start = time.perf_counter()
+        migrate_group_csv(paths, store)
+        migration = time.perf_counter() - start
+
+        rng = random.Random(0)
+        queries = [rng.randrange(tickers) for _ in range(lookups)]
+        start = time.perf_counter()
+        for q in queries:
+            df = pd.read_csv(paths[q // 20], header=[0, 1], index_col=0, encoding="utf-8-sig")
+            df.xs(key=names[q], level=1, axis=1)
+        csv_time = (time.perf_counter() - start) / lookups
+
+        start = time.perf_counter()
+        for q in queries:
+            store.load(names[q])["close"]
+        load_time = (time.perf_counter() - start) / lookups
+
+        start = time.perf_counter()
+        for q in queries:
+            store.frame(names[q])
+        frame_time = (time.perf_counter() - start) / lookups
+
+    print(f"{tickers} tickers x {days} days, migrated in {migration:.2f}s")
+    print(f"group CSV + xs: {csv_time * 1000:8.3f} ms/ticker")
+    print(f"store load:     {load_time * 1000:8.3f} ms/ticker ({csv_time / load_time:,.0f}x)")
+    print(f"store frame:    {frame_time * 1000:8.3f} ms/ticker ({csv_time / frame_time:,.0f}x)")
+    return csv_time, load_time
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(*args)
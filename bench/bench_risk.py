@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark the benchmark-relative and risk metrics of the mentions on a seeded synthetic market:
+`mention_metrics` over the cumulative log-return arrays against a slice of the price DataFrames
+per mention and horizon. The slices are timed on a sample of the mentions and extrapolated.
+
+Usage:
+    python -m bench.bench_risk [tickers] [mentions] [slice_sample]
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from bench.bench_evaluator import NDAYS_LIST, make_mentions
+from evaluator import evaluate_mentions, get_stock_info
+from service.price_providers import SyntheticMarket
+from service.prices import PriceStore
+from service.risk import DEFAULT_VOL_WINDOW, mention_metrics
+
+
+def sliced_metrics(matrix, frames, benchmark, rows):
+    """
+    The excess return, volatility-adjusted return and max adverse excursion of the mentions,
+    one DataFrame slice at a time.
+    """
+    out = np.full((len(rows), len(matrix.ndays), 3), np.nan)
+    for idx, i in enumerate(rows):
+        close = frames[matrix.tickers[i]]
+        entry = str(matrix.entry_dates[i])
+        before = np.diff(np.log(close[:entry].to_numpy()))[-DEFAULT_VOL_WINDOW:]
+        volatility = before.std(ddof=1) if len(before) >= 2 else np.nan
+        for j, n in enumerate(matrix.ndays):
+            if np.isnan(matrix.prices[i, j]):
+                continue
+            end = str(matrix.entry_dates[i] + n + matrix.extra_days[i, j])
+            window = close[entry:end]
+            ret = window.iloc[-1] / window.iloc[0] - 1
+            bench = benchmark[:end].iloc[-1] / benchmark[:entry].iloc[-1] - 1
+            out[idx, j] = ((ret - bench) * 100, np.log1p(ret) / (volatility * np.sqrt(len(window) - 1)),
+                           min(window.min() / window.iloc[0] - 1, 0) * 100)
+    return out
+
+
+def main(tickers=2000, mentions=100000, slice_sample=1000):
+    market = SyntheticMarket(seed=0)
+    names = market.tickers(tickers)
+    df = make_mentions(names, mentions)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = PriceStore(os.path.join(tmp, "prices"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            get_stock_info(names + ["SPY"], start_date="2022-06-01", end_date="2025-06-01", store=store,
+                           provider=market)
+            matrix = evaluate_mentions(df, NDAYS_LIST, store=store, missing_file=os.path.join(tmp, "none.json"))
+
+        start = time.perf_counter()
+        metrics = mention_metrics(matrix, store, "SPY")
+        vector_time = time.perf_counter() - start
+
+        rows = np.arange(min(slice_sample, len(matrix)))
+        frames = {t: store.frame(t)["Close"] for t in np.unique(matrix.tickers[rows])}
+        benchmark = store.frame("SPY")["Close"]
+        start = time.perf_counter()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sliced = sliced_metrics(matrix, frames, benchmark, rows)
+        slice_time = (time.perf_counter() - start) * len(matrix) / len(rows)
+
+    # the two paths agree on the sample
+    for k, name in enumerate(("excess_return", "vol_adjusted", "max_adverse_excursion")):
+        assert np.allclose(sliced[:, :, k], metrics[name][rows], equal_nan=True), name
+
+    print(f"{len(matrix):,} mentions x {len(NDAYS_LIST)} horizons over {tickers:,} synthetic tickers")
+    print(f"DataFrame slices:     {slice_time:9.3f}s (extrapolated from {len(rows):,} mentions)")
+    print(f"cumulative log arrays: {vector_time:8.3f}s ({slice_time / vector_time:,.0f}x)")
+    return slice_time, vector_time
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(*args)
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark the local ticker resolver.
+It builds a synthetic symbol master and resolves a mix of exact names, suffix variants,
+typos and unknown names, as extracted from the transcripts, with an empty resolution file.
+
+Usage:
+    python -m bench.bench_tickers [symbols] [names]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from service.tickers import SymbolIndex, TickerResolver
+
+
+SYLLABLES = ("ar ba co da el fi go ha in jo ka lu ma no pe qu ro sa ti vo wa xe yu ze "
+             "tron nex via gen bio net soft data med lab max cor").split()
+SUFFIXES = ("Inc.", "Corp.", "Corporation", "Holdings", "Group", "Ltd", "plc", "Technologies")
+
+
+def _base26(value, width=3):
+    return "".join(chr(65 + value // 26 ** i % 26) for i in reversed(range(width)))
+
+
+def make_master(count, seed=0):
+    rng = random.Random(seed)
+    names = set()
+    entries = []
+    while len(entries) < count:
+        base = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+        if rng.random() < 0.3:
+            base += " " + "".join(rng.choice(SYLLABLES) for _ in range(2)).capitalize()
+        if base in names:
+            continue
+        names.add(base)
+        ticker = "".join(c for c in base.upper() if c.isalpha())[:2] + _base26(len(entries))
+        entries.append({"name": f"{base} {rng.choice(SUFFIXES)}", "aliases": [], "ticker": ticker,
+                        "exchange": rng.choice(("NASDAQ", "NYSE"))})
+    return entries
+
+
+def make_queries(entries, count, seed=1):
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        entry = rng.choice(entries)
+        base = entry["name"].rsplit(" ", 1)[0]
+        kind = rng.random()
+        if kind < 0.3:
+            queries.append(entry["name"])                      # exact
+        elif kind < 0.7:
+            queries.append(f"{base} {rng.choice(SUFFIXES)}")   # another suffix
+        elif kind < 0.9:
+            pos = rng.randrange(1, len(base))
+            queries.append(base[:pos] + base[pos + 1:])        # a typo
+        else:
+            queries.append(f"Unknown Company {rng.randrange(10 ** 6)}")
+    return queries
+
+
+def main(symbols=10000, names=10000):
+    entries = make_master(symbols)
+    start = time.perf_counter()
+    index = SymbolIndex(entries)
+    build = time.perf_counter() - start
+    queries = make_queries(entries, names)
+    with tempfile.TemporaryDirectory() as tmp:
+        resolver = TickerResolver(index, path=os.path.join(tmp, "resolutions.json"))
+        start = time.perf_counter()
+        resolved, unresolved = resolver.resolve_all(queries)
+        elapsed = time.perf_counter() - start
+    methods = {}
+    for r in resolved:
+        methods[r["method"]] = methods.get(r["method"], 0) + 1
+    print(f"Index of {len(index)} symbols built in {build:.3f}s")
+    print(f"Resolved {len(resolved)} of {len(set(queries))} distinct names in {elapsed:.3f}s "
+          f"({len(set(queries)) / elapsed:,.0f} names/s), {len(unresolved)} left for the LLM")
+    print(f"By method: {methods}")
+    return elapsed
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(*args)
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark the entry and horizon price lookup of the mentions: the day-by-day walk of
+`evaluator.get_return_by_sticker` against the `searchsorted` lookup of `TradingDayLookup`.
+The walk is timed on a sample of the mentions and extrapolated, it takes minutes at 100k.
+
+Usage:
+    python -m bench.bench_tradingdays [mentions] [legacy_sample]
+"""
+import contextlib
+import io
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from evaluator import get_return_by_sticker
+from service.tradingdays import TradingDayLookup
+
+
+NDAYS_LIST = [7, 14, 30, 45, 60, 90]
+
+
+def make_prices(start="2023-01-02", days=700, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start, periods=days)
+    # a few market holidays
+    dates = dates.delete(rng.choice(len(dates), size=days // 50, replace=False))
+    close = np.round(100 * np.exp(np.cumsum(rng.normal(0, 0.02, len(dates)))), 2)
+    return pd.DataFrame({"Close": close}, index=pd.Index(dates.strftime("%Y-%m-%d"), name="Date"))
+
+
+def make_mentions(prices, count, seed=1):
+    rng = np.random.default_rng(seed)
+    first = pd.Timestamp(prices.index[0])
+    days = rng.integers(0, (pd.Timestamp(prices.index[-1]) - first).days, size=count)
+    return (first + pd.to_timedelta(days, unit="D")).strftime("%Y%m%d").astype(int).to_numpy()
+
+
+def main(mentions=100000, legacy_sample=2000):
+    prices = make_prices()
+    dates = make_mentions(prices, mentions)
+
+    lookup = TradingDayLookup(pd.to_datetime(prices.index).to_numpy(dtype="datetime64[D]"), prices["Close"])
+    start = time.perf_counter()
+    result = lookup.lookup(dates, NDAYS_LIST)
+    vector_time = time.perf_counter() - start
+
+    sample = dates[:min(legacy_sample, mentions)]
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        legacy = [get_return_by_sticker("BENCH", int(d), prices, NDAYS_LIST) for d in sample]
+    legacy_time = (time.perf_counter() - start) * mentions / len(sample)
+
+    # the two paths agree on the sample
+    for idx, (mentioned, price_list, extra_day_list) in enumerate(legacy):
+        assert mentioned[1] == result["entry_extra_days"][idx]
+        expected = [np.nan if p is None else p for p in price_list]
+        assert np.allclose(expected, result["price"][idx], equal_nan=True)
+        assert list(extra_day_list) == result["extra_days"][idx].tolist()
+
+    print(f"{mentions:,} mentions x {len(NDAYS_LIST)} horizons over {len(prices)} trading days")
+    print(f"day-by-day walk:  {legacy_time:9.3f}s (extrapolated from {len(sample):,} mentions)")
+    print(f"searchsorted:     {vector_time:9.3f}s ({legacy_time / vector_time:,.0f}x)")
+    return legacy_time, vector_time
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(*args)
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark the streaming VTT cleaner against `clean_vtt_to_script`.
+It generates large synthetic YouTube auto-caption files (rolling two-line cues with
+inline word timings) and reports the throughput in MB/s and the size of the output.
+
+Usage:
+    python -m bench.bench_vtt [size_mb ...]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from service.helper import clean_vtt_to_script
+from service.vtt import clean_vtt, clean_vtt_file
+
+
+WORDS = ("the market stock tesla nvidia apple earnings growth price target buy sell hold "
+         "i think this is a great company long term we see revenue margin guidance "
+         "right now so basically you know what going to be really").split()
+
+
+def _ts(ms):
+    return f"{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d}.{ms % 1000:03d}"
+
+
+def make_synthetic_vtt(path, size_mb, seed=0):
+    """
+    Write a synthetic auto-caption VTT file of about `size_mb` megabytes.
+    Returns:
+        int: The size of the file in bytes.
+    """
+    rng = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    written = 0
+    ms = 0
+    previous = ""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("WEBVTT\nKind: captions\nLanguage: en\n\n")
+        while written < target:
+            words = [rng.choice(WORDS) for _ in range(rng.randint(4, 9))]
+            start, end = ms, ms + 2500
+            timed = words[0] + "".join(
+                f"<{_ts(start + 250 * (i + 1))}><c> {w}</c>" for i, w in enumerate(words[1:]))
+            # the rolling cue shows the previous line plus the new timed line ...
+            block = f"{_ts(start)} --> {_ts(end)} align:start position:0%\n{previous or ' '}\n{timed}\n\n"
+            line = " ".join(words)
+            # ... followed by a 10ms cue repeating the new line
+            block += f"{_ts(end)} --> {_ts(end + 10)} align:start position:0%\n{line}\n \n\n"
+            f.write(block)
+            written += len(block)
+            previous = line
+            ms = end + 10
+    return os.path.getsize(path)
+
+
+def _measure(func, repeat=3):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run(size_mb, repeat=3):
+    with tempfile.TemporaryDirectory() as tmp:
+        vtt_file = os.path.join(tmp, "synthetic.en.vtt")
+        out_file = os.path.join(tmp, "synthetic.txt")
+        size = make_synthetic_vtt(vtt_file, size_mb)
+        mb = size / 1024 / 1024
+
+        old_time, old_text = _measure(lambda: clean_vtt_to_script(vtt_file), repeat)
+        new_time, new_text = _measure(lambda: clean_vtt(vtt_file), repeat)
+        stream_time, _ = _measure(lambda: clean_vtt_file(vtt_file, out_file), repeat)
+
+        print(f"Input: {mb:.1f} MB")
+        print(f"  clean_vtt_to_script: {mb / old_time:8.1f} MB/s, output {len(old_text):>12,} chars")
+        print(f"  clean_vtt          : {mb / new_time:8.1f} MB/s, output {len(new_text):>12,} chars")
+        print(f"  clean_vtt_file     : {mb / stream_time:8.1f} MB/s (streamed to disk)")
+        print(f"  output reduction   : {100 * (1 - len(new_text) / len(old_text)):.1f}%")
+
+
+if __name__ == "__main__":
+    sizes = [float(s) for s in sys.argv[1:]] or [10, 50]
+    for size_mb in sizes:
+        run(size_mb)
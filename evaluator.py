@@ -1,23 +1,41 @@
 import ast
 import json
-from datetime import datetime
 import os
-import yfinance as yf
+import numpy as np
 import pandas as pd
 
-def get_stock_info(stock_code_list, start_date=None, end_date=None, missing_group=None):
+from service.portfolio import WEIGHTINGS, PortfolioBacktest, PortfolioRules
+from service.price_downloader import (STATUS_INCOMPLETE, STATUS_MISSING, STATUS_SKIPPED, MissingTickerRegistry,
+                                      PriceDownloader, split_download)
+from service.price_providers import YFinanceProvider
+from service.prices import get_default_store, records_frame
+from service.returns import ReturnMatrix
+from service.risk import DEFAULT_BENCHMARK, mention_metrics, metrics_frame
+from service.tradingdays import MAX_EXTRA_DAYS, TradingDayLookup, to_days
+
+def get_stock_info(stock_code_list, start_date=None, end_date=None, missing_group=None, store=None,
+                   downloader=None, provider=None):
     """
     use yfinance to get the stock information for a list of stock codes.
+    The groups of 20 are downloaded concurrently into the price store, the tickers that come back
+    empty are retried one by one, and the ones that still fail are recorded in the missing-ticker
+    registry (data/missing_tickers.json) and skipped by the next runs. Only the dates the store
+    does not cover yet are fetched, so extending the window or a daily run only fetches the new bars.
     Args:
         stock_code_list (list): A list of stock codes.
+        missing_group (int): Only download this group of 20, e.g. to retry it.
+        store (PriceStore): The price store, defaults to `get_default_store()`.
+        downloader (PriceDownloader): The downloader, defaults to a downloader from `provider` into `store`.
+        provider (PriceProvider): The price provider, defaults to yfinance with the missing-ticker
+            registry; another provider, e.g. `SyntheticMarket`, runs without the registry.
     Returns:
         dict: A dictionary with stock codes as keys and their information as values.
     """
-    if missing_group is None:
-        missing_only = False
-    else:
-        missing_only = True
-        print(f"Missing group: {missing_group}")
+    if store is None:
+        store = get_default_store()
+    if downloader is None:
+        registry = MissingTickerRegistry() if provider is None else None
+        downloader = PriceDownloader(store, fetch=provider, registry=registry)
     # spliet the stock_code_list into chunks of 20
     chunk_size = 20
     stock_code_list_ll = [stock_code_list[i:i + chunk_size] for i in range(0, len(stock_code_list), chunk_size)]
@@ -26,27 +44,18 @@ def get_stock_info(stock_code_list, start_date=None, end_date=None, missing_grou
     stock_code_map = {int(i/chunk_size): stock_code_list[i:i + chunk_size] for i in range(0, len(stock_code_list), chunk_size)}
     # build a reverse mapping for stock codes
     reverse_stock_code_map = {stock_code: i for i, stock_code_list in stock_code_map.items() for stock_code in stock_code_list}
-    today = datetime.now().strftime('%Y_%m_%d_%H_%M_%S')
-
-
 
-    if len(stock_code_list) > chunk_size:  
-        if missing_only:
-            print(f"Processing missing stock codes in group {missing_group}")
-            stock_code_list_ll = [stock_code_list_ll[missing_group]]
-
-        interval = '1d'  # Set the interval for yfinance API
-        for idx, stock_code_list in enumerate(stock_code_list_ll):
-            print(f"Processing chunk of stock codes: {stock_code_list}")
-            df_ml = yf.download(stock_code_list, 
-                        start=start_date, 
-                        end=end_date, 
-                        interval=interval, 
-                        rounding=True)
-            df_ml.to_csv(f"data/downloaded/stock_group{idx}_{today}.csv", encoding='utf-8-sig')
-            if idx == 3:
-                print("pause after 4 chunks for testing purposes.")
-                pass
+    if missing_group is not None:
+        print(f"Processing missing stock codes in group {missing_group}")
+        stock_code_list = stock_code_map.get(missing_group, [])
+    results = downloader.download(stock_code_list, start=start_date, end=end_date,
+                                  retry_missing=missing_group is not None)
+    missing = [r["ticker"] for r in results if r["status"] in (STATUS_MISSING, STATUS_SKIPPED)]
+    if missing:
+        print(f"{len(missing)} stock codes without prices: {missing}")
+    incomplete = [r["ticker"] for r in results if r["status"] == STATUS_INCOMPLETE]
+    if incomplete:
+        print(f"{len(incomplete)} stock codes without the new prices yet, fetched again next run: {incomplete}")
     return reverse_stock_code_map
 
 
@@ -74,23 +83,30 @@ def check_missing(ticker):
 
 
 
-def get_stock_info_by_ticker(ticker):
+def get_stock_info_by_ticker(ticker, store=None, provider=None, start_date=None, end_date=None):
     """
-    Get stock information by ticker from the downloaded CSV files.
+    Get stock information by ticker from the price store, or from a price provider.
     Args:
         ticker (str): The stock ticker to get information for.
+        store (PriceStore): The price store, defaults to `get_default_store()`.
+        provider (PriceProvider): Read the prices from this provider instead of the store.
+        start_date (str): The first date asked to the provider, YYYY-MM-DD.
+        end_date (str): The end date (excluded) asked to the provider, YYYY-MM-DD.
     Returns:
 
         pd.DataFrame: A DataFrame containing the stock information for the given ticker.
     """
-    with open("data/reverse_lut.json", "r", encoding="utf-8") as f:
-        reverse_lut = json.load(f)
-    if ticker not in reverse_lut:
-        print(f"Ticker {ticker} not found in reverse_lut.")
-        return None
-    group = reverse_lut[ticker]
-    df = pd.read_csv(f"data/downloaded/stock_group{group}_2025_06_08_00_47_58.csv", header=[0, 1], index_col=0, encoding='utf-8-sig')
-    df_ticker = df.xs(key=ticker, level=1, axis=1)
+    if provider is not None:
+        records = split_download(provider.fetch([ticker], start_date, end_date), [ticker]).get(ticker)
+        if records is None:
+            print(f"Ticker {ticker} not found by the price provider.")
+            return None
+        return records_frame(records)
+    if store is None:
+        store = get_default_store()
+    df_ticker = store.frame(ticker)
+    if df_ticker is None:
+        print(f"Ticker {ticker} not found in the price store {store.root}.")
     return df_ticker
 
 def get_next_validate_date(df_stock_info, date_mentioned_as_date):
@@ -197,91 +213,152 @@ def get_prices_by_daylist(ticker, df_stock_info, next_date, ndays_list):
     return prices_in_ndays, extra_days_list
 
         
-def main1(df_stock_info, ndays_list):
-    """
-    Check the return of a stock in the backtesting process.
-    """
-    return_info = []
+def load_missing(path="data/missing_stock_codes_from_dnld.json"):
+    '''
+    Load all the tickers of the missing stock codes list, see `check_missing`.
+    Returns:
+        set: The missing tickers, empty if the file does not exist.
+    '''
+    if not os.path.exists(path):
+        return set()
+    with open(path, "r", encoding="utf-8") as f:
+        missing_stock_codes = json.load(f)
+    return {code for missing in missing_stock_codes.values() for code in missing.get("missing_codes", [])}
 
-    for idx, row in df_stock_info.iterrows():
-        stock_code = row['stock_code']
-        if pd.isna(stock_code) or stock_code == "N/A":
-            print(f"Row {idx} has no stock code, skipping.")
-            continue
-        if not isinstance(stock_code, str):
-            print(f"Row {idx} has invalid stock code type: {type(stock_code)}, skipping.")
-            continue
-        ticker = stock_code.strip().upper()
-        date_mentioned = row['date']
-        if ' ' in ticker or ticker == '':
-            print(f"Row {idx} has invalid ticker: {ticker}, skipping.")
-            continue
-        # remove negative opinion from ticker
-        opinion = row.get('opinion', '')
-        if opinion and 'negative' in opinion.lower():
-            print(f"Row {idx} has negative opinion for ticker {ticker}, skipping.")
-            continue
 
-        # check if the ticker is missing in retrieve stock info
-        is_in_missing_list = check_missing(ticker)
-        if is_in_missing_list:
-            print(f"Ticker {ticker} is in the missing stock codes list, skipping.")
+def select_mentions(df_mentions, missing=()):
+    '''
+    Validate and filter the mentions for the backtest.
+    The rows without a stock code, with an invalid ticker, with a negative opinion or with a
+    ticker in the missing list are dropped.
+    Args:
+        df_mentions (pd.DataFrame): The mentions, with `stock_code`, `date` and optionally `opinion`.
+        missing (set): The tickers without prices.
+    Returns:
+        pd.Series: The normalized tickers of the selected rows, indexed like `df_mentions`.
+    '''
+    codes = df_mentions['stock_code']
+    is_str = codes.map(type) == str
+    tickers = codes.where(is_str).str.strip().str.upper()
+    valid = is_str & (codes != "N/A") & (tickers != "") & ~tickers.str.contains(" ", regex=False, na=True)
+    if 'opinion' in df_mentions.columns:
+        opinion = df_mentions['opinion']
+        negative = opinion.where(opinion.map(type) == str).str.lower().str.contains("negative", regex=False, na=False)
+        valid &= ~negative
+    is_missing = tickers.isin(missing)
+    print(f"{len(df_mentions)} mentions: {int((~is_str).sum())} without stock code, "
+          f"{int((is_str & ~valid).sum())} invalid or negative, {int((valid & is_missing).sum())} in the missing list")
+    return tickers[valid & ~is_missing]
+
+
+def evaluate_mentions(df_mentions, ndays_list, store=None, missing_file="data/missing_stock_codes_from_dnld.json",
+                      provider=None):
+    """
+    Compute the entry and horizon prices of the mentions.
+    The mentions are grouped by ticker: the prices of a ticker are loaded once and the entry
+    and horizon prices of all its mentions are looked up together.
+    Args:
+        df_mentions (pd.DataFrame): The mentions, with `stock_code`, `date` (YYYYMMDD) and `opinion`.
+        ndays_list (list): A list of days to check later.
+        store (PriceStore): The price store, defaults to `get_default_store()`.
+        missing_file (str): The missing stock codes list, see `check_missing`.
+        provider (PriceProvider): Fetch the missing prices of the mentioned tickers from this
+            provider into `store` first, e.g. a `SyntheticMarket` to run offline.
+    Returns:
+        ReturnMatrix: The mentions with an entry day, in the order of the rows; `mention_index`
+            is the position of each one in `df_mentions`.
+    """
+    if store is None:
+        store = get_default_store()
+    df_mentions = df_mentions.reset_index(drop=True)
+    tickers = select_mentions(df_mentions, load_missing(missing_file))
+    dates = to_days(df_mentions['date'].to_numpy())
+    positions = tickers.index.to_numpy()
+    mention_days = dates[positions][~np.isnat(dates[positions])]
+    if provider is not None and len(mention_days):
+        # the entry and the horizon days may each be up to MAX_EXTRA_DAYS later
+        last = mention_days.max() + max(ndays_list, default=0) + 2 * MAX_EXTRA_DAYS + 1
+        PriceDownloader(store, fetch=provider).download(tickers.unique().tolist(), str(mention_days.min()),
+                                                        str(last))
+
+    parts = []
+    no_prices = []
+    no_date = 0
+    for ticker, rows in tickers.groupby(tickers, sort=False).indices.items():
+        records = store.load(ticker)
+        if records is None:
+            no_prices.append(ticker)
             continue
-        else:
-            # get the stock info by ticker
-            df_stock_info = get_stock_info_by_ticker(ticker)
-            if df_stock_info is None:
-                print(f"No stock info found for ticker {ticker}, skipping.")
-                continue
-
-            # now we have date mentioned and the ticker
-            # check the price on the date mentioned and ndays later
-            mentioned , price_list,extra_day_list = get_return_by_sticker(ticker, date_mentioned, df_stock_info, ndays_list)
-            if len(mentioned) == 0:
-                print(f"No valid data found for ticker {ticker} on date {date_mentioned}, skipping.")
-                continue
-            return_info.append(
-                {"ticker":ticker,
-                'date_mentioned': mentioned[0],
-                'extra_days': mentioned[1],
-                'price_on_mentioned': mentioned[2],
-                'ndays_list': ndays_list,
-                'price_list': price_list,
-                'extra_day_list': extra_day_list
-            })
-        
-    # save the return info to a json file
-    return return_info
+        rows = positions[rows]
+        result = TradingDayLookup.from_records(records).lookup(dates[rows], ndays_list)
+        found = result["entry_found"]
+        no_date += int((~found).sum())
+        parts.append(ReturnMatrix(
+            tickers=np.full(int(found.sum()), ticker),
+            entry_dates=result["entry_date"][found],
+            entry_extra_days=result["entry_extra_days"][found],
+            entry_prices=result["entry_price"][found],
+            ndays=ndays_list,
+            prices=result["price"][found],
+            extra_days=result["extra_days"][found],
+            mention_index=rows[found],
+        ))
+    if no_prices:
+        print(f"No stock info found for {len(no_prices)} tickers, skipping: {no_prices}")
+    if no_date:
+        print(f"No valid trading date found for {no_date} mentions, skipping.")
+    matrix = ReturnMatrix.concatenate(parts, ndays_list)
+    print(f"Return info of {len(matrix)} mentions over {tickers.nunique()} tickers")
+    return matrix
+
+
+def main1(df_stock_info, ndays_list, store=None, missing_file="data/missing_stock_codes_from_dnld.json",
+          provider=None):
+    """
+    Check the return of the mentioned stocks in the backtesting process.
+    Args:
+        df_stock_info (pd.DataFrame): The mentions, see `evaluate_mentions`.
+        ndays_list (list): A list of days to check later.
+    Returns:
+        list: The return info of the mentions, in the order of the rows.
+    """
+    return evaluate_mentions(df_stock_info, ndays_list, store, missing_file, provider).to_records()
 
-def main2(return_info, output_file):
+def main2(return_info, output_file, benchmark=None, sectors=None, store=None, provider=None):
     """
-    Save the return info to a JSON file.
+    Compute the returns of every horizon and save them to a CSV file.
     Args:
-        return_info (list): The list of return info to save.
+        return_info (ReturnMatrix | str | pd.DataFrame): The return info: a matrix, its .npz file,
+            the records of `main1` or the return info CSV of the older runs.
         output_file (str): The file path to save the return info.
+        benchmark (str): Also compute the benchmark-relative and risk metrics against this
+            ticker, e.g. "SPY", see `service.risk.mention_metrics`.
+        sectors (dict): {ticker: benchmark ticker}, e.g. a sector ETF, used instead of `benchmark`.
+        store (PriceStore): The price store of the metrics, defaults to `get_default_store()`.
+        provider (PriceProvider): Fetch the missing prices of the metrics from this provider first.
+    Returns:
+        pd.DataFrame: One row per mention, with the `nday_{N}_price`, `nday_{N}_extra` and
+            `nday_{N}_r` columns of every horizon N, and with a benchmark, the `benchmark`,
+            `nday_{N}_excess`, `nday_{N}_vol_adj` and `nday_{N}_mae` columns.
     """
-    df = return_info.copy()
-    df['price_list'] = df['price_list'].apply(ast.literal_eval)
-    df['return_list'] = df.apply(
-    lambda row: [
-        round((p - row['price_on_mentioned']) / row['price_on_mentioned'] * 100, 2)
-        if p is not None and row['price_on_mentioned'] not in (None, 0)
-        else None
-        for p in row['price_list']
-    ],axis=1)
-
-
-    #extra_col_length = max(df['ndays_list'].apply(len))
-    days_list = os.getenv("DAYS_LIST")
-    later_days =  ast.literal_eval(days_list) if days_list else None
-    extra_col_length = len(later_days) 
-    for i in range(extra_col_length):
-        df[f'nday_{later_days[i]}_r'] = df['return_list'].apply(lambda x: x[i] if i < len(x) else None)
-
-
-    with open(output_file, "w", encoding="utf-8") as f:
-        df.to_csv(f, index=False, encoding='utf-8-sig')
+    if isinstance(return_info, str):
+        return_info = ReturnMatrix.load(return_info)
+    elif isinstance(return_info, pd.DataFrame):
+        return_info = ReturnMatrix.from_frame(return_info)
+    elif isinstance(return_info, list):
+        return_info = ReturnMatrix.from_records(return_info)
+    df = return_info.frame()
+    if benchmark is not None:
+        if store is None:
+            store = get_default_store()
+        metrics = mention_metrics(return_info, store, benchmark, sectors, provider=provider)
+        df = pd.concat([df, metrics_frame(return_info, metrics)], axis=1)
+    folder = os.path.dirname(output_file)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    df.to_csv(output_file, index=False, encoding='utf-8-sig')
     print(f"Return info saved to {output_file}")
+    return df
 
 if __name__ == "__main__":
     case = 1  # Set the case number to run the desired part of the evaluator
@@ -290,12 +367,15 @@ if __name__ == "__main__":
        df = pd.read_csv("output/extracted_all_filled2.csv", encoding='utf-8-sig')
        days_list = os.getenv("DAYS_LIST")
        later_days =  ast.literal_eval(days_list) if days_list else None
-       return_info = main1(df_stock_info=df , ndays_list=later_days)
-       df = pd.DataFrame(return_info)
-       df.to_csv("data/return_info.csv", index=False, encoding='utf-8-sig')
+       matrix = evaluate_mentions(df, ndays_list=later_days)
+       matrix.save("data/return_info.npz")
     elif case == 2:
         # 2. analyze the data part
-        df = pd.read_csv("data/return_info.csv", encoding='utf-8-sig')
-        main2(df, output_file="data2/return_info2.json")
-
-
+        main2("data/return_info.npz", output_file="data2/return_info2.csv", benchmark=DEFAULT_BENCHMARK,
+              provider=YFinanceProvider())
+    elif case == 3:
+        # 3. portfolio backtest of the evaluated mentions
+        df = pd.read_csv("output/extracted_all_filled2.csv", encoding='utf-8-sig')
+        backtest = PortfolioBacktest(df, ReturnMatrix.load("data/return_info.npz"), get_default_store())
+        rules = [PortfolioRules(holding_days=n, weighting=w) for n in (7, 30, 90) for w in WEIGHTINGS]
+        print(backtest.compare(rules).round(3).to_string())
@@ -7,8 +7,22 @@ output as JSON.
 '''
 import os
 import json
-from openai import OpenAI
+import asyncio
+import time
+from openai import OpenAI, AsyncOpenAI
 from dotenv import load_dotenv
+from service.batch import (BATCH_DIR, download_batch_results, ingest_results, make_custom_id,
+                           split_custom_id, submit_batch, write_requests, write_resubmission)
+from service.checkpoint import ExtractionCheckpoint, text_hash
+from service.chunking import extract_chunked, split_transcript
+from service.extraction import AsyncExtractionEngine, STATUS_OK
+from service.jsonstream import parse_json_array, validate_mention
+from service.llm import StreamedArray, chat_completion
+from service.llm_cache import get_default_cache, request_cache_key
+from service.metrics import call_context, get_default_metrics
+from service.prefilter import get_default_prefilter
+from service.router import DEFAULT_CASCADE, CascadeRouter, cascade_report
+from service.storage import atomic_write_json
 
 
 load_dotenv()
@@ -18,21 +32,9 @@ client = OpenAI(api_key=API_KEY)
 #for m in models.data:
 #    print(m.id)
 
-def extract_stocks_from_transcript(transcript_text, llm_model="gpt-4.1-mini"):
-    '''
-    Extract stock opinions from a YouTube transcript using OpenAI's GPT-4 model.
-    Args:
-        transcript_text (str): The cleaned transcript text from a YouTube video.
-        Returns:
-        str: JSON formatted string containing stock names, ticker symbols, opinions, sources, and quotes.
-    '''
-    # validate llm_model
-    valid_models = ["gpt-4.1-mini", "gpt-4o-mini", "gpt-4o","o4-mini"]#, "gpt-4", "gpt-3.5-turbo"]
-    if llm_model not in valid_models:
-        raise ValueError(f"Invalid model name: {llm_model}. Choose from {valid_models}.")
-
-    system_prompt = "You are a financial analyst reviewing a YouTube transcript."
-    user_prompt = f"""
+VALID_MODELS = ["gpt-4.1-mini", "gpt-4o-mini", "gpt-4o","o4-mini"]#, "gpt-4", "gpt-3.5-turbo"]
+SYSTEM_PROMPT = "You are a financial analyst reviewing a YouTube transcript."
+USER_PROMPT_TEMPLATE = """
         Given the following transcript, extract:
         
         1. Stock/company names mentioned
@@ -56,48 +58,492 @@ def extract_stocks_from_transcript(transcript_text, llm_model="gpt-4.1-mini"):
         Transcript:
         {transcript_text}
     """
+# changing the prompts changes the version, which invalidates the checkpoint entries
+PROMPT_VERSION = text_hash(SYSTEM_PROMPT, USER_PROMPT_TEMPLATE)
+
+
+def validate_model(llm_model):
+    if llm_model not in VALID_MODELS:
+        raise ValueError(f"Invalid model name: {llm_model}. Choose from {VALID_MODELS}.")
 
-    if llm_model == "o4-mini":
-        response = client.chat.completions.create(
-            model=llm_model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ]
-        )
-        return response.choices[0].message.content
-    response = client.chat.completions.create(
-        #model="gpt-4o",
-        # gpt-4.1-mini
-        #model="gpt-4o-mini",
-        model=llm_model,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
+
+def build_request(transcript_text, llm_model="gpt-4.1-mini"):
+    """
+    Build the chat completion arguments to extract stock opinions from a transcript.
+    Args:
+        transcript_text (str): The cleaned transcript text from a YouTube video.
+        llm_model (str): The LLM model name.
+    Returns:
+        dict: The keyword arguments for `client.chat.completions.create`.
+    """
+    validate_model(llm_model)
+    request = {
+        "model": llm_model,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": USER_PROMPT_TEMPLATE.format(transcript_text=transcript_text)},
         ],
-        temperature=0.2
-    )
-    return response.choices[0].message.content
+    }
+    # o4-mini only supports the default temperature
+    if llm_model != "o4-mini":
+        request["temperature"] = 0.2
+    return request
+
 
-def main(extract_function, model):
+def parse_extraction(output):
     """
-    Main function to extract stock opinions from YouTube transcripts.
+    Parse the JSON returned by the model, ignoring the prose and markdown code fences around it.
+    Each mention is validated against the schema, malformed or truncated mentions are
+    repaired when possible and dropped otherwise.
+    Returns:
+        list: The extracted stock mentions.
+    Raises:
+        ValueError: The output does not hold any JSON array.
+    """
+    return parse_json_array(output, validate=validate_mention)
+
+
+def extract_stocks_from_transcript(transcript_text, llm_model="gpt-4.1-mini"):
+    '''
+    Extract stock opinions from a YouTube transcript using OpenAI's GPT-4 model.
+    Args:
+        transcript_text (str): The cleaned transcript text from a YouTube video.
+        Returns:
+        str: JSON formatted string containing stock names, ticker symbols, opinions, sources, and quotes.
+    '''
+    return chat_completion(client, build_request(transcript_text, llm_model), cache=get_default_cache(),
+                           metrics=get_default_metrics(), validate=parse_extraction)
+
+def extract_stocks_chunked(transcript_text, llm_model="gpt-4.1-mini", max_tokens=3000,
+                           overlap_tokens=200, max_workers=4):
+    '''
+    Map-reduce version of `extract_stocks_from_transcript` for long transcripts.
+    The transcript is split into overlapping token-bounded windows that are extracted
+    concurrently, then the mentions are merged by ticker and stock name, keeping the
+    strongest quote and the windows (`chunk`, `chunks`) each stock was mentioned in.
+    Args:
+        transcript_text (str): The cleaned transcript text from a YouTube video.
+        llm_model (str): The LLM model name.
+        max_tokens (int): The token budget of a window.
+        overlap_tokens (int): The tokens shared by consecutive windows.
+        max_workers (int): The number of windows extracted at the same time.
+    Returns:
+        str: JSON formatted string of the merged mentions, the same format as `extract_stocks_from_transcript`.
+    Raises:
+        RuntimeError: A window failed, so the transcript is not reported as done with missing windows.
+    '''
+    validate_model(llm_model)
+    windows = split_transcript(transcript_text, max_tokens, overlap_tokens, model=llm_model)
+
+    def extract_window(text):
+        return parse_extraction(extract_stocks_from_transcript(text, llm_model=llm_model))
+
+    mentions, errors = extract_chunked(windows, extract_window, max_workers=max_workers)
+    for idx, error in errors.items():
+        print(f"Chunk {idx + 1}/{len(windows)} failed: {error}")
+    if errors:
+        # a partial result would be checkpointed as done; the windows that succeeded are cached,
+        # so the next run only asks the failed ones again
+        raise RuntimeError(f"{len(errors)} of {len(windows)} chunks failed, first error: {errors[min(errors)]}")
+    return json.dumps(mentions, ensure_ascii=False)
+
+def extract_stocks_prefiltered(transcript_text, llm_model="gpt-4.1-mini", prefilter=None):
+    '''
+    Extract stock opinions from the candidate regions of a transcript only.
+    The local prefilter keeps the windows around known companies, tickers and cue phrases,
+    a transcript without any candidate is not sent to the model.
+    Args:
+        transcript_text (str): The cleaned transcript text from a YouTube video.
+        llm_model (str): The LLM model name.
+        prefilter (Prefilter): The prefilter, defaults to `get_default_prefilter()`.
+    Returns:
+        str: JSON formatted string, the same format as `extract_stocks_from_transcript`.
+    '''
+    validate_model(llm_model)
+    result = (prefilter or get_default_prefilter()).filter(transcript_text, llm_model)
+    if result["skipped"]:
+        print(f"No candidate mention, skipped {result['original_tokens']} tokens")
+        return "[]"
+    print(f"Prefilter kept {result['filtered_tokens']}/{result['original_tokens']} tokens "
+          f"in {len(result['windows'])} windows")
+    return extract_stocks_from_transcript(result["text"], llm_model=llm_model)
+
+def extract_stocks_streaming(transcript_text, llm_model="gpt-4.1-mini", on_mention=None):
+    '''
+    Streaming version of `extract_stocks_from_transcript`.
+    Each mention is validated and passed to `on_mention` as soon as the model closes it,
+    and a truncated answer keeps the mentions completed before the cut.
+    Args:
+        transcript_text (str): The cleaned transcript text from a YouTube video.
+        llm_model (str): The LLM model name.
+        on_mention (callable): Optional callback called with each mention as it arrives.
+    Returns:
+        str: JSON formatted string of the valid mentions.
+    '''
+    stream = StreamedArray(client, build_request(transcript_text, llm_model),
+                           validate=validate_mention, cache=get_default_cache(), metrics=get_default_metrics())
+    mentions = []
+    for mention in stream:
+        mentions.append(mention)
+        if on_mention is not None:
+            on_mention(mention)
+    if stream.errors or stream.salvaged:
+        print(f"Dropped {len(stream.errors)} and salvaged {stream.salvaged} malformed mentions")
+    return json.dumps(mentions, ensure_ascii=False)
+
+
+def list_transcripts(manifest=None, cleaned_dir="output/cleaned"):
     """
-    for file in os.listdir("output/cleaned"):
+    List the cleaned transcripts to extract.
+    Args:
+        manifest (VideoManifest): Optional video manifest, when given only the videos
+            that are behind the `extracted` stage are listed.
+        cleaned_dir (str): The folder of the cleaned transcripts.
+    Returns:
+        list: (video_id, yt_id, file path) tuples, video_id is the `{udate}_{yt_id}` file name.
+    """
+    behind = set(manifest.behind("extracted")) if manifest is not None else None
+    transcripts = []
+    for file in sorted(os.listdir(cleaned_dir)):
         if file.endswith(".txt"):
             video_id = file.split(".")[0]
-            with open(f"output/cleaned/{file}", "r", encoding="utf-8") as f:
-                transcript = f.read().strip()
-            #video_id = "20250605"
-            #with open(f"output/cleaned/{video_id}.txt", "r", encoding="utf-8") as f:
-            #    transcript = f.read().strip()
+            yt_id = video_id.split("_", 1)[-1]
+            if behind is not None and yt_id in manifest and yt_id not in behind:
+                continue
+            transcripts.append((video_id, yt_id, os.path.join(cleaned_dir, file)))
+    return transcripts
+
+
+def prompt_version(mode=None):
+    """
+    Get the prompt version recorded in the checkpoint.
+    Args:
+        mode (str): The extraction mode when it changes the output, e.g. "extract_stocks_chunked".
+    """
+    if mode in (None, "extract_stocks_from_transcript", "extract_stocks_streaming"):
+        return PROMPT_VERSION
+    return text_hash(PROMPT_VERSION, mode)
+
+
+def load_pending(model, version, manifest=None, checkpoint=None, force=False):
+    """
+    Load the transcripts whose extraction is not in the checkpoint yet.
+    Args:
+        model (str): The LLM model name.
+        version (str): The prompt version, see `prompt_version`.
+        manifest (VideoManifest): Optional video manifest, see `list_transcripts`.
+        checkpoint (ExtractionCheckpoint): The checkpoint, None to load everything.
+        force (bool): Load the transcripts even if they are done.
+    Returns:
+        list: (video_id, transcript, transcript hash) tuples.
+    """
+    pending = []
+    done = 0
+    for video_id, yt_id, path in list_transcripts(manifest):
+        with open(path, "r", encoding="utf-8") as f:
+            transcript = f.read().strip()
+        digest = text_hash(transcript)
+        if checkpoint is not None and not force and checkpoint.is_done(video_id, model, version, digest):
+            done += 1
+            continue
+        pending.append((video_id, transcript, digest))
+    if done:
+        print(f"Resuming: {done} transcripts already extracted with {model}, {len(pending)} to go")
+    return pending
+
+
+def save_extraction(video_id, model, output_dict, manifest=None, checkpoint=None, version=None, transcript_hash=None):
+    """
+    Write an extraction atomically and record it in the manifest and the checkpoint.
+    """
+    output_file = f"output/extracted/{video_id}_{model}.json"
+    atomic_write_json(output_file, output_dict)
+    if checkpoint is not None:
+        checkpoint.mark_done(video_id, model, version, transcript_hash, output_file, mentions=len(output_dict))
+    yt_id = video_id.split("_", 1)[-1]
+    if manifest is not None and yt_id in manifest:
+        manifest.advance(yt_id, "extracted")
+        manifest.save()
+
+
+def main(extract_function, model, manifest=None, checkpoint=None, force=False):
+    """
+    Main function to extract stock opinions from YouTube transcripts.
+    Each extraction is recorded in the checkpoint as soon as it is written, so a re-run
+    resumes where the previous one stopped and only redoes the transcripts or prompts that changed.
+    Args:
+        extract_function (callable): The function to extract stock opinions from a transcript.
+        model (str): The LLM model name.
+        manifest (VideoManifest): Optional video manifest, when given only the videos
+            that are behind the `extracted` stage are processed.
+        checkpoint (ExtractionCheckpoint): The checkpoint, defaults to `output/extracted/checkpoint.json`.
+        force (bool): Extract again the transcripts that are already done.
+    """
+    if checkpoint is None:
+        checkpoint = ExtractionCheckpoint()
+    version = prompt_version(extract_function.__name__)
+    for video_id, transcript, digest in load_pending(model, version, manifest, checkpoint, force):
+        #video_id = "20250605"
+        #with open(f"output/cleaned/{video_id}.txt", "r", encoding="utf-8") as f:
+        #    transcript = f.read().strip()
+        with call_context(key=video_id, operation=extract_function.__name__):
             output = extract_function(transcript, llm_model=model)
-            print(output)
-            output = output.replace("```json", "").replace("```", "").strip()
-            output_dict = json.loads(output)
+        print(output)
+        output_dict = parse_extraction(output)
+        save_extraction(video_id, model, output_dict, manifest, checkpoint, version, digest)
+
+
+def main_streaming(model, manifest=None, checkpoint=None, force=False):
+    """
+    Extract the cleaned transcripts with streamed completions.
+    The mentions are appended to `output/extracted/{video_id}_{model}.partial.jsonl` as they
+    arrive, and the final JSON file replaces it once the answer is complete.
+    Args:
+        model (str): The LLM model name.
+        manifest (VideoManifest): Optional video manifest, see `main`.
+        checkpoint (ExtractionCheckpoint): The checkpoint, see `main`.
+        force (bool): Extract again the transcripts that are already done.
+    """
+    os.makedirs("output/extracted", exist_ok=True)
+    if checkpoint is None:
+        checkpoint = ExtractionCheckpoint()
+    version = prompt_version()
+    for video_id, transcript, digest in load_pending(model, version, manifest, checkpoint, force):
+        partial_file = f"output/extracted/{video_id}_{model}.partial.jsonl"
+        with open(partial_file, "w", encoding="utf-8") as partial:
+            def write(mention):
+                partial.write(json.dumps(mention, ensure_ascii=False) + "\n")
+                partial.flush()
+                print(f"{video_id}: {mention['stock']} ({mention['stock_code']}) {mention['opinion']}")
+            with call_context(key=video_id, operation="extract_streaming"):
+                output = extract_stocks_streaming(transcript, llm_model=model, on_mention=write)
+        save_extraction(video_id, model, json.loads(output), manifest, checkpoint, version, digest)
+        os.remove(partial_file)
+
+
+def main_cascade(models=DEFAULT_CASCADE, manifest=None, checkpoint=None, force=False, use_prefilter=True):
+    """
+    Extract the cleaned transcripts with a cascade of models: the cheapest model first, and
+    the next one only when the answer fails the checks (see `service.router`).
+    The mentions are saved as `output/extracted/{video_id}_cascade.json`.
+    Args:
+        models (list): The models, cheapest first, the last one is the strong model.
+        manifest (VideoManifest): Optional video manifest, see `main`.
+        checkpoint (ExtractionCheckpoint): The checkpoint, see `main`.
+        force (bool): Extract again the transcripts that are already done.
+        use_prefilter (bool): Escalate when the mentions miss the local prefilter candidates.
+    Returns:
+        dict: The cascade report, compared with always using the strong model.
+    """
+    for model in models:
+        validate_model(model)
+    os.makedirs("output/extracted", exist_ok=True)
+    if checkpoint is None:
+        checkpoint = ExtractionCheckpoint()
+    version = prompt_version("cascade:" + ",".join(models))
+    router = CascadeRouter(lambda transcript, model: extract_stocks_from_transcript(transcript, llm_model=model),
+                           build_request, models=models,
+                           prefilter=get_default_prefilter() if use_prefilter else None,
+                           cache=get_default_cache())
+    results = []
+    for video_id, transcript, digest in load_pending("cascade", version, manifest, checkpoint, force):
+        with call_context(key=video_id, operation="cascade"):
+            result = router.route(video_id, transcript)
+        results.append(result)
+        trail = " -> ".join(f"{a['model']}{a['issues'] or ''}" for a in result["attempts"])
+        if result["mentions"] is None:
+            print(f"{video_id}: no valid answer ({trail})")
+            continue
+        save_extraction(video_id, "cascade", result["mentions"], manifest, checkpoint, version, digest)
+        print(f"{video_id}: {len(result['mentions'])} mentions ({trail})")
+    report = cascade_report(results, models[-1])
+    print(f"Cascade report: {report}")
+    return report
+
+
+def main_async(model, concurrency=8, requests_per_minute=None, tokens_per_minute=None,
+               manifest=None, async_client=None, prefilter=None, checkpoint=None, force=False):
+    """
+    Extract all the cleaned transcripts concurrently with the asyncio engine.
+    A failed or malformed response only affects its own transcript, its raw output is
+    kept in `output/extracted/{video_id}_{model}.raw.txt` for inspection.
+    Args:
+        model (str): The LLM model name.
+        concurrency (int): The maximum number of requests in flight.
+        requests_per_minute (float): The request budget, None for no limit.
+        tokens_per_minute (float): The token budget, None for no limit.
+        manifest (VideoManifest): Optional video manifest, see `main`.
+        async_client (openai.AsyncOpenAI): The client to use, defaults to one built from OPENAI_API_KEY.
+        prefilter (Prefilter): Optional prefilter, only the candidate regions are sent to the model
+            and the transcripts without candidates are saved as empty extractions.
+        checkpoint (ExtractionCheckpoint): The checkpoint, see `main`.
+        force (bool): Extract again the transcripts that are already done.
+    Returns:
+        dict: The run statistics, including `transcripts_per_minute` and, with a prefilter,
+            `skipped` and `prefilter_token_reduction`.
+    """
+    validate_model(model)
+    if async_client is None:
+        async_client = AsyncOpenAI(api_key=API_KEY, max_retries=0)
+    os.makedirs("output/extracted", exist_ok=True)
+    if checkpoint is None:
+        checkpoint = ExtractionCheckpoint()
+    version = prompt_version("extract_stocks_prefiltered" if prefilter is not None else None)
+    items = []
+    hashes = {}
+    skipped = []
+    original_tokens = filtered_tokens = 0
+    for video_id, transcript, digest in load_pending(model, version, manifest, checkpoint, force):
+        hashes[video_id] = digest
+        if prefilter is not None:
+            result = prefilter.filter(transcript, model)
+            original_tokens += result["original_tokens"]
+            filtered_tokens += result["filtered_tokens"]
+            if result["skipped"]:
+                skipped.append(video_id)
+                save_extraction(video_id, model, [], manifest, checkpoint, version, digest)
+                continue
+            transcript = result["text"]
+        items.append((video_id, transcript))
+
+    engine = AsyncExtractionEngine(
+        async_client,
+        build_request=lambda transcript: build_request(transcript, model),
+        parse=parse_extraction,
+        concurrency=concurrency,
+        requests_per_minute=requests_per_minute,
+        tokens_per_minute=tokens_per_minute,
+        cache=get_default_cache(),
+        metrics=get_default_metrics(),
+    )
+
+    def save(result):
+        video_id = result["key"]
+        if result["status"] == STATUS_OK:
+            save_extraction(video_id, model, result["output"], manifest, checkpoint, version, hashes[video_id])
+            print(f"{video_id}: {len(result['output'])} mentions in {result['elapsed']:.1f}s")
+            return
+        print(f"{video_id}: {result['status']} - {result['error']}")
+        if result["raw"] is not None:
+            with open(f"output/extracted/{video_id}_{model}.raw.txt", "w", encoding="utf-8") as f:
+                f.write(result["raw"])
+
+    results, stats = asyncio.run(engine.run(items, on_result=save))
+    if prefilter is not None:
+        stats["skipped"] = len(skipped)
+        stats["prefilter_token_reduction"] = round(1 - filtered_tokens / original_tokens, 3) if original_tokens else 0.0
+    print(f"Extraction stats: {stats}")
+    return stats
+
+
+def write_batch(model, manifest=None, batch_dir=BATCH_DIR, checkpoint=None, force=False):
+    """
+    Write a Batch API request file with one request per cleaned transcript not extracted yet.
+    The `custom_id` of each request is `{video_id}|{model}`.
+    Args:
+        model (str): The LLM model name.
+        manifest (VideoManifest): Optional video manifest, see `main`.
+        batch_dir (str): The folder of the batch files.
+        checkpoint (ExtractionCheckpoint): The checkpoint, see `main`.
+        force (bool): Include the transcripts that are already done.
+    Returns:
+        str: The request file path, None if there is nothing to extract.
+    """
+    validate_model(model)
+    if checkpoint is None:
+        checkpoint = ExtractionCheckpoint()
+    items = [(make_custom_id(video_id, model), build_request(transcript, model))
+             for video_id, transcript, _ in load_pending(model, prompt_version(), manifest, checkpoint, force)]
+    if not items:
+        print("No transcripts to extract.")
+        return None
+    request_file = os.path.join(batch_dir, f"extract_{model}_{time.strftime('%Y%m%d_%H%M%S')}.jsonl")
+    write_requests(items, request_file)
+    print(f"Wrote {len(items)} requests to {request_file}")
+    return request_file
+
+
+def ingest_batch(result_files, request_file, manifest=None, checkpoint=None, cleaned_dir="output/cleaned"):
+    """
+    Ingest the results of a batch into `output/extracted/{video_id}_{model}.json`.
+    The answers are also stored in the LLM response cache. Failed, malformed and missing
+    requests are written to `{request_file}.retry.jsonl` to be resubmitted.
+    Args:
+        result_files (list): The output and error files of the batch.
+        request_file (str): The request file the batch was created from.
+        manifest (VideoManifest): Optional video manifest, advanced to `extracted` for each success.
+        checkpoint (ExtractionCheckpoint): The checkpoint, see `main`. An extraction is only
+            checkpointed if its cleaned transcript did not change since the batch was written.
+        cleaned_dir (str): The folder of the cleaned transcripts.
+    Returns:
+        tuple: (succeeded custom ids, {custom_id: error}, resubmission file or None)
+    """
+    os.makedirs("output/extracted", exist_ok=True)
+    cache = get_default_cache()
+    metrics = get_default_metrics()
+    if checkpoint is None:
+        checkpoint = ExtractionCheckpoint()
+
+    def save(custom_id, output, request, row):
+        video_id, model = split_custom_id(custom_id)
+        digest = None
+        path = os.path.join(cleaned_dir, f"{video_id}.txt")
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                transcript = f.read().strip()
+            if build_request(transcript, model)["messages"] == request["body"]["messages"]:
+                digest = text_hash(transcript)
+        save_extraction(video_id, model, output, manifest, checkpoint if digest else None,
+                        prompt_version(), digest)
+        body = row["response"]["body"]
+        usage = body.get("usage") or {}
+        if metrics is not None:
+            metrics.record(model, prompt_tokens=usage.get("prompt_tokens", 0),
+                           completion_tokens=usage.get("completion_tokens", 0), batch=True,
+                           key=video_id, operation="batch")
+        if cache is not None:
+            cache.put(request_cache_key(request["body"]), model, body["choices"][0]["message"]["content"],
+                      usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
+
+    succeeded, failed = ingest_results(result_files, request_file, save, parse=parse_extraction)
+    for custom_id, error in failed.items():
+        print(f"{custom_id}: {error}")
+    retry_file = None
+    if failed:
+        retry_file = request_file.replace(".jsonl", "") + ".retry.jsonl"
+        write_resubmission(request_file, failed, retry_file)
+    print(f"Batch ingested: {len(succeeded)} ok, {len(failed)} failed"
+          + (f", resubmit {retry_file}" if retry_file else ""))
+    return succeeded, failed, retry_file
+
+
+def run_batch(model, manifest=None):
+    """
+    Write the request file of the pending transcripts and submit it.
+    Poll it later with `finish_batch`.
+    Returns:
+        tuple: (batch id, request file)
+    """
+    request_file = write_batch(model, manifest)
+    if request_file is None:
+        return None, None
+    batch = submit_batch(client, request_file, metadata={"request_file": request_file})
+    print(f"Submitted batch {batch.id} ({batch.status})")
+    return batch.id, request_file
+
+
+def finish_batch(batch_id, request_file, manifest=None):
+    """
+    Download and ingest a batch once it is done.
+    Returns:
+        tuple: The `ingest_batch` result, None if the batch is still running.
+    """
+    status, files = download_batch_results(client, batch_id)
+    if status not in ("completed", "expired", "failed", "cancelled"):
+        print(f"Batch {batch_id} is {status}")
+        return None
+    return ingest_batch(files, request_file, manifest)
 
-            with open(f"output/extracted/{video_id}_{model}.json", "w", encoding="utf-8") as f:
-                json.dump(output_dict, f, indent=2, ensure_ascii=False)
 
 if __name__ == "__main__":
     model = "gpt-4.1-mini"  #  rank #1
@@ -105,4 +551,10 @@ if __name__ == "__main__":
     #model = "gpt-4o"  #  rank unknown
     #model = "o4-mini"  #  rank #3
     main(extract_stocks_from_transcript, model)
+    #main(extract_stocks_chunked, model)  # for long videos, e.g. livestreams
+    #main_cascade()  # gpt-4o-mini first, gpt-4.1-mini only when the checks fail
+    #main_streaming(model)  # mentions are written as soon as the model closes them
+    #main(extract_stocks_prefiltered, model)  # only the candidate regions, see bench/bench_prefilter.py
+    #batch_id, request_file = run_batch(model)  # bulk backfill at the Batch API price
+    #finish_batch(batch_id, request_file)
 
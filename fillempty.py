@@ -7,17 +7,25 @@ YouTube Stock Opinion Extractor
 
 
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from string import Template
 from openai import OpenAI
 from dotenv import load_dotenv
+from service.jsonstream import parse_json_array
+from service.llm import chat_completion
+from service.llm_cache import get_default_cache
+from service.metrics import call_context, get_default_metrics, report
+from service.ratelimit import RateLimiter
+from service.tickers import TickerResolver, normalize_company
 
 
 load_dotenv()
 API_KEY = os.getenv("OPENAI_API_KEY")
 client = OpenAI(api_key=API_KEY)  
 
-def get_company_code(company_list, llm_model="gpt-4.1-mini"):
+def build_company_code_request(company_list, llm_model="gpt-4.1-mini"):
     '''
+    Build the chat completion arguments to look up the tickers of up to 20 companies.
     '''
     # validate llm_model
     valid_models = ["gpt-4.1-mini", "gpt-4o-mini", "gpt-4o","o4-mini"]#, "gpt-4", "gpt-3.5-turbo"]
@@ -36,51 +44,184 @@ def get_company_code(company_list, llm_model="gpt-4.1-mini"):
     stock_list = "\n".join(f"- {c}" for c in company_list)
     user_prompt = template.substitute(list=stock_list)
 
-    if llm_model == "o4-mini":
-        response = client.chat.completions.create(
-            model=llm_model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ]
-        )
-        return response.choices[0].message.content
-
-    response = client.chat.completions.create(
-        model=llm_model,
-        messages=[
+    request = {
+        "model": llm_model,
+        "messages": [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt},
         ],
-        temperature=0.2
-    )
-    return response.choices[0].message.content
+    }
+    # o4-mini only supports the default temperature
+    if llm_model != "o4-mini":
+        request["temperature"] = 0.2
+    return request
+
+
+def get_company_code(company_list, llm_model="gpt-4.1-mini"):
+    '''
+    Ask the LLM for the stock tickers of up to 20 companies, through the response cache;
+    only an answer holding a JSON array is cached.
+    Returns:
+        str: The JSON answer of the model.
+    '''
+    return chat_completion(client, build_company_code_request(company_list, llm_model),
+                           cache=get_default_cache(), metrics=get_default_metrics(), validate=parse_json_array)
+
+
+def parse_company_codes(output, company_list):
+    '''
+    Parse the LLM answer of `get_company_code` and match its rows to the asked names.
+    Returns:
+        dict: {asked name: row}, the names missing from the answer are left out.
+    Raises:
+        ValueError: The answer is not a JSON array.
+    '''
+    asked = {normalize_company(name): name for name in company_list}
+    rows = {}
+    for row in parse_json_array(output):
+        if isinstance(row, dict) and isinstance(row.get("company"), str):
+            name = asked.get(normalize_company(row["company"]))
+            if name is not None:
+                rows[name] = row
+    return rows
+
+
+def resolve_chunk(company_list, llm_model="gpt-4.1-mini", lookup=get_company_code, limiter=None):
+    '''
+    Ask the LLM for the tickers of a chunk of names, bisecting the chunk when the answer
+    cannot be parsed, so one bad name does not lose the others.
+    Returns:
+        tuple: ({asked name: row}, list of the names that could not be resolved)
+    '''
+    if limiter is not None:
+        limiter.acquire()
+    try:
+        with call_context(key=company_list[0], operation="company_code"):
+            output = lookup(company_list, llm_model=llm_model)
+        rows = parse_company_codes(output, company_list)
+    except ValueError as e:
+        if len(company_list) == 1:
+            print(f"Error decoding JSON for {company_list[0]}: {e}")
+            return {}, list(company_list)
+        half = len(company_list) // 2
+        print(f"Error decoding JSON for a chunk of {len(company_list)} companies, retrying in halves")
+        rows, failed = resolve_chunk(company_list[:half], llm_model, lookup, limiter)
+        more_rows, more_failed = resolve_chunk(company_list[half:], llm_model, lookup, limiter)
+        rows.update(more_rows)
+        return rows, failed + more_failed
+    return rows, [name for name in company_list if name not in rows]
+
+
+def fill_company_codes(company_list, llm_model="gpt-4.1-mini", resolver=None, lookup=get_company_code,
+                       chunk_size=20, max_workers=4, requests_per_minute=60):
+    '''
+    Find the tickers of a list of companies.
+    The names are deduplicated by their normalized form and resolved locally first (symbol
+    master and the remembered resolutions). Only the unknown or ambiguous ones are sent to the
+    LLM, in concurrent chunks under a request budget, and its answers are merged into the
+    resolver's persistent name to ticker map.
+    Args:
+        company_list (list): The company names.
+        llm_model (str): The LLM model name.
+        resolver (TickerResolver): The local resolver, defaults to `TickerResolver.from_master()`.
+        lookup (callable): The LLM lookup, called with (chunk of names, llm_model=...).
+        chunk_size (int): The names per LLM request.
+        max_workers (int): The number of chunks in flight.
+        requests_per_minute (float): The LLM request budget.
+    Returns:
+        list: [ { "company": ..., "ticker": ..., "exchange": ... } ] for every distinct name,
+            the local resolutions also have their `method` and `score`.
+    '''
+    resolver = resolver or TickerResolver.from_master()
+    groups = {}
+    for name in company_list:
+        if isinstance(name, str) and normalize_company(name):
+            groups.setdefault(normalize_company(name), []).append(name)
+    representatives = [names[0] for names in groups.values()]
+    resolved, unresolved = resolver.resolve_all(representatives)
+    print(f"{len(company_list)} names, {len(groups)} distinct: {len(resolved)} resolved locally, "
+          f"{len(unresolved)} left for the LLM")
+
+    # splite the unresolved names into chunks of 20
+    chunks = [unresolved[i:i + chunk_size] for i in range(0, len(unresolved), chunk_size)]
+    limiter = RateLimiter(requests_per_minute, per=60.0, burst=max_workers) if requests_per_minute else None
+    answers = {}
+    failed = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(resolve_chunk, chunk, llm_model, lookup, limiter): chunk for chunk in chunks}
+        for idx, future in enumerate(as_completed(futures)):
+            try:
+                rows, chunk_failed = future.result()
+            except Exception as e:
+                # e.g. an API error or a timeout: the answers of the other chunks are still saved
+                print(f"Error resolving a chunk of {len(futures[future])} companies: {type(e).__name__}: {e}")
+                rows, chunk_failed = {}, list(futures[future])
+            answers.update(rows)
+            failed.extend(chunk_failed)
+            print(f"Processed chunk {idx + 1}/{len(chunks)}")
+    for name, row in answers.items():
+        resolver.remember(name, row.get("ticker"), row.get("exchange"))
+    resolver.save()
+    if failed:
+        print(f"Could not resolve {len(failed)} companies: {failed}")
+
+    by_key = {normalize_company(r["company"]): r for r in resolved}
+    by_key.update({normalize_company(name): dict(row, company=name) for name, row in answers.items()})
+    result = []
+    for key, names in groups.items():
+        if key in by_key:
+            result.extend(dict(by_key[key], company=name) for name in dict.fromkeys(names))
+    return result
+
+
+def fill_stock_codes(df, resolver=None):
+    '''
+    Fill the empty and N/A `stock_code` of the extracted mentions from the resolver's map.
+    Args:
+        df (pd.DataFrame): The mentions, with `stock` and `stock_code` columns.
+        resolver (TickerResolver): The resolver, defaults to the remembered resolutions only.
+    Returns:
+        tuple: (the filled DataFrame, list of the stock names still without a code)
+    '''
+    resolver = resolver or TickerResolver()
+    df = df.copy()
+    codes = df["stock_code"]
+    empty = codes.isna() | codes.astype(str).str.strip().str.upper().isin(["", "N/A", "NA"])
+    names = df.loc[empty, "stock"].dropna().unique()
+    found = {}
+    for name in names:
+        resolution = resolver.resolve(name)
+        if resolution is not None:
+            found[name] = resolution["ticker"]
+    df.loc[empty, "stock_code"] = df.loc[empty, "stock"].map(found).fillna(df.loc[empty, "stock_code"])
+    still_empty = df.loc[empty & ~df["stock"].isin(list(found)), "stock"].dropna().unique().tolist()
+    print(f"Filled {int((empty & df['stock'].isin(list(found))).sum())} stock codes, "
+          f"{len(still_empty)} names still without a code")
+    return df, still_empty
+
 
 if __name__ == "__main__":
     import json
+    import pandas as pd
     model = "gpt-4.1-mini"  # Change to your preferred model rank #1
     #model = "gpt-4o-mini"  # Change to your preferred model rank #2
     #model = "gpt-4o"  # Change to your preferred model rank unknown
     #model = "o4-mini"  # Change to your preferred model , rank #3
     with open("output/extracted_missing_stock_codes.json", "r", encoding="utf-8") as f:
         company_list = json.load(f)
-    # splite company_list into chunks of 20
-    company_ll = [company_list[i:i + 20] for i in range(0, len(company_list), 20)]
+    resolver = TickerResolver.from_master()
+    result = fill_company_codes(company_list, llm_model=model, resolver=resolver)
 
-    result = []
-    for idx, company_list in enumerate(company_ll):
-        output = get_company_code(company_list, llm_model=model)
-        output2 = output.replace("```json", "").replace("```", "").strip()
-        try:
-            output_obj = json.loads(output2)
-        except Exception as e:
-            print(f"Error decoding JSON for chunk {idx + 1}: {e}")
-            print(f"Output: {output2}")
-            continue
-        # check the N/A
-        result.extend(output_obj)
-        print(f"Processed chunk {idx + 1}/{len(company_ll)}: {len(company_list)} companies")
-        
     with open("output/stock_codes.json", "w", encoding="utf-8") as f:
         json.dump(result, f)
-
+    if os.path.exists("output/extracted_all.csv"):
+        # fill the extracted mentions directly from the name -> ticker map
+        df = pd.read_csv("output/extracted_all.csv", encoding='utf-8-sig')
+        df, empty = fill_stock_codes(df, resolver)
+        df.to_csv("output/extracted_all_filled.csv", index=False, encoding='utf-8-sig')
+        with open("output/empty_in_filled.json", "w", encoding="utf-8") as f:
+            json.dump(empty, f, ensure_ascii=False, indent=4)
+    if get_default_cache() is not None:
+        print(f"LLM cache: {get_default_cache().stats()}")
+    if get_default_metrics() is not None:
+        report(get_default_metrics().path)
@@ -6,12 +6,14 @@
 import os
 import pandas as pd
 from dotenv import load_dotenv
-from service.helper import get_all_transcripts, get_video_transcript
-from service.helper import get_channel_video_list, get_video_metadata
+from service.helper import get_channel_video_list, get_new_channel_videos
+from service.manifest import VideoManifest
+from service.metadata import fetch_video_metadata_batch
+from service.downloader import TranscriptDownloader, STATUS_OK
 
 
 
-def main(case=0):
+def main(case=0, incremental=False):
     """
     Main function to run the scraper.
     Args:
@@ -20,9 +22,14 @@ def main(case=0):
                      1 - Get video list from channel
                      2 - Get metadata for specific videos
                      3 - Get transcripts for specific videos
+        incremental (bool): Only list the new videos and only process the videos whose
+                     state in the manifest is behind, see `sync`.
     """
     load_dotenv()
     channel_url = os.getenv("YOUTUBE_CHANNEL_URL")
+    if incremental:
+        sync(channel_url, case)
+        return
     if case in (0, 1):
         videos = get_channel_video_list(channel_url, limit=190)
         df = pd.DataFrame(videos)
@@ -30,24 +37,102 @@ def main(case=0):
         print(f"Video list saved to output/channel_videos.csv with {len(videos)} videos.")
     if case in (0,2):
         df = pd.read_csv("output/channel_videos.csv", encoding='utf-8-sig')
-        metalist = []
-        for index, row in df.iterrows():
-            video_id = row['id']
-            video_url = f"https://www.youtube.com/watch?v={video_id}"
-            metadata = get_video_metadata(video_url)
-            metalist.append(metadata)
-            print(f"Metadata for {video_id}: {metadata}")
-        df_metadata = pd.DataFrame(metalist)
-        df_metadata.to_csv("output/video_metadata.csv", index=False, encoding='utf-8-sig')
+        videos = df.to_dict(orient='records')
+        metalist, stats = fetch_video_metadata_batch(videos, output_csv="output/video_metadata.csv")
+        print(f"Metadata saved to output/video_metadata.csv: {stats}")
     if case in (0, 3):
         df = pd.read_csv("output/video_metadata.csv", encoding='utf-8-sig')
-        for index, row in df.iterrows():
-            get_all_transcripts(get_video_transcript, row, index)
-            print(f"Processing video {index + 1}/{len(df)}: {row['title']}")
+        videos = [
+            {"id": url.split('v=')[-1], "upload_date": str(udate)}
+            for url, udate in zip(df['webpage_url'], df['upload_date'])
+        ]
+        download_transcripts(videos)
     if case == 4:
        pass 
 
 
+def download_transcripts(videos, on_result=None):
+    """
+    Download and clean the transcripts of the videos concurrently.
+    Args:
+        videos (list): A list of dicts with `id` and `upload_date`.
+        on_result (callable): Optional callback called with each download result.
+    Returns:
+        list: The download results.
+    """
+    downloader = TranscriptDownloader(max_workers=4, requests_per_second=1.0)
+    done = []
+
+    def report(result):
+        done.append(result)
+        print(f"{len(done)}/{len(videos)}: {result['video_id']} {result['status']} {result['error'] or result['vtt_file']}")
+        if on_result is not None:
+            on_result(result)
+
+    results = downloader.download_all(videos, on_result=report)
+    failed = [r for r in results if r['status'] != STATUS_OK]
+    print(f"Transcripts downloaded: {len(results) - len(failed)}/{len(results)}, failed: {len(failed)}")
+    for r in failed:
+        print(f"  {r['video_id']}: {r['status']} - {r['error']}")
+    return results
+
+
+def sync(channel_url, case=0, manifest_path="output/manifest.json"):
+    """
+    Incremental sync of a channel backed by the video manifest.
+    Only the videos newer than the known ones are listed, and each stage only
+    processes the videos whose state is behind it, so a daily run is O(new videos).
+    Args:
+        channel_url (str): The YouTube channel URL.
+        case (int): The same case numbers as `main`.
+        manifest_path (str): The manifest file path.
+    """
+    manifest = VideoManifest(manifest_path)
+    if case in (0, 1):
+        videos = get_new_channel_videos(channel_url, manifest.known_ids(), limit=190)
+        new_ids = manifest.add_listed(videos)
+        manifest.save()
+        if videos:
+            df_new = pd.DataFrame(videos)
+            if os.path.exists("output/channel_videos.csv"):
+                df_old = pd.read_csv("output/channel_videos.csv", encoding='utf-8-sig')
+                df_new = pd.concat([df_new, df_old], ignore_index=True).drop_duplicates(subset='id')
+            df_new.to_csv("output/channel_videos.csv", index=False, encoding='utf-8-sig')
+        print(f"Listed {len(new_ids)} new videos, {len(manifest)} videos known.")
+    if case in (0, 2):
+        behind = set(manifest.behind("metadata"))
+        df = pd.read_csv("output/channel_videos.csv", encoding='utf-8-sig')
+        videos = [v for v in df.to_dict(orient='records') if v['id'] in behind]
+
+        def advance(video_id, metadata, error):
+            if error:
+                manifest.fail(video_id, "metadata", error)
+            else:
+                manifest.advance(video_id, "metadata", upload_date=str(metadata['upload_date']))
+
+        metalist, stats = fetch_video_metadata_batch(videos, output_csv="output/video_metadata.csv",
+                                                     append=True, on_result=advance)
+        manifest.save()
+        print(f"Metadata for {len(videos)} videos appended to output/video_metadata.csv: {stats}")
+    if case in (0, 3):
+        videos = [
+            {"id": video_id, "upload_date": manifest.get(video_id).get("upload_date")}
+            for video_id in manifest.behind("cleaned")
+            if manifest.get(video_id)["stage"] != "listed"
+        ]
+
+        def advance(result):
+            if result['status'] == STATUS_OK:
+                manifest.advance(result['video_id'], "cleaned", vtt_file=result['vtt_file'],
+                                 clean_file=result['clean_file'])
+            else:
+                manifest.fail(result['video_id'], "transcript", result['error'])
+
+        download_transcripts(videos, on_result=advance)
+        manifest.save()
+    print(f"Manifest state: {manifest.summary()}")
+
+
 
 if __name__ == "__main__":
     #case = int(sys.argv[1]) if len(sys.argv) > 1 else 0
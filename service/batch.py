@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+OpenAI Batch API job files for bulk extraction.
+A backfill writes one JSONL request per transcript, the batch is run offline by OpenAI at a
+lower price, and the results file is ingested back into `output/extracted`. Requests that
+failed, could not be parsed or are missing from the results are written to a new request
+file so only they are resubmitted.
+"""
+import json
+import os
+
+
+BATCH_DIR = "output/batch"
+BATCH_ENDPOINT = "/v1/chat/completions"
+_ID_SEPARATOR = "|"
+
+
+def make_custom_id(video_id, model):
+    """
+    Build the `custom_id` of a batch request, e.g. "20250605_abc123|gpt-4.1-mini".
+    """
+    return f"{video_id}{_ID_SEPARATOR}{model}"
+
+
+def split_custom_id(custom_id):
+    """
+    Split a `custom_id` back into (video_id, model).
+    """
+    video_id, _, model = custom_id.rpartition(_ID_SEPARATOR)
+    if not video_id:
+        raise ValueError(f"Invalid custom_id: {custom_id}")
+    return video_id, model
+
+
+def write_requests(items, path):
+    """
+    Write a batch request file.
+    Args:
+        items (iterable): (custom_id, chat completion arguments) tuples.
+        path (str): The JSONL file to write.
+    Returns:
+        int: The number of requests written.
+    """
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    count = 0
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for custom_id, body in items:
+            line = {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body}
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+            count += 1
+    os.replace(tmp, path)
+    return count
+
+
+def read_jsonl(path):
+    """
+    Read a JSONL file, skipping blank lines and reporting the malformed ones.
+    Returns:
+        list: The parsed lines.
+    """
+    rows = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                print(f"{path}:{line_no}: skipping malformed line: {e}")
+    return rows
+
+
+def read_requests(path):
+    """
+    Read a batch request file.
+    Returns:
+        dict: {custom_id: request line}, in file order.
+    """
+    return {row["custom_id"]: row for row in read_jsonl(path)}
+
+
+def result_content(row):
+    """
+    Get the model answer of a batch result line.
+    Returns:
+        tuple: (content, error message), one of them is None.
+    """
+    if row.get("error"):
+        error = row["error"]
+        return None, f"{error.get('code')}: {error.get('message')}" if isinstance(error, dict) else str(error)
+    response = row.get("response") or {}
+    status = response.get("status_code")
+    body = response.get("body") or {}
+    if status != 200:
+        message = (body.get("error") or {}).get("message") if isinstance(body, dict) else None
+        return None, f"HTTP {status}: {message or body}"
+    try:
+        content = body["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError):
+        return None, "No choices in the response body"
+    if content is None:
+        return None, f"Empty content, finish_reason={body['choices'][0].get('finish_reason')}"
+    return content, None
+
+
+def ingest_results(result_files, request_file, on_success, parse=None):
+    """
+    Ingest batch result files (the output and the error files of a batch).
+    Args:
+        result_files (list): The result JSONL files.
+        request_file (str): The request file the batch was created from, used to find the
+            requests that are missing from the results (e.g. an expired batch).
+        on_success (callable): Called with (custom_id, parsed output, request line, result line)
+            for each request that succeeded.
+        parse (callable): Parses the model answer, a raised exception marks the request as failed.
+    Returns:
+        tuple: (list of succeeded custom ids, {custom_id: error message} for the failed requests)
+    """
+    requests = read_requests(request_file)
+    succeeded = []
+    failed = {}
+    seen = set()
+    for path in result_files:
+        for row in read_jsonl(path):
+            custom_id = row.get("custom_id")
+            if custom_id not in requests or custom_id in seen:
+                continue
+            seen.add(custom_id)
+            content, error = result_content(row)
+            if error is None:
+                try:
+                    output = parse(content) if parse is not None else content
+                    on_success(custom_id, output, requests[custom_id], row)
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+            if error is None:
+                succeeded.append(custom_id)
+            else:
+                failed[custom_id] = error
+    for custom_id in requests:
+        if custom_id not in seen:
+            failed[custom_id] = "Missing from the batch results"
+    return succeeded, failed
+
+
+def write_resubmission(request_file, failed_ids, path):
+    """
+    Write a new request file with only the failed requests.
+    Returns:
+        int: The number of requests written.
+    """
+    requests = read_requests(request_file)
+    failed_ids = set(failed_ids)
+    return write_requests(((cid, row["body"]) for cid, row in requests.items() if cid in failed_ids), path)
+
+
+def submit_batch(client, request_file, metadata=None):
+    """
+    Upload a request file and create the batch.
+    Args:
+        client (openai.OpenAI): The OpenAI client.
+        request_file (str): The batch request file.
+        metadata (dict): Optional batch metadata.
+    Returns:
+        openai.types.Batch: The created batch, its `id` is used to poll it.
+    """
+    with open(request_file, "rb") as f:
+        uploaded = client.files.create(file=f, purpose="batch")
+    return client.batches.create(input_file_id=uploaded.id, endpoint=BATCH_ENDPOINT,
+                                 completion_window="24h", metadata=metadata)
+
+
+def download_batch_results(client, batch_id, folder=BATCH_DIR):
+    """
+    Download the output and error files of a finished batch.
+    Returns:
+        tuple: (batch status, list of downloaded files)
+    """
+    batch = client.batches.retrieve(batch_id)
+    files = []
+    for kind, file_id in (("output", batch.output_file_id), ("errors", batch.error_file_id)):
+        if not file_id:
+            continue
+        path = os.path.join(folder, f"{batch_id}_{kind}.jsonl")
+        os.makedirs(folder, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(client.files.content(file_id).text)
+        files.append(path)
+    return batch.status, files
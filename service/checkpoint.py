@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Checkpoint manifest of the LLM extraction, so an interrupted run resumes where it stopped.
+An extraction is done for a (video id, model, prompt version, transcript hash) key: editing
+the prompt or re-cleaning a transcript invalidates only the entries it affects.
+"""
+import hashlib
+import os
+import time
+
+from service.storage import atomic_write_json, read_json
+
+
+def text_hash(*parts):
+    """
+    Hash the given texts, used for the transcript hash and the prompt version.
+    Returns:
+        str: The first 16 hex digits of the sha256.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+class ExtractionCheckpoint:
+    """
+    A JSON manifest of the completed extractions.
+    Args:
+        path (str): The checkpoint file path.
+    Notes:
+        - Entries are stored as {"{video_id}|{model}|{prompt_version}": {"transcript_hash": ...,
+          "output_file": ..., "mentions": ..., "completed_at": ...}}.
+        - An entry only counts as done while its output file exists.
+    """
+    def __init__(self, path="output/extracted/checkpoint.json"):
+        self.path = path
+        self.entries = read_json(path, default={}).get("entries", {})
+
+    @staticmethod
+    def key(video_id, model, prompt_version):
+        return f"{video_id}|{model}|{prompt_version}"
+
+    def __len__(self):
+        return len(self.entries)
+
+    def is_done(self, video_id, model, prompt_version, transcript_hash):
+        entry = self.entries.get(self.key(video_id, model, prompt_version))
+        return (entry is not None and entry["transcript_hash"] == transcript_hash
+                and os.path.exists(entry["output_file"]))
+
+    def mark_done(self, video_id, model, prompt_version, transcript_hash, output_file, mentions=None, save=True):
+        """
+        Record a completed extraction, replacing the entry of an older transcript.
+        Args:
+            save (bool): Write the checkpoint file right away, so a crash right after keeps it.
+        """
+        self.entries[self.key(video_id, model, prompt_version)] = {
+            "transcript_hash": transcript_hash,
+            "output_file": output_file,
+            "mentions": mentions,
+            "completed_at": time.time(),
+        }
+        if save:
+            self.save()
+
+    def prune(self, model, prompt_version):
+        """
+        Remove the entries of `model` made with another prompt version.
+        Returns:
+            int: The number of removed entries.
+        """
+        stale = [k for k in self.entries
+                 if k.split("|")[1] == model and k.rsplit("|", 1)[1] != prompt_version]
+        for k in stale:
+            del self.entries[k]
+        return len(stale)
+
+    def save(self):
+        atomic_write_json(self.path, {"entries": self.entries})
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Map-reduce extraction for long transcripts.
+A cleaned transcript is split into token-bounded overlapping windows, each window is
+extracted concurrently, and the mentions are merged with a deterministic deduplication
+by ticker and stock name that keeps the strongest quote of each stock.
+"""
+import contextvars
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from service.tokens import count_tokens
+
+
+_SENTENCE_END_RE = re.compile(r"[.?!]\s")
+_NAME_SUFFIX_RE = re.compile(r"\b(inc|corp|corporation|co|company|ltd|plc|holdings|group)\b\.?", re.IGNORECASE)
+_NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+
+
+def split_transcript(text, max_tokens=3000, overlap_tokens=200, model="gpt-4.1-mini"):
+    """
+    Split a transcript into overlapping windows of at most about `max_tokens` tokens.
+    Args:
+        text (str): The cleaned transcript.
+        max_tokens (int): The token budget of a window.
+        overlap_tokens (int): The tokens repeated at the start of the next window, so a
+            mention cut at a window boundary is still seen whole once.
+        model (str): The model used to count the tokens.
+    Returns:
+        list: The windows as dicts with `index`, `text`, `char_start` and `char_end`.
+    Notes:
+        - The tokens of the whole text are counted once and converted to a characters per
+          token ratio, windows end at a sentence or word boundary.
+    """
+    if overlap_tokens >= max_tokens:
+        raise ValueError(f"overlap_tokens ({overlap_tokens}) should be smaller than max_tokens ({max_tokens}).")
+    total_tokens = count_tokens(text, model)
+    if total_tokens <= max_tokens:
+        return [{"index": 0, "text": text, "char_start": 0, "char_end": len(text)}]
+    chars_per_token = len(text) / total_tokens
+    max_chars = int(max_tokens * chars_per_token)
+    overlap_chars = int(overlap_tokens * chars_per_token)
+
+    windows = []
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + max_chars)
+        if end < len(text):
+            end = _boundary_before(text, start, end)
+        windows.append({"index": len(windows), "text": text[start:end].strip(),
+                        "char_start": start, "char_end": end})
+        if end >= len(text):
+            break
+        next_start = _word_start_after(text, end - overlap_chars)
+        start = next_start if next_start > start else end
+    return windows
+
+
+def _boundary_before(text, start, end):
+    # prefer a sentence end in the last quarter of the window, then a space
+    floor = start + (end - start) * 3 // 4
+    last = None
+    for m in _SENTENCE_END_RE.finditer(text, floor, end):
+        last = m.end()
+    if last:
+        return last
+    space = text.rfind(" ", start + 1, end)
+    return space + 1 if space > start else end
+
+
+def _word_start_after(text, pos):
+    pos = max(pos, 0)
+    if pos == 0 or text[pos - 1] == " ":
+        return pos
+    space = text.find(" ", pos)
+    return space + 1 if space >= 0 else pos
+
+
+def windows_from_segments(segments, max_tokens=3000, overlap_tokens=200, chars_per_token=4):
+    """
+    Build the windows from a `TranscriptSegments` index, so each window also knows its time range.
+    Returns:
+        list: The windows as dicts with `index`, `text`, `char_start`, `char_end`, `start_ms` and `end_ms`.
+    """
+    windows = segments.iter_windows(int(max_tokens * chars_per_token), int(overlap_tokens * chars_per_token))
+    return [dict(w, index=idx) for idx, w in enumerate(windows)]
+
+
+def normalize_name(name):
+    """
+    Normalize a company name for deduplication, e.g. "Tesla, Inc." -> "tesla".
+    """
+    name = _NAME_SUFFIX_RE.sub(" ", str(name or "").lower())
+    return _NON_WORD_RE.sub(" ", name).strip()
+
+
+def normalize_ticker(ticker):
+    if not isinstance(ticker, str):
+        return None
+    ticker = ticker.strip().upper().lstrip("$")
+    if not ticker or ticker in ("N/A", "NA", "NONE", "NULL", "UNKNOWN") or " " in ticker:
+        return None
+    return ticker
+
+
+def mention_strength(mention):
+    """
+    Rank the quotes of the same stock: the host's own opinion first, then a clear
+    positive/negative opinion, then the longer quote.
+    """
+    source = str(mention.get("source") or "").lower()
+    opinion = str(mention.get("opinion") or "").lower()
+    return (source == "host", opinion in ("positive", "negative"), len(str(mention.get("quote") or "")))
+
+
+def _stronger(entry, candidate):
+    """
+    Merge two mentions of the same stock, keeping the strongest quote and all the windows.
+    """
+    chunks = sorted(set(entry["chunks"]) | set(candidate["chunks"]))
+    winner, other = (candidate, entry) if mention_strength(candidate) > mention_strength(entry) else (entry, candidate)
+    winner = dict(winner, chunks=chunks)
+    if not normalize_ticker(winner.get("stock_code")) and normalize_ticker(other.get("stock_code")):
+        winner["stock_code"] = other["stock_code"]
+    return winner
+
+
+def merge_mentions(chunk_results):
+    """
+    Merge the mentions extracted from the windows of one transcript.
+    Args:
+        chunk_results (list): (window index, list of mentions) tuples.
+    Returns:
+        list: The merged mentions in order of first appearance. Each mention keeps the
+            strongest quote and gets `chunk` (the window of the kept quote) and `chunks`
+            (all the windows the stock was mentioned in).
+    """
+    merged = {}
+    order = []
+    name_to_key = {}
+    for chunk_idx, mentions in sorted(chunk_results, key=lambda r: r[0]):
+        for mention in mentions or []:
+            if not isinstance(mention, dict):
+                continue
+            ticker = normalize_ticker(mention.get("stock_code"))
+            name = normalize_name(mention.get("stock"))
+            if not ticker and not name:
+                continue
+            key = ("ticker", ticker) if ticker else name_to_key.get(name, ("name", name))
+            old_key = name_to_key.get(name)
+            if ticker and old_key and old_key[0] == "name" and old_key in merged:
+                # the same stock was first seen without a ticker, move it under its ticker
+                old = merged.pop(old_key)
+                idx = order.index(old_key)
+                if key in merged:
+                    order.pop(idx)
+                    merged[key] = _stronger(merged[key], old)
+                else:
+                    order[idx] = key
+                    merged[key] = old
+            if name:
+                name_to_key[name] = key
+            candidate = dict(mention, chunk=chunk_idx, chunks=[chunk_idx])
+            if key in merged:
+                merged[key] = _stronger(merged[key], candidate)
+            else:
+                merged[key] = candidate
+                order.append(key)
+    return [merged[key] for key in order]
+
+
+def extract_chunked(windows, extract_window, max_workers=4):
+    """
+    Extract every window concurrently and merge the results.
+    Args:
+        windows (list): The windows from `split_transcript` or `windows_from_segments`.
+        extract_window (callable): Takes a window text and returns the list of mentions.
+        max_workers (int): The number of windows extracted at the same time.
+    Returns:
+        tuple: (merged mentions, {window index: error message} for the failed windows); with
+            errors the mentions are partial, the caller must not record the transcript as done.
+    """
+    errors = {}
+
+    def run(window):
+        try:
+            return window["index"], extract_window(window["text"])
+        except Exception as e:  # a failed window does not lose the others
+            errors[window["index"]] = f"{type(e).__name__}: {e}"
+            return window["index"], []
+
+    # each window runs in a copy of the caller's context, so the metrics tags follow the calls
+    contexts = [contextvars.copy_context() for _ in windows]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        chunk_results = list(executor.map(lambda ctx, window: ctx.run(run, window), contexts, windows))
+    mentions = merge_mentions(chunk_results)
+    by_index = {w["index"]: w for w in windows}
+    for mention in mentions:
+        window = by_index[mention["chunk"]]
+        if "start_ms" in window:
+            mention["chunk_start_ms"] = window["start_ms"]
+    return mentions, errors
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+In-process, concurrent transcript downloader.
+It drives yt_dlp.YoutubeDL directly instead of spawning the yt-dlp CLI, fetches the
+subtitles of many videos through a bounded worker pool, and learns about finished
+files from the yt-dlp progress hooks instead of sleeping.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import yt_dlp
+from yt_dlp.utils import DownloadError
+
+from service.vtt import clean_vtt_file
+from service.segments import clean_vtt_file_with_segments
+from service.ratelimit import HostRateLimiter
+
+
+STATUS_OK = "ok"
+STATUS_MISSING = "missing"    # the video has no subtitles in the requested language
+STATUS_ERROR = "error"        # yt-dlp failed, e.g. private or removed video
+
+
+class TranscriptDownloader:
+    """
+    Download and clean the auto-generated subtitles of YouTube videos.
+    Args:
+        output_dir (str): The root output folder, transcripts go to `transcript/`
+            and cleaned text goes to `cleaned/` under it.
+        max_workers (int): The size of the worker pool.
+        requests_per_second (float): Requests allowed per second for each host.
+        lang (str): The subtitle language to download.
+        clean (bool): Whether to convert the downloaded VTT to cleaned text.
+        segments (bool): Whether to write the `.seg` segment index next to the cleaned text.
+        ydl_class (type): The YoutubeDL class, can be replaced for testing.
+    Notes:
+        - Each worker thread keeps its own YoutubeDL instance, they are not shared across threads.
+        - The files are named `{upload_date}_{video_id}.{lang}.vtt`, the same as the old CLI call.
+    """
+    def __init__(self, output_dir="output", max_workers=4, requests_per_second=1.0,
+                 lang="en", clean=True, segments=True, ydl_class=yt_dlp.YoutubeDL):
+        self.output_dir = output_dir
+        self.transcript_dir = os.path.join(output_dir, "transcript")
+        self.cleaned_dir = os.path.join(output_dir, "cleaned")
+        self.max_workers = max_workers
+        self.lang = lang
+        self.clean = clean
+        self.segments = segments
+        self.ydl_class = ydl_class
+        self.rate_limiter = HostRateLimiter(requests_per_second)
+        self._local = threading.local()
+
+    def _progress_hook(self, d):
+        if d.get("status") == "finished" and d.get("filename"):
+            self._local.finished.append(d["filename"])
+
+    def _get_ydl(self):
+        ydl = getattr(self._local, "ydl", None)
+        if ydl is None:
+            ydl_opts = {
+                "quiet": True,
+                "no_warnings": True,
+                "skip_download": True,
+                "writeautomaticsub": True,
+                "subtitleslangs": [self.lang],
+                "subtitlesformat": "vtt",
+                "outtmpl": os.path.join(self.transcript_dir, "%(upload_date)s_%(id)s"),
+                "progress_hooks": [self._progress_hook],
+            }
+            ydl = self.ydl_class(ydl_opts)
+            self._local.ydl = ydl
+        return ydl
+
+    def download(self, video_id, udate=None):
+        """
+        Download the transcript of one video.
+        Args:
+            video_id (str): The YouTube video ID.
+            udate (str): The upload date in YYYYMMDD format, only used for reporting.
+        Returns:
+            dict: The result with `video_id`, `upload_date`, `status`, `vtt_file`, `clean_file` and `error`.
+        """
+        result = {
+            "video_id": video_id,
+            "upload_date": udate,
+            "status": STATUS_ERROR,
+            "vtt_file": None,
+            "clean_file": None,
+            "error": None,
+        }
+        video_url = f"https://www.youtube.com/watch?v={video_id}"
+        self._local.finished = []
+        try:
+            self.rate_limiter.acquire(video_url)
+            info = self._get_ydl().extract_info(video_url, download=True)
+        except DownloadError as e:
+            result["error"] = str(e)
+            return result
+        info = info or {}
+        udate = info.get("upload_date") or udate
+        result["upload_date"] = udate
+
+        vtt_file = self._find_subtitle_file(info)
+        if vtt_file is None or not os.path.exists(vtt_file):
+            result["status"] = STATUS_MISSING
+            result["error"] = f"No '{self.lang}' subtitles for video {video_id}"
+            return result
+        result["vtt_file"] = vtt_file
+
+        if self.clean:
+            try:
+                clean_file = os.path.join(self.cleaned_dir, f"{udate}_{video_id}.txt")
+                if self.segments:
+                    clean_vtt_file_with_segments(vtt_file, clean_file)
+                else:
+                    clean_vtt_file(vtt_file, clean_file)
+                result["clean_file"] = clean_file
+            except (OSError, UnicodeDecodeError) as e:
+                result["error"] = f"Failed to clean {vtt_file}: {e}"
+                return result
+        result["status"] = STATUS_OK
+        return result
+
+    def _find_subtitle_file(self, info):
+        # prefer the file reported by the progress hooks, an existing file does not fire them
+        suffix = f".{self.lang}.vtt"
+        for filename in self._local.finished:
+            if filename.endswith(suffix):
+                return filename
+        requested = info.get("requested_subtitles") or {}
+        sub_info = requested.get(self.lang) or {}
+        return sub_info.get("filepath")
+
+    def download_all(self, videos, on_result=None):
+        """
+        Download the transcripts of many videos concurrently.
+        Args:
+            videos (list): A list of dicts with `id` and `upload_date`.
+            on_result (callable): Optional callback called with each result as it completes.
+        Returns:
+            list: The results in the same order as `videos`.
+        """
+        os.makedirs(self.transcript_dir, exist_ok=True)
+        if self.clean:
+            os.makedirs(self.cleaned_dir, exist_ok=True)
+        results = [None] * len(videos)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self.download, v["id"], v.get("upload_date")): idx
+                for idx, v in enumerate(videos)
+            }
+            for future in as_completed(futures):
+                idx = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:  # keep the other videos going
+                    result = {
+                        "video_id": videos[idx]["id"],
+                        "upload_date": videos[idx].get("upload_date"),
+                        "status": STATUS_ERROR,
+                        "vtt_file": None,
+                        "clean_file": None,
+                        "error": f"{type(e).__name__}: {e}",
+                    }
+                results[idx] = result
+                if on_result is not None:
+                    on_result(result)
+        return results
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+Asyncio LLM extraction engine.
+Transcripts are sent concurrently through the async OpenAI client under a request-per-minute
+and token-per-minute budget. 429 and 5xx responses are retried with exponential backoff, and
+every transcript is isolated, so one failure or malformed response never stops the run.
+"""
+import asyncio
+import random
+import time
+
+import openai
+
+from service.llm_cache import request_cache_key
+from service.ratelimit import RateLimiter
+from service.tokens import count_message_tokens
+
+
+STATUS_OK = "ok"
+STATUS_PARSE_ERROR = "parse_error"   # the model answered but the output is not valid JSON
+STATUS_ERROR = "error"               # the request failed after all retries
+
+
+def is_retryable(error):
+    """
+    Check if an OpenAI error is worth retrying: rate limits, server errors and connection errors.
+    """
+    if isinstance(error, (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return False
+
+
+def retry_after(error):
+    """
+    Get the delay requested by the server in the Retry-After header, None if not given.
+    """
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    value = response.headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class AsyncExtractionEngine:
+    """
+    Run chat completions for many transcripts concurrently.
+    Args:
+        client (openai.AsyncOpenAI): The async client, create it with max_retries=0 so the engine controls retries.
+        build_request (callable): Builds the `chat.completions.create` arguments from a transcript.
+        parse (callable): Parses the model output, a raised exception marks the transcript as a parse error.
+        concurrency (int): The maximum number of requests in flight.
+        requests_per_minute (float): The request budget, None for no limit.
+        tokens_per_minute (float): The token budget (prompt + expected completion), None for no limit.
+        max_retries (int): Retries for 429/5xx/connection errors.
+        base_delay (float): The first backoff delay in seconds, doubled on each retry.
+        max_delay (float): The maximum backoff delay in seconds.
+        expected_completion_tokens (int): Completion tokens reserved from the token budget before a call,
+            corrected with the real usage afterwards.
+        cache (LLMCache): Optional response cache, a hit skips the API call and the budgets.
+        metrics (MetricsStore): Optional metrics store, one entry is recorded per transcript.
+    """
+    def __init__(self, client, build_request, parse=None, concurrency=4, requests_per_minute=None,
+                 tokens_per_minute=None, max_retries=5, base_delay=1.0, max_delay=60.0,
+                 expected_completion_tokens=1000, cache=None, metrics=None):
+        self.client = client
+        self.build_request = build_request
+        self.parse = parse
+        self.concurrency = concurrency
+        self.request_limiter = RateLimiter(requests_per_minute, per=60.0) if requests_per_minute else None
+        self.token_limiter = RateLimiter(tokens_per_minute, per=60.0) if tokens_per_minute else None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.expected_completion_tokens = expected_completion_tokens
+        self.cache = cache
+        self.metrics = metrics
+
+    def _backoff(self, attempt, error):
+        delay = retry_after(error)
+        if delay is None:
+            delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+            delay *= 0.5 + random.random() / 2  # jitter so the workers do not retry together
+        return delay
+
+    async def complete(self, request, counters=None):
+        """
+        Send one chat completion with the budget and the retries applied.
+        Args:
+            request (dict): The `chat.completions.create` arguments.
+            counters (dict): Optional dict whose "retries" entry is incremented on each retry.
+        Returns:
+            tuple: (response, number of retries)
+        """
+        estimate = count_message_tokens(request["messages"], request.get("model")) + self.expected_completion_tokens
+        attempt = 0
+        while True:
+            if self.request_limiter:
+                await self.request_limiter.acquire_async()
+            if self.token_limiter:
+                await self.token_limiter.acquire_async(estimate)
+            try:
+                response = await self.client.chat.completions.create(**request)
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                await asyncio.sleep(self._backoff(attempt, e))
+                attempt += 1
+                if counters is not None:
+                    counters["retries"] = counters.get("retries", 0) + 1
+                continue
+            usage = getattr(response, "usage", None)
+            if self.token_limiter and usage is not None and usage.total_tokens:
+                self.token_limiter.refund(estimate - usage.total_tokens)
+            return response, attempt
+
+    async def extract_one(self, key, transcript):
+        """
+        Extract one transcript, never raises.
+        Returns:
+            dict: The result with `key`, `status`, `output` (parsed), `raw`, `error`, `retries`,
+                `elapsed`, `prompt_tokens`, `completion_tokens`, `cache_hit` and `model`.
+        """
+        result = await self._extract_one(key, transcript)
+        if self.metrics is not None and result["model"] is not None:
+            # the answer is not streamed, the first token arrives with the whole answer
+            self.metrics.record(result["model"], result["elapsed"], result["elapsed"], result["prompt_tokens"],
+                                result["completion_tokens"], retries=result["retries"],
+                                cache_hit=result["cache_hit"], status=result["status"], error=result["error"],
+                                key=key, operation="extract_async")
+        return result
+
+    async def _extract_one(self, key, transcript):
+        result = {"key": key, "status": STATUS_ERROR, "output": None, "raw": None, "error": None,
+                  "retries": 0, "elapsed": 0.0, "prompt_tokens": 0, "completion_tokens": 0,
+                  "cache_hit": False, "model": None}
+        start = time.perf_counter()
+        try:
+            request = self.build_request(transcript)
+            result["model"] = request["model"]
+            cache_key = request_cache_key(request) if self.cache is not None else None
+            cached = self.cache.get(cache_key) if cache_key else None
+            if cached is not None:
+                result["cache_hit"] = True
+                raw = cached["content"]
+            else:
+                response, _ = await self.complete(request, counters=result)
+                usage = getattr(response, "usage", None)
+                if usage is not None:
+                    result["prompt_tokens"] = usage.prompt_tokens or 0
+                    result["completion_tokens"] = usage.completion_tokens or 0
+                raw = response.choices[0].message.content or ""
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+            result["elapsed"] = time.perf_counter() - start
+            return result
+        result["elapsed"] = time.perf_counter() - start
+        result["raw"] = raw
+        if self.parse is None:
+            result["output"] = raw
+            result["status"] = STATUS_OK
+            return result
+        try:
+            result["output"] = self.parse(raw)
+            result["status"] = STATUS_OK
+        except Exception as e:
+            result["status"] = STATUS_PARSE_ERROR
+            result["error"] = f"{type(e).__name__}: {e}"
+            return result
+        if cache_key and not result["cache_hit"]:
+            # only well formed answers are cached, a malformed one is asked again next time
+            self.cache.put(cache_key, request["model"], raw, result["prompt_tokens"], result["completion_tokens"])
+        return result
+
+    async def run(self, items, on_result=None):
+        """
+        Extract many transcripts concurrently.
+        Args:
+            items (list): A list of (key, transcript) tuples.
+            on_result (callable): Optional callback called with each result as soon as it completes.
+        Returns:
+            tuple: (results in the order of `items`, stats dict)
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        start = time.perf_counter()
+
+        async def worker(key, transcript):
+            async with semaphore:
+                result = await self.extract_one(key, transcript)
+            if on_result is not None:
+                try:
+                    on_result(result)
+                except Exception as e:  # a failing callback only affects its own transcript
+                    result["status"] = STATUS_ERROR
+                    result["error"] = f"on_result failed: {type(e).__name__}: {e}"
+            return result
+
+        results = await asyncio.gather(*(worker(key, transcript) for key, transcript in items))
+        return results, summarize(results, time.perf_counter() - start)
+
+
+def summarize(results, elapsed):
+    """
+    Summarize a run: counts by status, tokens, retries and throughput in transcripts per minute.
+    """
+    stats = {
+        "transcripts": len(results),
+        STATUS_OK: sum(r["status"] == STATUS_OK for r in results),
+        STATUS_PARSE_ERROR: sum(r["status"] == STATUS_PARSE_ERROR for r in results),
+        STATUS_ERROR: sum(r["status"] == STATUS_ERROR for r in results),
+        "retries": sum(r["retries"] for r in results),
+        "cache_hits": sum(r["cache_hit"] for r in results),
+        "prompt_tokens": sum(r["prompt_tokens"] for r in results),
+        "completion_tokens": sum(r["completion_tokens"] for r in results),
+        "elapsed_s": round(elapsed, 3),
+    }
+    stats["transcripts_per_minute"] = round(len(results) / elapsed * 60, 2) if elapsed > 0 else 0.0
+    return stats
@@ -6,8 +6,8 @@ It includes functions to clean VTT files, download video transcripts, and fetch
 import os
 import re
 from pathlib import Path
-from time import sleep
 import yt_dlp
+from service.vtt import clean_vtt_file
 from twilio.rest import Client
 
 
@@ -64,25 +64,54 @@ def get_video_transcript(video_id, output_file):
     Notes:
         - This function is passed to `get_all_transcripts` to download subtitles for each video.
         - The subtitles are saved in VTT format.
-        - The function uses yt-dlp to download the subtitles, ensure yt-dlp is installed and configured correctly.
+        - The function drives yt_dlp.YoutubeDL in-process, use `service.downloader.TranscriptDownloader` for many videos.
+    Returns:
+        str: The path of the downloaded subtitle file, or None if the video has no English subtitles.
     """
     video_url = f"https://www.youtube.com/watch?v={video_id}"
-    os.system(f'yt-dlp --write-auto-sub --sub-lang en --skip-download -o "{output_file}" "{video_url}"')
+    finished = []
+
+    def progress_hook(d):
+        if d.get("status") == "finished":
+            finished.append(d.get("filename"))
+
+    ydl_opts = {
+        'quiet': True,
+        'skip_download': True,
+        'writeautomaticsub': True,
+        'subtitleslangs': ['en'],
+        'subtitlesformat': 'vtt',
+        'outtmpl': output_file,
+        'progress_hooks': [progress_hook],
+    }
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(video_url, download=True) or {}
+    if finished:
+        return finished[-1]
+    # an already present file does not fire the hooks
+    return ((info.get("requested_subtitles") or {}).get("en") or {}).get("filepath")
+
+
+def metadata_from_info(info):
+    """
+    Pick the metadata fields saved to video_metadata.csv from a yt-dlp info dict.
+    """
+    return {
+        "title": info.get("title"),
+        "upload_date": info.get("upload_date"),  # format: YYYYMMDD
+        "duration": info.get("duration"),        # in seconds
+        "channel": info.get("uploader"),
+        "view_count": info.get("view_count"),
+        "description": info.get("description"),
+        "tags": info.get("tags"),
+        "webpage_url": info.get("webpage_url")
+    }
 
 
 def get_video_metadata(video_url):
     with yt_dlp.YoutubeDL({'quiet': True}) as ydl:
         info = ydl.extract_info(video_url, download=False)
-        return {
-            "title": info.get("title"),
-            "upload_date": info.get("upload_date"),  # format: YYYYMMDD
-            "duration": info.get("duration"),        # in seconds
-            "channel": info.get("uploader"),
-            "view_count": info.get("view_count"),
-            "description": info.get("description"),
-            "tags": info.get("tags"),
-            "webpage_url": info.get("webpage_url")
-        }
+        return metadata_from_info(info)
 
 
 def get_channel_video_list(channel_url, limit=10):
@@ -108,6 +137,50 @@ def get_channel_video_list(channel_url, limit=10):
         ]
 
 
+def get_new_channel_videos(channel_url, known_ids, limit=190, stop_after_known=3):
+    """
+    Lists the videos of a YouTube channel newest first, stopping at the already known ones.
+    Args:
+        channel_url (str): The channel or playlist URL.
+        known_ids (set): The ids of the videos seen in previous runs.
+        limit (int): The maximum number of videos to list.
+        stop_after_known (int): Stop after this many consecutive known videos, a few are
+            tolerated because pinned or re-ordered videos can show up before the new ones.
+    Returns:
+        list: The new videos as dicts with `title`, `url`, `id` and `view_count`.
+    Notes:
+        - The playlist is extracted with process=False, so yt-dlp fetches pages lazily and
+          the pagination stops as soon as the known videos are reached.
+    """
+    ydl_opts = {
+        'quiet': True,
+        'extract_flat': 'in_playlist',
+        'lazy_playlist': True,
+    }
+    new_videos = []
+    known_in_a_row = 0
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(channel_url, download=False, process=False)
+        # a channel home page redirects to its videos tab
+        while info and info.get('_type') in ('url', 'url_transparent'):
+            info = ydl.extract_info(info['url'], download=False, process=False)
+        for v in (info or {}).get('entries') or []:
+            video_id = v.get('id')
+            if video_id in known_ids:
+                known_in_a_row += 1
+                if known_in_a_row >= stop_after_known:
+                    break
+                continue
+            known_in_a_row = 0
+            new_videos.append({
+                'title': v.get('title'),
+                'url': f"https://www.youtube.com/watch?v={video_id}",
+                'id': video_id,
+                'view_count': v.get('view_count'),
+            })
+            if len(new_videos) >= limit:
+                break
+    return new_videos
 
 
 def get_all_transcripts(get_video_transcript, row, index):
@@ -133,17 +206,14 @@ def extracxt_n_clean_transcript(VIDEO_ID, udate):
     """
     output_dir = "output"
     output_file_noext = f"{output_dir}/transcript/{udate}_{VIDEO_ID}"
-    output_file = f"{output_file_noext}.en.vtt"
-    os.makedirs(output_dir, exist_ok=True)
-    get_video_transcript(VIDEO_ID, output_file_noext)
-    sleep(1)  # Wait for the file to be created
+    os.makedirs(f"{output_dir}/transcript", exist_ok=True)
+    os.makedirs(f"{output_dir}/cleaned", exist_ok=True)
+    output_file = get_video_transcript(VIDEO_ID, output_file_noext)
+    if output_file is None or not os.path.exists(output_file):
+        raise FileNotFoundError(f"No English subtitles downloaded for video {VIDEO_ID}")
     # convert
-    with open(output_file, "r", encoding="utf-8") as f:
-        vtt_content = f.read()
-    cleaned = clean_vtt_to_script(vtt_content, is_file_path=False)
     clear_text_file = f"output/cleaned/{udate}_{VIDEO_ID}.txt"
-    with open(clear_text_file, "w", encoding="utf-8") as f:
-        f.write(cleaned)
+    clean_vtt_file(output_file, clear_text_file)
     return output_file, clear_text_file
 
 
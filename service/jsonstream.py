@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental parser for the JSON arrays returned by the LLM.
+The model answer is fed chunk by chunk as it streams in; each object of the array is parsed
+and validated as soon as its closing brace arrives. Prose and markdown fences around the
+array are ignored, and a malformed or truncated object is repaired when possible instead of
+discarding the whole answer.
+"""
+import json
+
+
+MENTION_FIELDS = ("stock", "stock_code", "opinion", "source", "quote")
+OPINIONS = ("positive", "negative", "neutral")
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def validate_mention(obj):
+    """
+    Validate and normalize a stock mention against the extraction schema.
+    `stock` and `opinion` are required, a missing ticker becomes "N/A" and the other
+    fields default to an empty string. Fields outside the schema are dropped.
+    Returns:
+        dict: The normalized mention.
+    Raises:
+        ValueError: The object does not match the schema.
+    """
+    if not isinstance(obj, dict):
+        raise ValueError(f"Expected an object, got {type(obj).__name__}")
+    stock = obj.get("stock")
+    if not isinstance(stock, str) or not stock.strip():
+        raise ValueError(f"Missing stock name in {obj}")
+    opinion = str(obj.get("opinion") or "").strip().lower()
+    if opinion not in OPINIONS:
+        raise ValueError(f"Invalid opinion {obj.get('opinion')!r} for {stock}")
+    code = obj.get("stock_code")
+    return {
+        "stock": stock.strip(),
+        "stock_code": code.strip() if isinstance(code, str) and code.strip() else "N/A",
+        "opinion": opinion,
+        "source": str(obj.get("source") or "").strip(),
+        "quote": str(obj.get("quote") or "").strip(),
+    }
+
+
+def _closing_suffix(text):
+    """
+    Compute the characters that close the open strings, objects and arrays of a JSON prefix.
+    """
+    stack = []
+    in_string = escape = False
+    for ch in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in _CLOSERS:
+            stack.append(_CLOSERS[ch])
+        elif ch in "]}" and stack:
+            stack.pop()
+    suffix = ('\\' if escape else '') + ('"' if in_string else '')
+    return suffix + "".join(reversed(stack))
+
+
+def repair_json(text, max_cuts=20):
+    """
+    Try to parse a truncated or slightly malformed JSON object.
+    The open strings and brackets are closed, and the last incomplete member is dropped
+    until the text parses.
+    Returns:
+        The parsed value, None if it cannot be repaired.
+    """
+    candidate = text.rstrip()
+    for _ in range(max_cuts):
+        try:
+            return json.loads(candidate + _closing_suffix(candidate))
+        except ValueError:
+            pass
+        cut = candidate.rfind(",")
+        if cut <= 0:
+            return None
+        candidate = candidate[:cut].rstrip()
+    return None
+
+
+class JsonArrayStreamParser:
+    """
+    Parse the objects of a JSON array as the text streams in.
+    Args:
+        validate (callable): Validates and normalizes each object, a raised ValueError
+            rejects it. None keeps the objects as parsed.
+    Attributes:
+        found (bool): A JSON array or object was found in the text.
+        errors (list): The rejected objects, as error messages.
+        salvaged (int): The objects recovered by `repair_json`.
+    Notes:
+        - The first top-level array is parsed, the text after it is ignored.
+        - Objects outside an array are accepted too, and an object wrapping the list
+          (e.g. {"mentions": [...]}) is unwrapped.
+    """
+    def __init__(self, validate=None):
+        self.validate = validate
+        self.found = False
+        self.errors = []
+        self.salvaged = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._in_array = False
+        self._done = False
+        self._item = None
+
+    def feed(self, chunk):
+        """
+        Feed the next piece of the answer.
+        Returns:
+            list: The objects completed by this piece.
+        """
+        completed = []
+        for ch in chunk:
+            if self._done:
+                break
+            if self._item is not None:
+                self._item.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = self._depth > 0
+            elif ch == "[" or ch == "{":
+                item_depth = 1 if self._in_array else 0
+                if ch == "[" and self._depth == 0 and self._item is None:
+                    self._in_array = self.found = True
+                elif ch == "{" and self._depth == item_depth and self._item is None:
+                    self._item = ["{"]
+                    self.found = True
+                self._depth += 1
+            elif (ch == "]" or ch == "}") and self._depth > 0:
+                self._depth -= 1
+                if self._item is not None and self._depth == (1 if self._in_array else 0):
+                    completed.extend(self._finish("".join(self._item), complete=True))
+                    self._item = None
+                elif self._in_array and self._depth == 0:
+                    self._done = True
+        return completed
+
+    def close(self):
+        """
+        End the stream and salvage the truncated last object, if any.
+        Returns:
+            list: The salvaged objects.
+        """
+        item, self._item = self._item, None
+        self._done = True
+        if item is None:
+            return []
+        return self._finish("".join(item), complete=False)
+
+    def _finish(self, text, complete):
+        value = None
+        if complete:
+            try:
+                value = json.loads(text)
+            except ValueError:
+                pass
+        if value is None:
+            value = repair_json(text)
+            if value is None:
+                self.errors.append(f"Malformed object: {text[:80]}")
+                return []
+            self.salvaged += 1
+        values = [value]
+        if isinstance(value, dict) and len(value) == 1:
+            inner = next(iter(value.values()))
+            if isinstance(inner, list):
+                values = inner
+        if self.validate is None:
+            return values
+        valid = []
+        for value in values:
+            try:
+                valid.append(self.validate(value))
+            except ValueError as e:
+                self.errors.append(str(e))
+        return valid
+
+
+def parse_json_array(text, validate=None):
+    """
+    Parse a complete LLM answer holding a JSON array, salvaging what can be salvaged.
+    Args:
+        text (str): The model answer, possibly with prose and markdown fences.
+        validate (callable): See `JsonArrayStreamParser`.
+    Returns:
+        list: The valid objects.
+    Raises:
+        ValueError: The answer does not hold any JSON array or object.
+    """
+    parser = JsonArrayStreamParser(validate)
+    items = parser.feed(text)
+    items.extend(parser.close())
+    if not parser.found:
+        raise ValueError(f"No JSON array in the answer: {text[:80]!r}")
+    return items
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Shared entry point for the OpenAI chat completions made by the scripts.
+Every call goes through the response cache, so unchanged prompts are never sent twice,
+and is recorded in the metrics store when one is given.
+"""
+import time
+
+from service.jsonstream import JsonArrayStreamParser
+from service.llm_cache import request_cache_key
+
+
+def chat_completion(client, request, cache=None, metrics=None, validate=None):
+    """
+    Run a chat completion, serving it from the cache when possible.
+    Args:
+        client (openai.OpenAI): The OpenAI client.
+        request (dict): The `chat.completions.create` arguments.
+        cache (LLMCache): The response cache, None to always call the API.
+        metrics (MetricsStore): The metrics store, None to not record the call.
+        validate (callable): Called with the answer before caching it, e.g. the parser of the
+            caller; an answer it rejects with a ValueError is returned but not cached, so the
+            next call asks again. None caches every non-empty answer.
+    Returns:
+        str: The content of the model answer.
+    """
+    key = None
+    start = time.perf_counter()
+    if cache is not None:
+        key = request_cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            if metrics is not None:
+                metrics.record(request["model"], time.perf_counter() - start, cache_hit=True)
+            return cached["content"]
+    try:
+        # the raw response tells how many times the client retried the request
+        raw = client.chat.completions.with_raw_response.create(**request)
+        response = raw.parse()
+    except Exception as e:
+        if metrics is not None:
+            metrics.record(request["model"], time.perf_counter() - start, status="error",
+                           error=f"{type(e).__name__}: {e}")
+        raise
+    wall = time.perf_counter() - start
+    content = response.choices[0].message.content
+    usage = getattr(response, "usage", None)
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    if metrics is not None:
+        # without streaming the first token arrives with the whole answer
+        metrics.record(request["model"], wall, wall, prompt_tokens, completion_tokens,
+                       retries=getattr(raw, "retries_taken", 0))
+    if cache is not None and content is not None and _is_valid(content, validate):
+        cache.put(key, request["model"], content, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+    return content
+
+
+def _is_valid(content, validate):
+    if validate is None:
+        return True
+    try:
+        validate(content)
+    except ValueError:
+        return False
+    return True
+
+
+class StreamedArray:
+    """
+    Stream a chat completion whose answer is a JSON array, yielding each object as soon as it closes.
+    Iterate it once; afterwards `content`, `usage`, `errors`, `salvaged`, `cache_hit`, `retries`
+    (of the client), `first_token_s` and `first_item_s` (seconds to the first object) describe the call.
+    Args:
+        client (openai.OpenAI): The OpenAI client.
+        request (dict): The `chat.completions.create` arguments.
+        validate (callable): Validates each object, see `JsonArrayStreamParser`.
+        cache (LLMCache): The response cache, None to always call the API.
+        metrics (MetricsStore): The metrics store, None to not record the call.
+    Notes:
+        - Only answers holding a JSON array without rejected objects are cached.
+    """
+    def __init__(self, client, request, validate=None, cache=None, metrics=None):
+        self.client = client
+        self.request = request
+        self.validate = validate
+        self.cache = cache
+        self.metrics = metrics
+        self.first_token_s = None
+        self.content = None
+        self.usage = None
+        self.errors = []
+        self.salvaged = 0
+        self.cache_hit = False
+        self.first_item_s = None
+        self.retries = 0
+
+    def __iter__(self):
+        parser = JsonArrayStreamParser(self.validate)
+        start = time.perf_counter()
+        key = request_cache_key(self.request) if self.cache is not None else None
+        cached = self.cache.get(key) if key else None
+        if cached is not None:
+            self.cache_hit = True
+            chunks = [cached["content"]]
+        else:
+            chunks = self._stream()
+        parts = []
+        try:
+            for chunk in chunks:
+                if self.first_token_s is None:
+                    self.first_token_s = time.perf_counter() - start
+                parts.append(chunk)
+                for item in parser.feed(chunk):
+                    if self.first_item_s is None:
+                        self.first_item_s = time.perf_counter() - start
+                    yield item
+        except Exception as e:
+            if self.metrics is not None:
+                self.metrics.record(self.request["model"], time.perf_counter() - start, self.first_token_s,
+                                    status="error", error=f"{type(e).__name__}: {e}")
+            raise
+        yield from parser.close()
+        if self.metrics is not None:
+            self.metrics.record(self.request["model"], time.perf_counter() - start, self.first_token_s,
+                                getattr(self.usage, "prompt_tokens", 0) or 0,
+                                getattr(self.usage, "completion_tokens", 0) or 0, retries=self.retries,
+                                cache_hit=self.cache_hit, first_item_s=self.first_item_s)
+        self.content = "".join(parts)
+        self.errors = parser.errors
+        self.salvaged = parser.salvaged
+        if key and not self.cache_hit and parser.found and not parser.errors and not parser.salvaged:
+            self.cache.put(key, self.request["model"], self.content,
+                           prompt_tokens=getattr(self.usage, "prompt_tokens", 0) or 0,
+                           completion_tokens=getattr(self.usage, "completion_tokens", 0) or 0)
+
+    def _stream(self):
+        raw = self.client.chat.completions.with_raw_response.create(**self.request, stream=True,
+                                                                    stream_options={"include_usage": True})
+        self.retries = getattr(raw, "retries_taken", 0)
+        stream = raw.parse()
+        for chunk in stream:
+            if getattr(chunk, "usage", None) is not None:
+                self.usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Content-addressed cache of LLM responses in a local SQLite file.
+Responses are keyed by a hash of (model, system prompt, user prompt, temperature), so a
+re-run with the same transcript, prompt and model never calls the API again. The cache
+evicts the least recently used entries once it grows past its size limit.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+DEFAULT_CACHE_PATH = "output/cache/llm_cache.sqlite"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def cache_key(model, system_prompt, user_prompt, temperature=None):
+    """
+    Compute the cache key of a chat completion.
+    """
+    payload = json.dumps([model, system_prompt, user_prompt, temperature], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def request_cache_key(request):
+    """
+    Compute the cache key of `chat.completions.create` arguments built by `build_request`.
+    """
+    system_prompt = "\n".join(m["content"] for m in request["messages"] if m["role"] == "system")
+    user_prompt = "\n".join(m["content"] for m in request["messages"] if m["role"] != "system")
+    return cache_key(request["model"], system_prompt, user_prompt, request.get("temperature"))
+
+
+class LLMCache:
+    """
+    SQLite backed LLM response cache with size based LRU eviction.
+    Args:
+        path (str): The SQLite file path.
+        max_bytes (int): The maximum total size of the cached responses.
+    Notes:
+        - The cache is safe to share between threads.
+        - `stats()` reports the hits and misses of this process and the size of the cache.
+    """
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                content TEXT,
+                prompt_tokens INTEGER,
+                completion_tokens INTEGER,
+                size INTEGER,
+                created_at REAL,
+                accessed_at REAL
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON responses (accessed_at)")
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        Look up a response.
+        Returns:
+            dict: The `content`, `model`, `prompt_tokens` and `completion_tokens`, None on a miss.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, model, prompt_tokens, completion_tokens FROM responses WHERE key = ?",
+                (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        return {"content": row[0], "model": row[1], "prompt_tokens": row[2], "completion_tokens": row[3]}
+
+    def __contains__(self, key):
+        """
+        Whether a response is cached, without counting a lookup nor refreshing the entry.
+        """
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM responses WHERE key = ?", (key,)).fetchone() is not None
+
+    def put(self, key, model, content, prompt_tokens=0, completion_tokens=0):
+        """
+        Store a response and evict the oldest entries if the cache is too big.
+        """
+        now = time.time()
+        size = len(content.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, model, content, prompt_tokens, completion_tokens, size, now, now))
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY accessed_at ASC").fetchall()
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_default_cache():
+    """
+    Get the process wide cache at LLM_CACHE_PATH (default output/cache/llm_cache.sqlite).
+    Set LLM_CACHE_PATH to an empty string to disable caching.
+    Returns:
+        LLMCache: The cache, None if caching is disabled.
+    """
+    global _default_cache
+    path = os.getenv("LLM_CACHE_PATH", DEFAULT_CACHE_PATH)
+    if not path:
+        return None
+    with _default_lock:
+        if _default_cache is None or _default_cache.path != path:
+            _default_cache = LLMCache(path)
+        return _default_cache
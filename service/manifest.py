@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent video manifest used by the incremental sync mode.
+The manifest records every known video id and the last pipeline stage it completed,
+so each stage only processes the videos that are behind it.
+"""
+import time
+
+from service.storage import atomic_write_json, read_json
+
+
+# the pipeline stages in order, a video at a stage has completed all the earlier ones
+STAGES = ("listed", "metadata", "transcript", "cleaned", "extracted", "evaluated")
+
+
+def stage_index(stage):
+    if stage not in STAGES:
+        raise ValueError(f"Invalid stage: {stage}. Choose from {STAGES}.")
+    return STAGES.index(stage)
+
+
+class VideoManifest:
+    """
+    A JSON manifest of channel videos and their per-stage state.
+    Args:
+        path (str): The manifest file path.
+    Notes:
+        - Each entry is stored as {"stage": ..., "listed_at": ..., "updated_at": ..., "error": ..., **fields}.
+        - Videos keep the order they were listed in, newest first.
+    """
+    def __init__(self, path="output/manifest.json"):
+        self.path = path
+        data = read_json(path, default={})
+        self.videos = data.get("videos", {})
+        self.order = data.get("order", list(self.videos.keys()))
+
+    def __contains__(self, video_id):
+        return video_id in self.videos
+
+    def __len__(self):
+        return len(self.videos)
+
+    def known_ids(self):
+        return set(self.videos.keys())
+
+    def get(self, video_id):
+        return self.videos.get(video_id)
+
+    def add_listed(self, videos):
+        """
+        Add newly listed videos, the known ones are left untouched.
+        Args:
+            videos (list): A list of dicts with `id` and optionally `title`, newest first.
+        Returns:
+            list: The ids of the videos that were not known before.
+        """
+        now = time.time()
+        new_ids = []
+        for video in videos:
+            video_id = video["id"]
+            if video_id in self.videos:
+                continue
+            self.videos[video_id] = {
+                "stage": "listed",
+                "title": video.get("title"),
+                "listed_at": now,
+                "updated_at": now,
+                "error": None,
+            }
+            new_ids.append(video_id)
+        # new videos are the newest ones, keep them in front
+        self.order = new_ids + self.order
+        return new_ids
+
+    def advance(self, video_id, stage, **fields):
+        """
+        Mark a video as having completed `stage`, a video never moves backwards.
+        Args:
+            video_id (str): The YouTube video ID.
+            stage (str): The completed stage.
+            fields: Extra fields to store with the video, e.g. upload_date.
+        """
+        entry = self.videos[video_id]
+        if stage_index(stage) > stage_index(entry["stage"]):
+            entry["stage"] = stage
+        entry.update(fields)
+        entry["error"] = None
+        entry["updated_at"] = time.time()
+
+    def fail(self, video_id, stage, error):
+        """
+        Record a failure of `stage`, the video stays behind and is retried on the next run.
+        """
+        entry = self.videos[video_id]
+        entry["error"] = {"stage": stage, "message": str(error)}
+        entry["updated_at"] = time.time()
+
+    def reset(self, video_id, stage):
+        """
+        Move a video back so that `stage` and the later stages run again.
+        """
+        entry = self.videos[video_id]
+        idx = stage_index(stage)
+        if stage_index(entry["stage"]) >= idx:
+            entry["stage"] = STAGES[max(idx - 1, 0)]
+            entry["updated_at"] = time.time()
+
+    def behind(self, stage):
+        """
+        Get the videos that have not completed `stage` yet.
+        Returns:
+            list: The video ids, newest first.
+        """
+        idx = stage_index(stage)
+        return [v for v in self.order if stage_index(self.videos[v]["stage"]) < idx]
+
+    def summary(self):
+        counts = {stage: 0 for stage in STAGES}
+        for entry in self.videos.values():
+            counts[entry["stage"]] += 1
+        return counts
+
+    def save(self):
+        atomic_write_json(self.path, {"videos": self.videos, "order": self.order})
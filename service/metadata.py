@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""
+Batch video metadata fetching with a persistent on-disk cache.
+YoutubeDL instances are reused by the worker threads, finished rows are streamed to the
+output CSV as they complete, and already known videos are served from the cache.
+"""
+import csv
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import yt_dlp
+from yt_dlp.utils import DownloadError
+
+from service.helper import metadata_from_info
+from service.ratelimit import HostRateLimiter
+from service.storage import atomic_write_json, read_json
+
+
+METADATA_FIELDS = list(metadata_from_info({}).keys())
+# fields that change after publishing, they expire after the cache TTL
+VOLATILE_FIELDS = ("view_count",)
+
+
+class MetadataCache:
+    """
+    A JSON file cache of video metadata keyed by video id.
+    Args:
+        path (str): The cache file path.
+        ttl (float): Seconds after which the volatile fields of an entry are stale.
+    Notes:
+        - Stable fields (title, upload_date, ...) never expire.
+        - Each entry is stored as {"fetched_at": epoch seconds, "metadata": {...}}.
+    """
+    def __init__(self, path="output/cache/video_metadata.json", ttl=24 * 3600):
+        self.path = path
+        self.ttl = ttl
+        self._entries = read_json(path, default={})
+        self._lock = threading.Lock()
+        self._dirty = 0
+
+    def __contains__(self, video_id):
+        return video_id in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, video_id):
+        """
+        Returns:
+            tuple: (metadata or None, True if the volatile fields are still fresh)
+        """
+        entry = self._entries.get(video_id)
+        if entry is None:
+            return None, False
+        fresh = time.time() - entry.get("fetched_at", 0) < self.ttl
+        return dict(entry["metadata"]), fresh
+
+    def put(self, video_id, metadata, fetched_at=None):
+        with self._lock:
+            self._entries[video_id] = {
+                "fetched_at": fetched_at if fetched_at is not None else time.time(),
+                "metadata": metadata,
+            }
+            self._dirty += 1
+
+    def refresh_volatile(self, video_id, values):
+        """
+        Update the volatile fields of a cached entry, e.g. from the channel listing.
+        """
+        with self._lock:
+            entry = self._entries[video_id]
+            entry["metadata"].update({k: v for k, v in values.items() if k in VOLATILE_FIELDS})
+            entry["fetched_at"] = time.time()
+            self._dirty += 1
+
+    def save(self, force=False):
+        with self._lock:
+            if not (self._dirty or force):
+                return
+            atomic_write_json(self.path, self._entries, indent=None)
+            self._dirty = 0
+
+
+class MetadataFetcher:
+    """
+    Fetch the metadata of many videos concurrently.
+    Args:
+        cache (MetadataCache): The metadata cache, None to always fetch.
+        max_workers (int): The size of the worker pool.
+        requests_per_second (float): Requests allowed per second for each host.
+        ydl_class (type): The YoutubeDL class, can be replaced for testing.
+    """
+    def __init__(self, cache=None, max_workers=4, requests_per_second=2.0, ydl_class=yt_dlp.YoutubeDL):
+        self.cache = cache
+        self.max_workers = max_workers
+        self.ydl_class = ydl_class
+        self.rate_limiter = HostRateLimiter(requests_per_second)
+        self._local = threading.local()
+        self.stats = {"cached": 0, "refreshed": 0, "fetched": 0, "failed": 0}
+
+    def _get_ydl(self):
+        ydl = getattr(self._local, "ydl", None)
+        if ydl is None:
+            ydl = self.ydl_class({'quiet': True, 'no_warnings': True})
+            self._local.ydl = ydl
+        return ydl
+
+    def fetch(self, video_id):
+        """
+        Fetch the metadata of one video from YouTube, bypassing the cache.
+        """
+        video_url = f"https://www.youtube.com/watch?v={video_id}"
+        self.rate_limiter.acquire(video_url)
+        info = self._get_ydl().extract_info(video_url, download=False)
+        return metadata_from_info(info)
+
+    def _lookup(self, video_id, listing_row):
+        """
+        Try to serve a video from the cache, refreshing the volatile fields from the listing.
+        """
+        if self.cache is None:
+            return None
+        metadata, fresh = self.cache.get(video_id)
+        if metadata is None:
+            return None
+        if fresh:
+            self.stats["cached"] += 1
+            return metadata
+        listed = {k: listing_row.get(k) for k in VOLATILE_FIELDS if _has_value(listing_row.get(k))}
+        if len(listed) == len(VOLATILE_FIELDS):
+            self.cache.refresh_volatile(video_id, listed)
+            metadata.update(listed)
+            self.stats["refreshed"] += 1
+            return metadata
+        return None
+
+    def fetch_all(self, videos, output_csv=None, on_result=None, save_every=20, append=False):
+        """
+        Fetch the metadata of many videos, serving what it can from the cache.
+        Args:
+            videos (list): A list of dicts with `id` and optionally the listing fields such as `view_count`.
+            output_csv (str): If given, each row is appended to this CSV as soon as it completes.
+            on_result (callable): Optional callback called with (video_id, metadata or None, error or None).
+            save_every (int): Save the cache after this many new fetches.
+            append (bool): Append to `output_csv` instead of overwriting it.
+        Returns:
+            list: The metadata dicts in the same order as `videos`, None for the failed ones.
+        """
+        results = [None] * len(videos)
+        writer = _CsvStreamWriter(output_csv, METADATA_FIELDS, append=append) if output_csv else None
+        try:
+            pending = []
+            for idx, video in enumerate(videos):
+                metadata = self._lookup(video["id"], video)
+                if metadata is None:
+                    pending.append(idx)
+                    continue
+                results[idx] = metadata
+                if writer:
+                    writer.write(metadata)
+                if on_result is not None:
+                    on_result(video["id"], metadata, None)
+
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = {executor.submit(self.fetch, videos[idx]["id"]): idx for idx in pending}
+                for future in as_completed(futures):
+                    idx = futures[future]
+                    video_id = videos[idx]["id"]
+                    try:
+                        metadata = future.result()
+                    except DownloadError as e:
+                        self.stats["failed"] += 1
+                        if on_result is not None:
+                            on_result(video_id, None, str(e))
+                        continue
+                    self.stats["fetched"] += 1
+                    results[idx] = metadata
+                    if writer:
+                        writer.write(metadata)
+                    if self.cache is not None:
+                        self.cache.put(video_id, metadata)
+                        if self.stats["fetched"] % save_every == 0:
+                            self.cache.save()
+                    if on_result is not None:
+                        on_result(video_id, metadata, None)
+        finally:
+            if writer:
+                writer.close()
+            if self.cache is not None:
+                self.cache.save()
+        return results
+
+
+def _has_value(value):
+    if value is None:
+        return False
+    return not (isinstance(value, float) and math.isnan(value))
+
+
+class _CsvStreamWriter:
+    """
+    Append rows to a CSV file as they arrive, flushing after each row.
+    """
+    def __init__(self, path, fieldnames, append=False):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        write_header = not (append and os.path.exists(path) and os.path.getsize(path) > 0)
+        self._file = open(path, "a" if append else "w", newline="", encoding="utf-8-sig")
+        self._writer = csv.DictWriter(self._file, fieldnames=fieldnames, extrasaction="ignore")
+        if write_header:
+            self._writer.writeheader()
+        self._lock = threading.Lock()
+
+    def write(self, row):
+        with self._lock:
+            self._writer.writerow({k: ("" if v is None else v) for k, v in row.items()})
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def fetch_video_metadata_batch(videos, output_csv="output/video_metadata.csv",
+                               cache_path="output/cache/video_metadata.json", ttl=24 * 3600,
+                               max_workers=4, append=False, on_result=None):
+    """
+    Fetch the metadata for a channel listing, only new or stale videos hit the network.
+    Args:
+        videos (list): A list of dicts with `id` and the listing `view_count`.
+        output_csv (str): The CSV file the rows are streamed to.
+        cache_path (str): The metadata cache file.
+        ttl (float): Seconds after which `view_count` is considered stale.
+        max_workers (int): The size of the worker pool.
+        append (bool): Append to `output_csv` instead of overwriting it, used by the incremental sync.
+        on_result (callable): Optional callback called with (video_id, metadata or None, error or None).
+    Returns:
+        tuple: (list of metadata dicts, stats dict)
+    """
+    cache = MetadataCache(cache_path, ttl=ttl)
+    fetcher = MetadataFetcher(cache=cache, max_workers=max_workers)
+
+    def report(video_id, metadata, error):
+        if error:
+            print(f"Failed to get metadata for {video_id}: {error}")
+        else:
+            print(f"Metadata for {video_id}: {metadata['title']}")
+        if on_result is not None:
+            on_result(video_id, metadata, error)
+
+    results = fetcher.fetch_all(videos, output_csv=output_csv, on_result=report, append=append)
+    return results, fetcher.stats
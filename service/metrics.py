@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+Per-call metrics of the LLM calls: wall time, time to first token, tokens, cost, retries
+and cache hits. Every call made through `service.llm` and the extraction engine appends
+one JSON line to a local metrics file, and `report` summarizes it by model.
+
+Usage:
+    python -m service.metrics [metrics_file]
+"""
+import contextlib
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+
+
+DEFAULT_METRICS_PATH = "output/metrics/llm_calls.jsonl"
+# USD per 1M tokens (input, output), the Batch API is billed at half these prices
+MODEL_PRICES = {
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "o4-mini": (1.10, 4.40),
+}
+BATCH_DISCOUNT = 0.5
+
+_context = contextvars.ContextVar("llm_call_context", default={})
+
+
+@contextlib.contextmanager
+def call_context(**fields):
+    """
+    Tag the LLM calls made inside the block, e.g. `with call_context(key=video_id, operation="extract"):`.
+    Use `contextvars.copy_context().run` to keep the tags in worker threads.
+    """
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def call_cost(model, prompt_tokens, completion_tokens, batch=False):
+    """
+    Compute the cost of a call in USD, None for a model without a known price.
+    """
+    if model not in MODEL_PRICES:
+        return None
+    price_in, price_out = MODEL_PRICES[model]
+    cost = (prompt_tokens * price_in + completion_tokens * price_out) / 1_000_000
+    return round(cost * (BATCH_DISCOUNT if batch else 1.0), 8)
+
+
+class MetricsStore:
+    """
+    Append-only JSONL store of the LLM call metrics.
+    Args:
+        path (str): The metrics file path.
+    Notes:
+        - The store is safe to share between threads.
+    """
+    def __init__(self, path=DEFAULT_METRICS_PATH):
+        self.path = path
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def record(self, model, wall_s=None, ttft_s=None, prompt_tokens=0, completion_tokens=0, retries=0,
+               cache_hit=False, status="ok", error=None, batch=False, **fields):
+        """
+        Record one LLM call. A cache hit costs nothing.
+        Args:
+            fields: Extra fields, e.g. `operation` or `key`; the tags of `call_context` are added too.
+        Returns:
+            dict: The recorded entry.
+        """
+        entry = {
+            "ts": time.time(),
+            "model": model,
+            "wall_s": round(wall_s, 4) if wall_s is not None else None,
+            "ttft_s": round(ttft_s, 4) if ttft_s is not None else None,
+            "prompt_tokens": prompt_tokens or 0,
+            "completion_tokens": completion_tokens or 0,
+            "cost_usd": 0.0 if cache_hit else call_cost(model, prompt_tokens or 0, completion_tokens or 0, batch),
+            "retries": retries,
+            "cache_hit": bool(cache_hit),
+            "batch": bool(batch),
+            "status": status,
+            "error": error,
+        }
+        entry.update(_context.get())
+        entry.update(fields)
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+        return entry
+
+    def read(self):
+        """
+        Returns:
+            list: The recorded entries, a truncated last line is skipped.
+        """
+        if not os.path.exists(self.path):
+            return []
+        entries = []
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+        return entries
+
+
+def percentile(values, pct):
+    """
+    Linear interpolation percentile, None for no values.
+    """
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return None
+    pos = (len(values) - 1) * pct / 100
+    low = int(pos)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (pos - low)
+
+
+def summarize(entries):
+    """
+    Summarize the calls by model.
+    The tokens and cost per transcript add up the calls of the same `key` (e.g. the
+    windows of a chunked extraction); calls without a key count as one transcript each.
+    Returns:
+        dict: {model: stats}
+    """
+    by_model = {}
+    for entry in entries:
+        by_model.setdefault(entry["model"], []).append(entry)
+    summary = {}
+    for model, calls in sorted(by_model.items()):
+        api_calls = [c for c in calls if not c["cache_hit"]]
+        per_transcript = {}
+        for idx, c in enumerate(calls):
+            key = c.get("key") or f"#{idx}"
+            tokens, cost = per_transcript.get(key, (0, 0.0))
+            per_transcript[key] = (tokens + c["prompt_tokens"] + c["completion_tokens"], cost + (c["cost_usd"] or 0.0))
+        tokens = [t for t, _ in per_transcript.values()]
+        costs = [c for _, c in per_transcript.values()]
+        summary[model] = {
+            "calls": len(calls),
+            "cache_hits": len(calls) - len(api_calls),
+            "errors": sum(c["status"] != "ok" for c in calls),
+            "retries": sum(c["retries"] or 0 for c in calls),
+            "latency_p50_s": percentile([c["wall_s"] for c in api_calls], 50),
+            "latency_p95_s": percentile([c["wall_s"] for c in api_calls], 95),
+            "ttft_p50_s": percentile([c["ttft_s"] for c in api_calls], 50),
+            "ttft_p95_s": percentile([c["ttft_s"] for c in api_calls], 95),
+            "transcripts": len(per_transcript),
+            "tokens_per_transcript_p50": percentile(tokens, 50),
+            "tokens_per_transcript_p95": percentile(tokens, 95),
+            "prompt_tokens": sum(c["prompt_tokens"] for c in calls),
+            "completion_tokens": sum(c["completion_tokens"] for c in calls),
+            "cost_usd": round(sum(costs), 4),
+            "cost_per_transcript_usd": round(sum(costs) / len(costs), 6) if costs else 0.0,
+        }
+    return summary
+
+
+def report(path=DEFAULT_METRICS_PATH):
+    """
+    Print the summary of a metrics file.
+    """
+    summary = summarize(MetricsStore(path).read())
+    if not summary:
+        print(f"No LLM calls recorded in {path}")
+        return summary
+
+    def fmt(value, digits=2):
+        return "-" if value is None else f"{value:.{digits}f}"
+
+    print(f"{'model':<14}{'calls':>7}{'hits':>6}{'err':>5}{'p50 s':>8}{'p95 s':>8}{'ttft50':>8}"
+          f"{'tok/tr p50':>12}{'tok/tr p95':>12}{'cost $':>10}{'$/tr':>10}")
+    for model, s in summary.items():
+        print(f"{model:<14}{s['calls']:>7}{s['cache_hits']:>6}{s['errors']:>5}{fmt(s['latency_p50_s']):>8}"
+              f"{fmt(s['latency_p95_s']):>8}{fmt(s['ttft_p50_s']):>8}{fmt(s['tokens_per_transcript_p50'], 0):>12}"
+              f"{fmt(s['tokens_per_transcript_p95'], 0):>12}{s['cost_usd']:>10.4f}{s['cost_per_transcript_usd']:>10.5f}")
+    return summary
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+def get_default_metrics():
+    """
+    Get the process wide store at LLM_METRICS_PATH (default output/metrics/llm_calls.jsonl).
+    Set LLM_METRICS_PATH to an empty string to disable the metrics.
+    Returns:
+        MetricsStore: The store, None if the metrics are disabled.
+    """
+    global _default_store
+    path = os.getenv("LLM_METRICS_PATH", DEFAULT_METRICS_PATH)
+    if not path:
+        return None
+    with _default_lock:
+        if _default_store is None or _default_store.path != path:
+            _default_store = MetricsStore(path)
+        return _default_store
+
+
+if __name__ == "__main__":
+    report(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_METRICS_PATH)
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorized portfolio backtest over the evaluated mentions.
+The mentions a rule selects open a position on their entry day and close it after a holding
+period; the open positions become a (dates x tickers) weight matrix, rebalanced daily, and the
+daily NAV, turnover and drawdown come from matrix operations on the aligned closes.
+    - the closes of the mentioned tickers are aligned once, any number of rules reuse them;
+    - a position is held from the close of its entry day to the close of the first trading
+      day on or after entry + holding days, a negative opinion is a short position.
+"""
+import numpy as np
+import pandas as pd
+
+from service.prices import close_matrix, forward_fill
+from service.returns import ReturnMatrix
+
+
+WEIGHTINGS = ("equal", "conviction")
+
+# the conviction score of a mention by source, the host's own opinion counts twice a quoted one
+DEFAULT_CONVICTION = {"host": 2.0, "quoted": 1.0}
+
+TRADING_DAYS_PER_YEAR = 252
+
+
+def normalize_source(source):
+    """
+    "host" for the host's own opinion, "quoted" for any other source.
+    """
+    source = np.asarray(pd.Series(source).fillna("").astype(str).str.strip().str.lower())
+    return np.where(source == "host", "host", "quoted")
+
+
+class PortfolioRules:
+    """
+    Which mentions are traded and how the positions are weighted.
+    Args:
+        opinions (tuple): The opinions traded; "negative" mentions are shorted.
+        sources (tuple): "host" and/or "quoted" (any other source), None for both.
+        holding_days (int): The holding period in calendar days.
+        weighting (str): "equal": every held ticker has the same weight; "conviction": the
+            weight of a ticker is the sum of the conviction scores of its open mentions.
+        conviction (dict): The score of a mention by source, see DEFAULT_CONVICTION.
+        channels (tuple): Only trade the mentions of these channels, None for all.
+        cost_bps (float): The trading cost in basis points of the traded weight.
+        name (str): The rule name in the reports.
+    """
+    def __init__(self, opinions=("positive",), sources=("host",), holding_days=30, weighting="equal",
+                 conviction=None, channels=None, cost_bps=0.0, name=None):
+        if weighting not in WEIGHTINGS:
+            raise ValueError(f"Invalid weighting: {weighting}. Choose from {WEIGHTINGS}.")
+        if holding_days < 1:
+            raise ValueError(f"The holding period must be at least one day, got {holding_days}.")
+        self.opinions = tuple(o.lower() for o in opinions)
+        self.sources = None if sources is None else tuple(sources)
+        self.holding_days = int(holding_days)
+        self.weighting = weighting
+        self.conviction = dict(DEFAULT_CONVICTION if conviction is None else conviction)
+        self.channels = None if channels is None else tuple(channels)
+        self.cost_bps = float(cost_bps)
+        self.name = name or (f"{'+'.join(self.opinions)}/{'+'.join(self.sources or ('all',))}"
+                             f"/{self.holding_days}d/{weighting}")
+
+    def __repr__(self):
+        return f"PortfolioRules({self.name})"
+
+
+class PortfolioBacktest:
+    """
+    Backtest rules over the mentions evaluated by `evaluator.evaluate_mentions`.
+    Args:
+        mentions (pd.DataFrame): The evaluated mentions, with `opinion` and optionally `source`
+            and `channel`; the rows are matched by position with `matrix.mention_index`, or
+            one for one with the rows of `matrix` when it has no mention index.
+        matrix (ReturnMatrix | list): The evaluated mentions, their tickers and entry days: the
+            matrix of `evaluate_mentions` or the records of `evaluator.main1`.
+        store (PriceStore): The price store of the tickers.
+        start (str): The first day of the simulation, YYYY-MM-DD, defaults to the first entry day.
+        end (str): The end of the simulation (excluded), YYYY-MM-DD, defaults to the last stored price.
+    Notes:
+        The records of `main1` have no mention index and skip the mentions without an entry day,
+        so `mentions` must then be the kept mentions, in the order of the records.
+    """
+    def __init__(self, mentions, matrix, store, start=None, end=None):
+        if isinstance(matrix, list):
+            matrix = ReturnMatrix.from_records(matrix)
+        mentions = mentions.reset_index(drop=True)
+        rows = matrix.mention_index
+        if len(rows) and (rows < 0).any():
+            if len(mentions) != len(matrix):
+                raise ValueError(f"The return matrix has no mention index and {len(matrix)} rows for "
+                                 f"{len(mentions)} mentions, build it with `evaluate_mentions`.")
+            rows = np.arange(len(matrix))
+        self.opinions = self._column(mentions, "opinion", rows).str.strip().str.lower().to_numpy()
+        self.sources = normalize_source(self._column(mentions, "source", rows))
+        self.channels = self._column(mentions, "channel", rows).to_numpy()
+        self.tickers, self.columns = np.unique(matrix.tickers, return_inverse=True)
+        if start is None and len(matrix):
+            start = str(matrix.entry_dates.min())
+        self.dates, close = close_matrix(store, self.tickers.tolist(), start, end)
+        close = forward_fill(close)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            returns = close[1:] / close[:-1] - 1
+        # no return before the listing nor on a missing price
+        self.returns = np.vstack([np.zeros((1, len(self.tickers))), np.nan_to_num(returns, nan=0.0)])
+        self.entries = np.searchsorted(self.dates, matrix.entry_dates)
+        self.entry_dates = matrix.entry_dates
+
+    @staticmethod
+    def _column(mentions, name, rows):
+        if name not in mentions.columns:
+            return pd.Series([""] * len(rows), dtype=object)
+        return mentions[name].iloc[rows].fillna("").astype(str).reset_index(drop=True)
+
+    def select(self, rules):
+        """
+        Returns:
+            np.ndarray: The mask of the mentions the rules trade.
+        """
+        mask = np.isin(self.opinions, rules.opinions) & (self.entries < len(self.dates))
+        if rules.sources is not None:
+            mask &= np.isin(self.sources, rules.sources)
+        if rules.channels is not None:
+            mask &= np.isin(self.channels, rules.channels)
+        return mask
+
+    def positions(self, rules):
+        """
+        The target weights held at the close of every day.
+        Returns:
+            np.ndarray: (dates, tickers) weights, the gross exposure is 1 on the days with
+                open positions and 0 otherwise.
+        """
+        mask = self.select(rules)
+        entries = self.entries[mask]
+        exits = np.searchsorted(self.dates, self.entry_dates[mask] + np.timedelta64(rules.holding_days, "D"))
+        direction = np.where(self.opinions[mask] == "negative", -1.0, 1.0)
+        if rules.weighting == "conviction":
+            direction *= np.array([rules.conviction.get(s, 0.0) for s in self.sources[mask]])
+        # open at the entry row, close at the exit row: a cumulative sum of +/- events
+        events = np.zeros((len(self.dates) + 1, len(self.tickers)))
+        np.add.at(events, (entries, self.columns[mask]), direction)
+        np.add.at(events, (np.minimum(exits, len(self.dates)), self.columns[mask]), -direction)
+        held = np.cumsum(events[:-1], axis=0)
+        held[np.abs(held) < 1e-9] = 0.0
+        if rules.weighting == "equal":
+            held = np.sign(held)
+        gross = np.abs(held).sum(axis=1, keepdims=True)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(gross > 0, held / gross, 0.0)
+
+    def run(self, rules):
+        """
+        Simulate the rules.
+        Returns:
+            dict: `rules`, `trades` (the traded mentions), `weights` (dates x tickers) and
+                `daily`, a DataFrame indexed by date with `return`, `nav`, `turnover`,
+                `drawdown` and `exposure` (the number of held tickers).
+        """
+        weights = self.positions(rules)
+        previous = np.vstack([np.zeros((1, len(self.tickers))), weights[:-1]])
+        turnover = np.abs(weights - previous).sum(axis=1)
+        daily_return = (previous * self.returns).sum(axis=1) - turnover * rules.cost_bps / 10000
+        nav = np.cumprod(1 + daily_return)
+        drawdown = nav / np.maximum.accumulate(nav) - 1 if len(nav) else nav
+        daily = pd.DataFrame({
+            "return": daily_return,
+            "nav": nav,
+            "turnover": turnover,
+            "drawdown": drawdown,
+            "exposure": (weights != 0).sum(axis=1),
+        }, index=pd.DatetimeIndex(self.dates, name="date"))
+        return {"rules": rules, "trades": int(self.select(rules).sum()), "weights": weights, "daily": daily}
+
+    def compare(self, rules_list):
+        """
+        Run several rules and summarize them side by side.
+        Returns:
+            pd.DataFrame: One row of `summarize` per rule, indexed by the rule name.
+        """
+        return pd.DataFrame([summarize(self.run(rules)) for rules in rules_list]).set_index("rules")
+
+
+def summarize(result):
+    """
+    Summarize a `PortfolioBacktest.run` result.
+    Returns:
+        dict: The total and annualized return, the annualized volatility and Sharpe ratio (no
+            risk-free rate), the max drawdown, the average daily turnover and the invested days.
+    """
+    daily = result["daily"]
+    days = len(daily)
+    total = daily["nav"].iloc[-1] - 1 if days else 0.0
+    volatility = daily["return"].std() * np.sqrt(TRADING_DAYS_PER_YEAR) if days > 1 else np.nan
+    annual = (1 + total) ** (TRADING_DAYS_PER_YEAR / days) - 1 if days else np.nan
+    return {
+        "rules": result["rules"].name,
+        "trades": result["trades"],
+        "total_return": total,
+        "annual_return": annual,
+        "annual_volatility": volatility,
+        "sharpe": daily["return"].mean() * TRADING_DAYS_PER_YEAR / volatility if volatility else np.nan,
+        "max_drawdown": daily["drawdown"].min() if days else 0.0,
+        "avg_turnover": daily["turnover"].mean() if days else 0.0,
+        "invested_days": int((daily["exposure"] > 0).sum()),
+    }
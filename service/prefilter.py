@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+"""
+Local prefilter of cleaned transcripts before the LLM extraction.
+An Aho-Corasick automaton over company names, tickers and cue phrases finds the candidate
+mentions in one pass over the transcript. Only the regions around the candidates, with some
+context, are sent to the model, and a transcript without any candidate is skipped.
+"""
+import json
+import os
+from collections import deque
+
+from service.tokens import count_tokens
+
+
+KIND_COMPANY = "company"
+KIND_TICKER = "ticker"
+KIND_CUE = "cue"
+
+CUE_PHRASES = (
+    "stock", "stocks", "shares", "ticker", "position", "portfolio", "buy", "bought", "buying",
+    "sell", "sold", "selling", "short", "calls", "puts", "earnings", "price target", "undervalued",
+    "overvalued", "dividend", "market cap", "valuation", "bullish", "bearish", "my pick", "top pick",
+)
+# tickers that are also common words, only matched through their company name
+AMBIGUOUS_TICKERS = {
+    "A", "AI", "ALL", "AN", "ARE", "AS", "AT", "BE", "BIG", "BY", "CAN", "CAR", "DO", "FOR", "GO",
+    "HAS", "HE", "IT", "KEY", "LOW", "ME", "NOW", "ON", "ONE", "OR", "OUT", "SO", "SEE", "TV",
+    "TWO", "UP", "US", "WELL", "YOU",
+}
+WINDOW_SEPARATOR = "\n...\n"
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick automaton matching many patterns in a single pass.
+    Args:
+        patterns (iterable): The patterns, matched case-insensitively on whole words.
+    """
+    def __init__(self, patterns):
+        self.patterns = []
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for pattern in patterns:
+            self.add(pattern)
+        self._build()
+
+    def add(self, pattern):
+        pattern = pattern.lower()
+        if not pattern:
+            return
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append(len(self.patterns))
+        self.patterns.append(pattern)
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def finditer(self, text):
+        """
+        Find the whole-word matches in a text.
+        Yields:
+            tuple: (start, end, pattern index), ordered by end position.
+        """
+        goto, fail, out, patterns = self._goto, self._fail, self._out, self.patterns
+        lowered = text.lower()
+        node = 0
+        for pos, ch in enumerate(lowered):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if not out[node]:
+                continue
+            end = pos + 1
+            if end < len(lowered) and lowered[end].isalnum():
+                continue
+            for idx in out[node]:
+                start = end - len(patterns[idx])
+                if start == 0 or not lowered[start - 1].isalnum():
+                    yield start, end, idx
+
+
+def load_dictionary(extracted_dir="output/extracted", stock_codes_file="output/stock_codes.json", exclude=()):
+    """
+    Build the company name and ticker dictionary from the previous extractions and the
+    `fillempty.py` ticker lookups.
+    Args:
+        extracted_dir (str): The folder of the extraction JSON files.
+        stock_codes_file (str): The company to ticker lookups, skipped if missing.
+        exclude (iterable): Extraction file names to leave out, e.g. a held-out evaluation sample.
+    Returns:
+        dict: {term: (kind, canonical ticker or name)}
+    """
+    terms = {}
+
+    def add(name, ticker):
+        ticker = ticker.strip().upper().lstrip("$") if isinstance(ticker, str) else ""
+        if ticker in ("", "N/A", "NA", "NONE") or " " in ticker:
+            ticker = ""
+        canonical = ticker or (name or "").strip()
+        if isinstance(name, str) and len(name.strip()) >= 3:
+            terms.setdefault(name.strip().lower(), (KIND_COMPANY, canonical))
+        if ticker and len(ticker) >= 2 and ticker not in AMBIGUOUS_TICKERS:
+            terms.setdefault(ticker.lower(), (KIND_TICKER, ticker))
+
+    exclude = set(exclude)
+    if os.path.isdir(extracted_dir):
+        for file in sorted(os.listdir(extracted_dir)):
+            if not file.endswith(".json") or file in exclude:
+                continue
+            try:
+                with open(os.path.join(extracted_dir, file), "r", encoding="utf-8") as f:
+                    mentions = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for m in mentions if isinstance(mentions, list) else []:
+                if isinstance(m, dict):
+                    add(m.get("stock"), m.get("stock_code"))
+    if stock_codes_file and os.path.exists(stock_codes_file):
+        with open(stock_codes_file, "r", encoding="utf-8") as f:
+            for row in json.load(f):
+                add(row.get("company"), row.get("ticker"))
+    return terms
+
+
+class Prefilter:
+    """
+    Select the candidate regions of a transcript.
+    Args:
+        terms (dict): {term: (kind, canonical)}, e.g. from `load_dictionary`.
+        cue_phrases (iterable): Phrases that open a region even without a known company,
+            so companies missing from the dictionary can still be found by the model.
+        context_chars (int): The characters kept before and after each candidate.
+    """
+    def __init__(self, terms, cue_phrases=CUE_PHRASES, context_chars=400):
+        self.terms = dict(terms)
+        for phrase in cue_phrases:
+            self.terms.setdefault(phrase.lower(), (KIND_CUE, phrase.lower()))
+        self.context_chars = context_chars
+        self._automaton = AhoCorasick(self.terms)
+        self._kinds = [self.terms[p] for p in self._automaton.patterns]
+
+    def find_candidates(self, text):
+        """
+        Returns:
+            list: (start, end, kind, canonical) tuples in text order.
+        """
+        return [(start, end) + self._kinds[idx] for start, end, idx in self._automaton.finditer(text)]
+
+    def windows(self, text, candidates):
+        """
+        Merge the candidates with their context into disjoint (start, end) windows.
+        """
+        windows = []
+        for start, end, _, _ in sorted(candidates):
+            start = _word_start(text, max(0, start - self.context_chars))
+            end = _word_end(text, min(len(text), end + self.context_chars))
+            if windows and start <= windows[-1][1]:
+                windows[-1][1] = max(windows[-1][1], end)
+            else:
+                windows.append([start, end])
+        return [tuple(w) for w in windows]
+
+    def filter(self, text, model="gpt-4.1-mini"):
+        """
+        Prefilter a transcript.
+        Returns:
+            dict: `text` (the kept windows, joined), `skipped` (no candidate at all),
+                `windows`, `candidates` (the companies and tickers found, cue phrases excluded),
+                `original_tokens` and `filtered_tokens`.
+        """
+        candidates = self.find_candidates(text)
+        windows = self.windows(text, candidates)
+        filtered = WINDOW_SEPARATOR.join(text[s:e].strip() for s, e in windows)
+        original_tokens = count_tokens(text, model)
+        return {
+            "text": filtered,
+            "skipped": not windows,
+            "windows": windows,
+            "candidates": sorted({c[3] for c in candidates if c[2] != KIND_CUE}),
+            "original_tokens": original_tokens,
+            "filtered_tokens": count_tokens(filtered, model) if windows else 0,
+        }
+
+
+def _word_start(text, pos):
+    if pos == 0 or text[pos - 1] == " ":
+        return pos
+    space = text.rfind(" ", 0, pos)
+    return space + 1
+
+
+def _word_end(text, pos):
+    if pos >= len(text) or text[pos] == " ":
+        return pos
+    space = text.find(" ", pos)
+    return space if space >= 0 else len(text)
+
+
+def _mention_kept(mention, kept_text):
+    quote = " ".join(str(mention.get("quote") or "").lower().split())
+    if quote and quote in kept_text:
+        return True
+    for term in (mention.get("stock"), mention.get("stock_code")):
+        if isinstance(term, str) and len(term.strip()) >= 2 and f" {term.strip().lower()} " in f" {kept_text} ":
+            return True
+    return False
+
+
+def evaluate(prefilter, samples, model="gpt-4.1-mini"):
+    """
+    Measure the token reduction and the recall of the prefilter on a labeled sample.
+    A mention of the full-transcript extraction is recalled when its quote, stock name or
+    ticker is still in the text sent to the model.
+    Args:
+        prefilter (Prefilter): The prefilter to evaluate.
+        samples (list): (video_id, transcript text, mentions from the full-transcript extraction) tuples.
+        model (str): The model used to count the tokens.
+    Returns:
+        dict: The report, with `token_reduction`, `recall` and the `missed` mentions.
+    """
+    report = {"transcripts": len(samples), "skipped": 0, "original_tokens": 0, "filtered_tokens": 0,
+              "mentions": 0, "recalled": 0, "missed": []}
+    for video_id, text, mentions in samples:
+        result = prefilter.filter(text, model)
+        report["skipped"] += result["skipped"]
+        report["original_tokens"] += result["original_tokens"]
+        report["filtered_tokens"] += result["filtered_tokens"]
+        kept_text = " ".join(result["text"].lower().split())
+        for mention in mentions:
+            report["mentions"] += 1
+            if not result["skipped"] and _mention_kept(mention, kept_text):
+                report["recalled"] += 1
+            else:
+                report["missed"].append((video_id, mention.get("stock"), mention.get("stock_code")))
+    original = report["original_tokens"]
+    report["token_reduction"] = round(1 - report["filtered_tokens"] / original, 3) if original else 0.0
+    report["recall"] = round(report["recalled"] / report["mentions"], 3) if report["mentions"] else 1.0
+    return report
+
+
+_default_prefilter = None
+
+
+def get_default_prefilter():
+    """
+    Get the prefilter built from the dictionary of `load_dictionary`.
+    """
+    global _default_prefilter
+    if _default_prefilter is None:
+        _default_prefilter = Prefilter(load_dictionary())
+    return _default_prefilter
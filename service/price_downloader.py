@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+Concurrent, self-healing price downloader.
+The tickers are fetched in groups through a bounded worker pool; the tickers of a group that
+come back empty or all-NaN are retried one by one with exponential backoff, and the ones that
+still fail are recorded in a missing-ticker registry, so a run needs no manual recovery.
+Only the date ranges the price store does not cover yet are fetched, and the tickers missing
+the same range share the requests.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from service.price_providers import YFinanceProvider
+from service.prices import PRICE_DTYPE, to_records, today
+from service.ratelimit import RateLimiter
+from service.storage import atomic_write_json, read_json
+
+
+DEFAULT_REGISTRY_PATH = "data/missing_tickers.json"
+
+STATUS_OK = "ok"
+STATUS_MISSING = "missing"    # no price after the retries
+STATUS_SKIPPED = "skipped"    # already in the missing-ticker registry
+STATUS_CACHED = "cached"      # the store already covers the requested dates
+STATUS_INCOMPLETE = "incomplete"  # a stored ticker without price in the range after the retries
+
+# when a ticker has several date ranges, the worst status is reported
+_STATUS_ORDER = {STATUS_OK: 0, STATUS_CACHED: 0, STATUS_INCOMPLETE: 1, STATUS_MISSING: 2, STATUS_SKIPPED: 2}
+
+
+def split_download(df, tickers):
+    """
+    Split a multi-ticker download into the store records of each ticker.
+    Returns:
+        dict: {ticker: records}, a ticker missing from the download, empty or all-NaN is left out.
+    """
+    found = {}
+    if df is None or df.empty:
+        return found
+    if not isinstance(df.columns, pd.MultiIndex):
+        # a single ticker download without the ticker level
+        records = to_records(df) if len(tickers) == 1 else []
+        return {tickers[0]: records} if len(records) else found
+    level = df.columns.get_level_values(1)
+    for ticker in tickers:
+        if ticker in level:
+            records = to_records(df.xs(key=ticker, level=1, axis=1))
+            if len(records):
+                found[ticker] = records
+    return found
+
+
+class MissingTickerRegistry:
+    """
+    A JSON registry of the tickers that could not be downloaded.
+    Args:
+        path (str): The registry file path.
+    Notes:
+        - Entries are stored as {ticker: {"reason", "attempts", "start", "end", "first_failed_at", "last_failed_at"}}.
+        - The registry is safe to share between threads.
+    """
+    def __init__(self, path=DEFAULT_REGISTRY_PATH):
+        self.path = path
+        self.entries = read_json(path, default={})
+        self._lock = threading.Lock()
+
+    def __contains__(self, ticker):
+        return ticker in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def tickers(self):
+        return sorted(self.entries)
+
+    def record(self, ticker, reason, attempts=1, start=None, end=None):
+        now = time.time()
+        with self._lock:
+            entry = self.entries.get(ticker, {"first_failed_at": now, "attempts": 0})
+            entry.update({"reason": reason, "attempts": entry["attempts"] + attempts, "start": start, "end": end,
+                          "last_failed_at": now})
+            self.entries[ticker] = entry
+
+    def clear(self, ticker):
+        """
+        Forget a ticker that was downloaded after all.
+        """
+        with self._lock:
+            return self.entries.pop(ticker, None) is not None
+
+    def save(self):
+        with self._lock:
+            entries = dict(self.entries)
+        atomic_write_json(self.path, entries)
+
+
+class PriceDownloader:
+    """
+    Download prices into a PriceStore.
+    Args:
+        store (PriceStore): The target store.
+        fetch (callable): A price provider (see `service.price_providers`) or any function called
+            with (tickers, start, end) that returns a yfinance-like download, defaults to yfinance.
+        registry (MissingTickerRegistry): The missing-ticker registry, None to not keep one.
+        max_workers (int): The number of groups fetched at the same time.
+        chunk_size (int): The tickers per group request.
+        retries (int): The individual attempts of a ticker missing from its group, none for an
+            offline provider since it answers the same way every time.
+        backoff (float): The wait before the first individual attempt, doubled after each one.
+        requests_per_second (float): The request budget shared by the workers, not used for an offline provider.
+        sleep (callable): The sleep function, can be replaced for testing.
+    """
+    def __init__(self, store, fetch=None, registry=None, max_workers=4, chunk_size=20, retries=3,
+                 backoff=1.0, requests_per_second=2.0, sleep=time.sleep):
+        self.store = store
+        self.fetch = fetch or YFinanceProvider()
+        self.registry = registry
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        offline = getattr(self.fetch, "offline", False)
+        self.retries = 0 if offline else retries
+        self.backoff = backoff
+        self.rate_limiter = None if offline else RateLimiter(requests_per_second, burst=max_workers)
+        self.sleep = sleep
+
+    def _fetch(self, tickers, start, end):
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        try:
+            return split_download(self.fetch(tickers, start, end), tickers), None
+        except Exception as e:  # a failed group is retried ticker by ticker
+            return {}, f"{type(e).__name__}: {e}"
+
+    def _retry(self, ticker, start, end):
+        """
+        Fetch one ticker alone, with exponential backoff.
+        Returns:
+            tuple: (records or None, attempts, last error)
+        """
+        error = "empty or all-NaN series"
+        for attempt in range(self.retries):
+            self.sleep(self.backoff * 2 ** attempt)
+            found, fetch_error = self._fetch([ticker], start, end)
+            if ticker in found:
+                return found[ticker], attempt + 1, None
+            error = fetch_error or error
+        return None, self.retries, error
+
+    def download_group(self, tickers, start=None, end=None):
+        """
+        Download one group and merge it into the store, retrying the missing tickers individually.
+        A group request that succeeds without any price (e.g. a gap of holidays) is not retried
+        for the tickers already in the store: the range is recorded as covered.
+        A ticker already in the store that still has no price after the retries (e.g. a halt or a
+        late bar) is "incomplete": it is not registered as missing and the range stays uncovered,
+        so the next run fetches it again. Only the tickers without any stored price are registered.
+        Returns:
+            list: The results, dicts with `ticker`, `status`, `rows`, `attempts` and `error`.
+        """
+        found, error = self._fetch(tickers, start, end)
+        closed = error is None and not found
+        covered = None
+        if start is not None:
+            covered = (start, min(end or today(), today()))
+        results = []
+        for ticker in tickers:
+            records, attempts = found.get(ticker), 1
+            if records is None and closed and ticker in self.store:
+                records = np.empty(0, dtype=PRICE_DTYPE)
+            if records is None:
+                records, retries, error = self._retry(ticker, start, end)
+                attempts += retries
+            if records is None and ticker in self.store:
+                results.append({"ticker": ticker, "status": STATUS_INCOMPLETE,
+                                "rows": self.store.catalog[ticker]["rows"], "attempts": attempts, "error": error})
+                continue
+            if records is None:
+                if self.registry is not None:
+                    self.registry.record(ticker, error, attempts, start, end)
+                results.append({"ticker": ticker, "status": STATUS_MISSING, "rows": 0, "attempts": attempts,
+                                "error": error})
+                continue
+            rows = self.store.merge(ticker, records, covered=covered, save=False)
+            if self.registry is not None:
+                self.registry.clear(ticker)
+            results.append({"ticker": ticker, "status": STATUS_OK, "rows": rows, "attempts": attempts, "error": None})
+        return results
+
+    def plan(self, tickers, start=None, end=None, incremental=True):
+        """
+        Group the fetches: the tickers missing the same date range share the requests.
+        Returns:
+            tuple: ({(start, end): [tickers]}, list of the tickers the store already covers)
+        """
+        requests = {}
+        cached = []
+        for ticker in tickers:
+            if incremental and start is not None and ticker in self.store:
+                gaps = self.store.gaps(ticker, start, end)
+                if not gaps:
+                    cached.append(ticker)
+            else:
+                gaps = [(start, end)]
+            for gap in gaps:
+                requests.setdefault(gap, []).append(ticker)
+        return requests, cached
+
+    def download(self, tickers, start=None, end=None, retry_missing=False, on_result=None, incremental=True):
+        """
+        Download the prices of many tickers concurrently.
+        Only the date ranges the store does not cover yet are fetched, so a daily run only
+        fetches the new bars.
+        Args:
+            tickers (list): The tickers.
+            start (str): The first date, YYYY-MM-DD.
+            end (str): The end date (excluded), YYYY-MM-DD.
+            retry_missing (bool): Also download the tickers of the missing-ticker registry.
+            on_result (callable): Optional callback called with each group result as it completes.
+            incremental (bool): Only fetch the uncovered date ranges, False to fetch the whole range.
+        Returns:
+            list: The results in the order of `tickers`, see `download_group`; the status of a
+                ticker the store already covers is "cached", with several date ranges the worst
+                status is reported.
+        """
+        tickers = order = list(dict.fromkeys(tickers))
+        skipped = []
+        if self.registry is not None and not retry_missing:
+            skipped = [t for t in tickers if t in self.registry]
+            tickers = [t for t in tickers if t not in self.registry]
+        requests, cached = self.plan(tickers, start, end, incremental)
+        groups = [(gap, group[i:i + self.chunk_size]) for gap, group in requests.items()
+                  for i in range(0, len(group), self.chunk_size)]
+        print(f"Downloading {len(tickers) - len(cached)} tickers over {len(requests)} date ranges in "
+              f"{len(groups)} groups, {len(cached)} cached, {len(skipped)} skipped as missing")
+        by_ticker = {t: {"ticker": t, "status": STATUS_SKIPPED, "rows": 0, "attempts": 0, "error": None}
+                     for t in skipped}
+        for t in cached:
+            by_ticker[t] = {"ticker": t, "status": STATUS_CACHED, "rows": self.store.catalog[t]["rows"],
+                            "attempts": 0, "error": None}
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = [executor.submit(self.download_group, group, gap[0], gap[1]) for gap, group in groups]
+                for idx, future in enumerate(as_completed(futures)):
+                    results = future.result()
+                    for result in results:
+                        previous = by_ticker.get(result["ticker"])
+                        if previous is not None:
+                            # another date range of the same ticker: the worst status wins
+                            result = dict(result, attempts=result["attempts"] + previous["attempts"],
+                                          rows=max(result["rows"], previous["rows"]))
+                            if _STATUS_ORDER[previous["status"]] > _STATUS_ORDER[result["status"]]:
+                                result.update(status=previous["status"], error=previous["error"])
+                        by_ticker[result["ticker"]] = result
+                        if on_result is not None:
+                            on_result(result)
+                    missing = [r["ticker"] for r in results if r["status"] != STATUS_OK]
+                    print(f"Processed group {idx + 1}/{len(groups)}, missing: {missing}")
+        finally:
+            self.store.save()
+            if self.registry is not None:
+                self.registry.save()
+        return [by_ticker[t] for t in order]
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+Price providers for the price downloader and the evaluator.
+A provider fetches the daily prices of tickers as a yfinance multi-ticker download: a date
+index and (Price, Ticker) columns, with all-NaN columns for the tickers it does not know.
+    - YFinanceProvider downloads from Yahoo Finance;
+    - LocalFileProvider reads downloaded group CSV files;
+    - SyntheticMarket generates a seeded market, so the backtest runs and is benchmarked offline.
+"""
+import glob
+import zlib
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+
+PRICE_COLUMNS = ("Close", "High", "Low", "Open", "Volume")
+
+
+def empty_download(tickers):
+    columns = pd.MultiIndex.from_product([list(PRICE_COLUMNS), list(tickers)], names=["Price", "Ticker"])
+    return pd.DataFrame(index=pd.DatetimeIndex([], name="Date"), columns=columns, dtype="f8")
+
+
+class PriceProvider:
+    """
+    The provider interface. A provider is also a callable, so it can be passed as the `fetch`
+    function of `PriceDownloader`.
+    Notes:
+        - `offline` providers answer the same way every time, the downloader does not retry them.
+    """
+    offline = False
+
+    def fetch(self, tickers, start=None, end=None):
+        """
+        Fetch the daily prices of tickers.
+        Args:
+            tickers (list): The tickers.
+            start (str): The first date, YYYY-MM-DD.
+            end (str): The end date (excluded), YYYY-MM-DD.
+        Returns:
+            pd.DataFrame: A yfinance-like download with (Price, Ticker) columns.
+        """
+        raise NotImplementedError
+
+    def __call__(self, tickers, start=None, end=None):
+        return self.fetch(tickers, start, end)
+
+
+class YFinanceProvider(PriceProvider):
+    """
+    Download the prices from Yahoo Finance with yfinance.
+    Args:
+        interval (str): The bar interval.
+    """
+    def __init__(self, interval="1d"):
+        self.interval = interval
+
+    def fetch(self, tickers, start=None, end=None):
+        return yf.download(list(tickers), start=start, end=end, interval=self.interval, rounding=True,
+                           progress=False, threads=False, multi_level_index=True)
+
+
+class LocalFileProvider(PriceProvider):
+    """
+    Read the prices from yfinance multi-ticker CSV files, e.g. the `stock_group*.csv` downloads.
+    Args:
+        paths (str | list): A glob pattern or a list of files; with a ticker in several files,
+            the last file wins.
+    Notes:
+        - Only the headers are read up front, a file is parsed the first time one of its tickers is fetched.
+    """
+    offline = True
+
+    def __init__(self, paths="data/downloaded/stock_group*.csv"):
+        self.paths = sorted(glob.glob(paths)) if isinstance(paths, str) else list(paths)
+        self.files = {}
+        for path in self.paths:
+            header = pd.read_csv(path, header=[0, 1], index_col=0, nrows=0, encoding="utf-8-sig")
+            for ticker in header.columns.get_level_values(1):
+                self.files[ticker] = path
+        self._frames = {}
+
+    def _frame(self, path):
+        if path not in self._frames:
+            df = pd.read_csv(path, header=[0, 1], index_col=0, encoding="utf-8-sig")
+            df.index = pd.to_datetime(df.index, errors="coerce")
+            self._frames[path] = df[df.index.notna()].sort_index()
+        return self._frames[path]
+
+    def fetch(self, tickers, start=None, end=None):
+        parts = []
+        for path in dict.fromkeys(self.files[t] for t in tickers if t in self.files):
+            df = self._frame(path)
+            mask = np.ones(len(df), dtype=bool)
+            if start is not None:
+                mask &= df.index >= pd.Timestamp(start)
+            if end is not None:
+                mask &= df.index < pd.Timestamp(end)
+            wanted = [t for t in tickers if self.files.get(t) == path]
+            parts.append(df.loc[mask, df.columns.get_level_values(1).isin(wanted)])
+        if not parts:
+            return empty_download(tickers)
+        return pd.concat(parts, axis=1)
+
+
+def us_holidays(years):
+    """
+    The main NYSE holidays of the given years: New Year, Martin Luther King, Presidents, Good
+    Friday, Memorial, Juneteenth (since 2022), Independence, Labor, Thanksgiving and Christmas days.
+    Returns:
+        pd.DatetimeIndex: The holidays.
+    """
+    def observed(day):
+        return day + pd.Timedelta(days=1) if day.dayofweek == 6 else day - pd.Timedelta(days=1) \
+            if day.dayofweek == 5 else day
+
+    def nth_weekday(year, month, weekday, n):
+        first = pd.Timestamp(year, month, 1)
+        return first + pd.Timedelta(days=(weekday - first.dayofweek) % 7 + 7 * (n - 1))
+
+    def last_weekday(year, month, weekday):
+        last = pd.Timestamp(year, month, 1) + pd.offsets.MonthEnd(0)
+        return last - pd.Timedelta(days=(last.dayofweek - weekday) % 7)
+
+    def easter(year):
+        # anonymous Gregorian algorithm
+        a, b, c = year % 19, year // 100, year % 100
+        d, e = b // 4, b % 4
+        g = (8 * b + 13) // 25
+        h = (19 * a + b - d - g + 15) % 30
+        i, k = c // 4, c % 4
+        l = (32 + 2 * e + 2 * i - h - k) % 7
+        m = (a + 11 * h + 19 * l) // 433
+        month = (h + l - 7 * m + 90) // 25
+        return pd.Timestamp(year, month, (h + l - 7 * m + 33 * month + 19) % 32)
+
+    days = []
+    for year in years:
+        new_year = pd.Timestamp(year, 1, 1)
+        # a New Year's Day on a Saturday is not observed on the last day of the previous year
+        days += [new_year + pd.Timedelta(days=1) if new_year.dayofweek == 6 else new_year, nth_weekday(year, 1, 0, 3), nth_weekday(year, 2, 0, 3),
+                 easter(year) - pd.Timedelta(days=2), last_weekday(year, 5, 0), observed(pd.Timestamp(year, 7, 4)),
+                 nth_weekday(year, 9, 0, 1), nth_weekday(year, 11, 3, 4), observed(pd.Timestamp(year, 12, 25))]
+        if year >= 2022:
+            days.append(observed(pd.Timestamp(year, 6, 19)))
+    return pd.DatetimeIndex(sorted(set(days)))
+
+
+def trading_calendar(start, end):
+    """
+    The business days of [start, end) without the US market holidays.
+    """
+    days = pd.bdate_range(start, end, inclusive="left")
+    return days[~days.isin(us_holidays(range(days[0].year, days[-1].year + 1)))] if len(days) else days
+
+
+class SyntheticMarket(PriceProvider):
+    """
+    A seeded synthetic market.
+    Every ticker follows a market factor with its own beta and volatility; a ticker may list
+    late, be delisted, miss single days, have runs of NaN prices or be unknown (all-NaN, as
+    yfinance answers for a wrong symbol). The prices of a ticker do not depend on the requested
+    range nor on the other tickers of the request.
+    Args:
+        seed (int): The market seed.
+        start (str): The first date of the market history.
+        end (str): The end of the market history (excluded).
+        index_tickers (tuple): The tickers that follow the market factor exactly, e.g. a benchmark.
+        unknown_rate (float): The share of unknown tickers.
+        listing_rate (float): The share of tickers listed after `start`.
+        delisting_rate (float): The share of tickers delisted before `end`.
+        gap_rate (float): The share of trading days a ticker misses, one day at a time.
+        nan_run_rate (float): The expected number of NaN runs (5 to 30 days) per year and ticker.
+    """
+    offline = True
+
+    def __init__(self, seed=0, start="2015-01-01", end="2027-01-01", index_tickers=("SPY", "^GSPC"),
+                 unknown_rate=0.02, listing_rate=0.1, delisting_rate=0.05, gap_rate=0.002, nan_run_rate=0.1):
+        self.seed = seed
+        self.calendar = trading_calendar(start, end)
+        self.index_tickers = set(index_tickers)
+        self.unknown_rate = unknown_rate
+        self.listing_rate = listing_rate
+        self.delisting_rate = delisting_rate
+        self.gap_rate = gap_rate
+        self.nan_run_rate = nan_run_rate
+        rng = np.random.default_rng([seed, 0])
+        self.market_returns = rng.normal(0.0003, 0.011, len(self.calendar))
+
+    def tickers(self, count, prefix="S"):
+        """
+        Make `count` ticker names, e.g. for a benchmark.
+        """
+        return [f"{prefix}{i:04d}" for i in range(count)]
+
+    def _rng(self, ticker):
+        return np.random.default_rng([self.seed, zlib.crc32(ticker.encode("utf-8")) + 1])
+
+    def is_known(self, ticker):
+        return ticker in self.index_tickers or self._rng(ticker).random() >= self.unknown_rate
+
+    def history(self, ticker):
+        """
+        The full history of a ticker on the market calendar.
+        Returns:
+            dict: {column: np.ndarray} of PRICE_COLUMNS, NaN on the days without a price;
+                None for an unknown ticker.
+        """
+        rng = self._rng(ticker)
+        days = len(self.calendar)
+        if rng.random() < self.unknown_rate and ticker not in self.index_tickers:
+            return None
+        if ticker in self.index_tickers:
+            beta, vol, price0 = 1.0, 0.0, 400.0
+        else:
+            beta, vol, price0 = rng.uniform(0.4, 1.8), rng.uniform(0.008, 0.035), np.exp(rng.normal(3.5, 1.0))
+        returns = beta * self.market_returns + rng.normal(0, vol, days) - vol * vol / 2
+        close = price0 * np.exp(np.cumsum(returns))
+        open_ = close * np.exp(-returns * rng.uniform(0, 1, days))
+        spread = np.abs(rng.normal(0, vol / 2 + 0.002, (2, days)))
+        high = np.maximum(open_, close) * (1 + spread[0])
+        low = np.minimum(open_, close) * (1 - spread[1])
+        volume = np.round(np.exp(rng.normal(13, 1.2) + rng.normal(0, 0.4, days)))
+        available = np.ones(days, dtype=bool)
+        if ticker not in self.index_tickers:
+            if rng.random() < self.listing_rate:
+                available[:rng.integers(0, days)] = False
+            if rng.random() < self.delisting_rate:
+                available[rng.integers(0, days):] = False
+            available &= rng.random(days) >= self.gap_rate
+            for _ in range(rng.poisson(self.nan_run_rate * days / 252)):
+                run_start = rng.integers(0, days)
+                available[run_start:run_start + rng.integers(5, 31)] = False
+        columns = {"Close": close, "High": high, "Low": low, "Open": open_, "Volume": volume}
+        for name, values in columns.items():
+            values = np.round(values, 0 if name == "Volume" else 2)
+            values[~available] = np.nan
+            columns[name] = values
+        return columns
+
+    def fetch(self, tickers, start=None, end=None):
+        if not tickers:
+            return empty_download(tickers)
+        lo = 0 if start is None else self.calendar.searchsorted(pd.Timestamp(start))
+        hi = len(self.calendar) if end is None else self.calendar.searchsorted(pd.Timestamp(end))
+        index = pd.DatetimeIndex(self.calendar[lo:hi], name="Date")
+        data = {}
+        for ticker in tickers:
+            history = self.history(ticker)
+            for name in PRICE_COLUMNS:
+                data[(name, ticker)] = history[name][lo:hi] if history is not None else np.full(hi - lo, np.nan)
+        df = pd.DataFrame(data, index=index)
+        df.columns = pd.MultiIndex.from_tuples(df.columns, names=["Price", "Ticker"])
+        return df
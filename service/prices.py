@@ -0,0 +1,368 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar price store: one memory-mapped NumPy file of dates and OHLCV per ticker, plus a
+JSON catalog of what each file holds.
+Loading a ticker maps its own file only, whatever the number of other tickers, and the
+columns are zero-copy views of the mapped file.
+
+Usage:
+    python -m service.prices migrate [stock_group*.csv ...]
+"""
+import glob
+import os
+import re
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from service.storage import atomic_write_file, atomic_write_json, read_json
+
+
+DEFAULT_PRICES_DIR = "data/prices"
+DEFAULT_GROUP_GLOB = "data/downloaded/stock_group*.csv"
+
+PRICE_FIELDS = ("open", "high", "low", "close", "volume")
+PRICE_DTYPE = np.dtype([("date", "datetime64[D]")] + [(field, "f8") for field in PRICE_FIELDS])
+
+_UNSAFE_RE = re.compile(r"[^A-Za-z0-9._-]")
+_GROUP_RE = re.compile(r"stock_group(\d+)_")
+
+
+def ticker_filename(ticker):
+    """
+    The file name of a ticker, e.g. "BRK/B" -> "BRK_B.npy"; "^" (indexes) is kept readable.
+    """
+    return _UNSAFE_RE.sub("_", ticker.replace("^", "IDX_")) + ".npy"
+
+
+def to_records(df):
+    """
+    Convert a price DataFrame (date index, yfinance columns Open/High/Low/Close/Volume) to
+    the store records. The rows without a close are dropped, the dates are sorted and unique.
+    Returns:
+        np.ndarray: A structured array of PRICE_DTYPE.
+    """
+    columns = {str(c).lower(): c for c in df.columns}
+    dates = pd.to_datetime(df.index, errors="coerce")
+    close = pd.to_numeric(df[columns["close"]], errors="coerce").to_numpy(dtype="f8")
+    keep = ~pd.isna(dates) & ~np.isnan(close)
+    records = np.empty(int(keep.sum()), dtype=PRICE_DTYPE)
+    records["date"] = dates[keep].to_numpy(dtype="datetime64[D]")
+    for field in PRICE_FIELDS:
+        if field in columns:
+            records[field] = pd.to_numeric(df[columns[field]], errors="coerce").to_numpy(dtype="f8")[keep]
+        else:
+            records[field] = np.nan
+    return sort_unique(records)
+
+
+def sort_unique(records):
+    """
+    Sort records by date, keeping the last row of a repeated date.
+    """
+    if len(records) == 0:
+        return records
+    records = records[np.argsort(records["date"], kind="stable")]
+    last = np.append(records["date"][1:] != records["date"][:-1], True)
+    return records[last]
+
+
+def records_frame(records):
+    """
+    Convert store records to a DataFrame indexed by "YYYY-MM-DD" strings, with the yfinance
+    column names, as the downloaded CSV files were read.
+    """
+    index = pd.Index(np.datetime_as_string(records["date"], unit="D"), name="Date")
+    return pd.DataFrame({field.capitalize(): records[field] for field in PRICE_FIELDS}, index=index)
+
+
+def close_matrix(store, tickers, start=None, end=None):
+    """
+    Align the closes of several tickers on the union of their trading days.
+    Args:
+        store (PriceStore): The price store.
+        tickers (list): The tickers; a ticker that is not stored has an all-NaN column.
+        start (str): The first date, YYYY-MM-DD, None for the first stored date.
+        end (str): The end date (excluded), YYYY-MM-DD, None for the last stored date.
+    Returns:
+        tuple: (dates, close): the sorted datetime64[D] dates (d) and the (d, k) closes, NaN
+            where a ticker has no price that day.
+    """
+    lo = None if start is None else np.datetime64(start, "D")
+    hi = None if end is None else np.datetime64(end, "D")
+    parts = []
+    for ticker in tickers:
+        records = store.load(ticker)
+        if records is None:
+            parts.append((np.empty(0, dtype="datetime64[D]"), np.empty(0)))
+            continue
+        dates = records["date"]
+        first = 0 if lo is None else np.searchsorted(dates, lo, side="left")
+        last = len(dates) if hi is None else np.searchsorted(dates, hi, side="left")
+        parts.append((np.asarray(dates[first:last]), np.asarray(records["close"][first:last])))
+    dates = np.unique(np.concatenate([d for d, _ in parts])) if parts else np.empty(0, dtype="datetime64[D]")
+    close = np.full((len(dates), len(parts)), np.nan)
+    for col, (ticker_dates, ticker_close) in enumerate(parts):
+        close[np.searchsorted(dates, ticker_dates), col] = ticker_close
+    return dates, close
+
+
+def forward_fill(values):
+    """
+    Carry the last non-NaN value of each column down a (d, k) array; the leading NaN stay.
+    """
+    rows = np.where(np.isnan(values), 0, np.arange(len(values))[:, None])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    return values[rows, np.arange(values.shape[1])]
+
+
+def _next_day(date):
+    return str(np.datetime64(date, "D") + 1)
+
+
+def today():
+    return str(np.datetime64("today", "D"))
+
+
+def merge_ranges(ranges):
+    """
+    Merge overlapping or adjacent [start, end) date ranges ("YYYY-MM-DD" strings).
+    Returns:
+        list: The sorted, disjoint [start, end] lists.
+    """
+    merged = []
+    for start, end in sorted((str(s), str(e)) for s, e in ranges if str(s) < str(e)):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def missing_ranges(coverage, start, end):
+    """
+    Find the parts of the [start, end) date range that the coverage does not include.
+    Returns:
+        list: The (start, end) gaps, in order.
+    """
+    gaps = []
+    cursor = start
+    for covered_start, covered_end in merge_ranges(coverage):
+        if covered_end <= cursor:
+            continue
+        if covered_start >= end:
+            break
+        if covered_start > cursor:
+            gaps.append((cursor, covered_start))
+        cursor = max(cursor, covered_end)
+        if cursor >= end:
+            break
+    if cursor < end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+class PriceStore:
+    """
+    Per-ticker columnar price files under a folder, with a catalog.
+    Args:
+        root (str): The store folder.
+    Notes:
+        - The catalog `catalog.json` is {ticker: {"file", "rows", "start", "end", "coverage", "updated_at"}},
+          `coverage` lists the [start, end) date ranges already fetched, with or without trading days.
+        - A ticker file is replaced atomically; readers holding a mapping of the old file keep it.
+        - The store is safe to share between threads.
+    """
+    def __init__(self, root=DEFAULT_PRICES_DIR):
+        self.root = root
+        self.catalog_path = os.path.join(root, "catalog.json")
+        self.catalog = read_json(self.catalog_path, default={})
+        self._lock = threading.Lock()
+        self._ticker_locks = {}
+
+    def __contains__(self, ticker):
+        return ticker in self.catalog
+
+    def __len__(self):
+        return len(self.catalog)
+
+    def tickers(self):
+        return sorted(self.catalog)
+
+    def path(self, ticker):
+        return os.path.join(self.root, ticker_filename(ticker))
+
+    def _ticker_lock(self, ticker):
+        with self._lock:
+            return self._ticker_locks.setdefault(ticker, threading.Lock())
+
+    def coverage(self, ticker):
+        entry = self.catalog.get(ticker)
+        return entry.get("coverage", [[entry["start"], _next_day(entry["end"])]]) if entry else []
+
+    def gaps(self, ticker, start, end=None):
+        """
+        Find the date ranges of a request that the store does not cover for a ticker.
+        Args:
+            start (str): The first date, YYYY-MM-DD.
+            end (str): The end date (excluded), defaults to today: the bar of today may still change.
+        Returns:
+            list: The (start, end) gaps.
+        """
+        end = min(end or today(), today())
+        return missing_ranges(self.coverage(ticker), start, end) if start < end else []
+
+    def write(self, ticker, prices, save=True, covered=None):
+        """
+        Store the prices of a ticker, replacing its file.
+        Args:
+            ticker (str): The ticker.
+            prices (pd.DataFrame | np.ndarray): A price DataFrame (see `to_records`) or PRICE_DTYPE records.
+            save (bool): Write the catalog right away; pass False for bulk writes and call `save`.
+            covered (list): The [start, end) date ranges the prices cover, defaults to their dates.
+        Returns:
+            int: The number of stored rows, a ticker without any row is not stored.
+        """
+        records = prices if isinstance(prices, np.ndarray) else to_records(prices)
+        if len(records) == 0:
+            return 0
+        with self._ticker_lock(ticker):
+            return self._write(ticker, records, covered, save)
+
+    def merge(self, ticker, prices, covered=None, save=True):
+        """
+        Merge new prices into the stored ones of a ticker; the new rows win on the same date.
+        Args:
+            covered (tuple): The [start, end) date range that was fetched, added to the coverage
+                even when it has no trading day; defaults to the dates of the new prices.
+        Returns:
+            int: The number of stored rows.
+        """
+        records = prices if isinstance(prices, np.ndarray) else to_records(prices)
+        with self._ticker_lock(ticker):
+            old = self.load(ticker)
+            coverage = self.coverage(ticker)
+            if covered is None and len(records):
+                # an open-ended fetch covers the dates it returned
+                covered = (str(records["date"][0]), _next_day(str(records["date"][-1])))
+            if covered is not None:
+                coverage = coverage + [list(covered)]
+            if old is not None and len(records) == 0:
+                # nothing new, e.g. only holidays: record the coverage only
+                with self._lock:
+                    self.catalog[ticker] = dict(self.catalog[ticker], coverage=merge_ranges(coverage),
+                                                updated_at=time.time())
+                if save:
+                    self.save()
+                return len(old)
+            if old is not None:
+                records = sort_unique(np.concatenate([old, records]))
+                # release the mapping before the file is replaced
+                del old
+            if len(records) == 0:
+                return 0
+            return self._write(ticker, records, coverage, save)
+
+    def _write(self, ticker, records, covered, save):
+        path = self.path(ticker)
+        atomic_write_file(path, lambda f: np.save(f, np.ascontiguousarray(records, dtype=PRICE_DTYPE)))
+        start, end = str(records["date"][0]), str(records["date"][-1])
+        entry = {
+            "file": os.path.basename(path),
+            "rows": int(len(records)),
+            "start": start,
+            "end": end,
+            "coverage": merge_ranges(covered if covered is not None else [(start, _next_day(end))]),
+            "updated_at": time.time(),
+        }
+        with self._lock:
+            self.catalog[ticker] = entry
+        if save:
+            self.save()
+        return len(records)
+
+    def load(self, ticker):
+        """
+        Map the prices of a ticker, read-only.
+        Returns:
+            np.ndarray: The PRICE_DTYPE records (a memmap), None if the ticker is not stored.
+        """
+        path = self.path(ticker)
+        if not os.path.exists(path):
+            return None
+        return np.load(path, mmap_mode="r")
+
+    def frame(self, ticker):
+        """
+        Load the prices of a ticker as a DataFrame, see `records_frame`.
+        Returns:
+            pd.DataFrame: The prices, None if the ticker is not stored.
+        """
+        records = self.load(ticker)
+        return None if records is None else records_frame(records)
+
+    def save(self):
+        with self._lock:
+            catalog = dict(self.catalog)
+        atomic_write_json(self.catalog_path, catalog)
+
+
+def migrate_group_csv(paths, store):
+    """
+    Move the multi-ticker group CSV files of `evaluator.get_stock_info` into the store.
+    The files are read in group order and, within a group, oldest timestamp first, so the
+    newest download of a ticker wins.
+    Args:
+        paths (list): The `stock_group{n}_{timestamp}.csv` files.
+        store (PriceStore): The target store.
+    Returns:
+        tuple: (list of the migrated tickers, list of the tickers without any price)
+    """
+    def order(path):
+        name = os.path.basename(path)
+        match = _GROUP_RE.search(name)
+        return (int(match.group(1)) if match else -1, name)
+
+    migrated = {}
+    empty = set()
+    for path in sorted(paths, key=order):
+        df = pd.read_csv(path, header=[0, 1], index_col=0, encoding="utf-8-sig")
+        tickers = list(dict.fromkeys(df.columns.get_level_values(1)))
+        for ticker in tickers:
+            rows = store.write(ticker, df.xs(key=ticker, level=1, axis=1), save=False)
+            if rows:
+                migrated[ticker] = rows
+                empty.discard(ticker)
+            elif ticker not in migrated:
+                empty.add(ticker)
+        print(f"Migrated {path}: {len(tickers)} tickers")
+    store.save()
+    print(f"{len(migrated)} tickers in {store.root}, {len(empty)} without prices")
+    return sorted(migrated), sorted(empty)
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+def get_default_store():
+    """
+    Get the process wide store at PRICES_DIR (default data/prices).
+    """
+    global _default_store
+    root = os.getenv("PRICES_DIR") or DEFAULT_PRICES_DIR
+    with _default_lock:
+        if _default_store is None or _default_store.root != root:
+            _default_store = PriceStore(root)
+        return _default_store
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        print(__doc__)
+        sys.exit(1)
+    files = sys.argv[2:] or glob.glob(DEFAULT_GROUP_GLOB)
+    migrate_group_csv(files, get_default_store())
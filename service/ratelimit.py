@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Simple thread-safe rate limiters shared by the downloaders and the LLM engines.
+A RateLimiter is a token bucket, HostRateLimiter keeps one bucket per host.
+"""
+import asyncio
+import threading
+import time
+from urllib.parse import urlparse
+
+
+class RateLimiter:
+    """
+    Token bucket rate limiter.
+    Args:
+        rate (float): Number of tokens added per `per` seconds.
+        per (float): The refill period in seconds.
+        burst (float): Maximum number of tokens in the bucket, defaults to `rate`.
+    """
+    def __init__(self, rate, per=1.0, burst=None):
+        if rate <= 0:
+            raise ValueError(f"Invalid rate: {rate}. It should be positive.")
+        self.rate = float(rate)
+        self.per = float(per)
+        self.capacity = float(burst if burst is not None else rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate / self.per)
+        self._updated = now
+
+    def reserve(self, amount=1):
+        """
+        Take `amount` tokens from the bucket, going into debt if needed.
+        Returns:
+            float: The number of seconds the caller should wait before proceeding.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens * self.per / self.rate
+
+    def acquire(self, amount=1):
+        """
+        Block until `amount` tokens are available.
+        Returns:
+            float: The number of seconds spent waiting.
+        """
+        wait = self.reserve(amount)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, amount=1):
+        """
+        Same as `acquire` for asyncio code, waits without blocking the event loop.
+        """
+        wait = self.reserve(amount)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def refund(self, amount):
+        """
+        Give back tokens reserved in excess, e.g. when the real usage was lower than the estimate.
+        A negative amount takes the extra tokens.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+
+class HostRateLimiter:
+    """
+    Keep a separate RateLimiter for every host name.
+    Args:
+        rate (float): Requests allowed per `per` seconds for each host.
+        per (float): The refill period in seconds.
+        burst (float): Maximum burst for each host.
+    """
+    def __init__(self, rate, per=1.0, burst=None):
+        self.rate = rate
+        self.per = per
+        self.burst = burst
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def limiter_for(self, url):
+        host = urlparse(url).netloc.lower() or url
+        with self._lock:
+            if host not in self._limiters:
+                self._limiters[host] = RateLimiter(self.rate, self.per, self.burst)
+            return self._limiters[host]
+
+    def acquire(self, url, amount=1):
+        return self.limiter_for(url).acquire(amount)
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar return info of the backtest.
+The entry and horizon prices of the mentions are kept as dense arrays (mentions x horizons)
+and saved as an uncompressed .npz file, so the returns and the `nday_{N}_r` columns are
+computed with NumPy broadcasting instead of per-row lists rebuilt from CSV strings.
+"""
+import ast
+
+import numpy as np
+import pandas as pd
+
+from service.storage import atomic_write_file
+
+
+class ReturnMatrix:
+    """
+    The return info of n mentions over h horizons.
+    Args:
+        tickers (np.ndarray): The tickers (n).
+        entry_dates (np.ndarray): The datetime64[D] entry days, the first trading day on or after the mention (n).
+        entry_extra_days (np.ndarray): The days from the mention to the entry day (n).
+        entry_prices (np.ndarray): The close on the entry day (n).
+        ndays (np.ndarray): The horizons in calendar days (h).
+        prices (np.ndarray): The close on the first trading day on or after each horizon, NaN if none (n, h).
+        extra_days (np.ndarray): The days from each horizon to its trading day, 0 without price (n, h).
+        mention_index (np.ndarray): The row of each mention in the evaluated mentions, -1 if unknown (n).
+    """
+    def __init__(self, tickers, entry_dates, entry_extra_days, entry_prices, ndays, prices, extra_days,
+                 mention_index=None):
+        self.tickers = np.asarray(tickers, dtype="U")
+        self.entry_dates = np.asarray(entry_dates, dtype="datetime64[D]")
+        self.entry_extra_days = np.asarray(entry_extra_days, dtype="int64")
+        self.entry_prices = np.asarray(entry_prices, dtype="f8")
+        self.ndays = np.asarray(ndays, dtype="int64")
+        self.prices = np.asarray(prices, dtype="f8").reshape(len(self.tickers), len(self.ndays))
+        self.extra_days = np.asarray(extra_days, dtype="int64").reshape(self.prices.shape)
+        if mention_index is None:
+            mention_index = np.full(len(self.tickers), -1)
+        self.mention_index = np.asarray(mention_index, dtype="int64")
+
+    def __len__(self):
+        return len(self.tickers)
+
+    @classmethod
+    def empty(cls, ndays):
+        h = len(ndays)
+        return cls([], [], [], [], ndays, np.empty((0, h)), np.empty((0, h), dtype="int64"), [])
+
+    @classmethod
+    def concatenate(cls, parts, ndays):
+        """
+        Join the matrices of several tickers, ordered by their mention index.
+        """
+        if not parts:
+            return cls.empty(ndays)
+        fields = {name: np.concatenate([getattr(p, name) for p in parts])
+                  for name in ("tickers", "entry_dates", "entry_extra_days", "entry_prices", "prices",
+                               "extra_days", "mention_index")}
+        order = np.argsort(fields["mention_index"], kind="stable")
+        return cls(ndays=ndays, **{name: values[order] for name, values in fields.items()})
+
+    @classmethod
+    def from_records(cls, return_info):
+        """
+        Build the matrix from the records of `evaluator.main1`.
+        """
+        if not return_info:
+            return cls.empty([])
+        ndays = return_info[0]["ndays_list"]
+        return cls(
+            tickers=[r["ticker"] for r in return_info],
+            entry_dates=[r["date_mentioned"] for r in return_info],
+            entry_extra_days=[r["extra_days"] for r in return_info],
+            entry_prices=[r["price_on_mentioned"] for r in return_info],
+            ndays=ndays,
+            prices=[[np.nan if p is None else p for p in r["price_list"]] for r in return_info],
+            extra_days=[r["extra_day_list"] for r in return_info],
+        )
+
+    @classmethod
+    def from_frame(cls, df):
+        """
+        Build the matrix from the return info CSV of the older runs, where the lists are strings.
+        """
+        def parse(values):
+            return [ast.literal_eval(v) if isinstance(v, str) else v for v in values]
+
+        records = df.to_dict("records")
+        for r, ndays, prices, extra in zip(records, parse(df["ndays_list"]), parse(df["price_list"]),
+                                           parse(df["extra_day_list"])):
+            r.update(ndays_list=ndays, price_list=prices, extra_day_list=extra)
+        return cls.from_records(records)
+
+    def to_records(self):
+        """
+        Returns:
+            list: The records of `evaluator.main1`, with None for the missing prices.
+        """
+        ndays = self.ndays.tolist()
+        dates = np.datetime_as_string(self.entry_dates, unit="D").tolist()
+        prices = np.where(np.isnan(self.prices), None, self.prices).tolist()
+        return [{
+            "ticker": ticker,
+            'date_mentioned': date,
+            'extra_days': extra,
+            'price_on_mentioned': price,
+            'ndays_list': ndays,
+            'price_list': price_list,
+            'extra_day_list': extra_day_list,
+        } for ticker, date, extra, price, price_list, extra_day_list in zip(
+            self.tickers.tolist(), dates, self.entry_extra_days.tolist(), self.entry_prices.tolist(), prices,
+            self.extra_days.tolist())]
+
+    def returns(self, decimals=2):
+        """
+        The returns in percent from the entry price, NaN without price or with a zero entry price.
+        Returns:
+            np.ndarray: (n, h)
+        """
+        entry = self.entry_prices[:, None]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            returns = np.where(entry == 0, np.nan, (self.prices - entry) / entry * 100)
+        return np.round(returns, decimals)
+
+    def frame(self):
+        """
+        One row per mention with the entry and, for each horizon N, the `nday_{N}_price`,
+        `nday_{N}_extra` and `nday_{N}_r` (return in percent) columns.
+        """
+        returns = self.returns()
+        columns = {
+            "ticker": self.tickers,
+            "date_mentioned": np.datetime_as_string(self.entry_dates, unit="D"),
+            "extra_days": self.entry_extra_days,
+            "price_on_mentioned": self.entry_prices,
+        }
+        for i, n in enumerate(self.ndays.tolist()):
+            columns[f"nday_{n}_price"] = self.prices[:, i]
+            columns[f"nday_{n}_extra"] = self.extra_days[:, i]
+            columns[f"nday_{n}_r"] = returns[:, i]
+        return pd.DataFrame(columns)
+
+    def save(self, path):
+        """
+        Save the arrays to an uncompressed .npz file, atomically.
+        """
+        arrays = {name: getattr(self, name) for name in ("tickers", "entry_dates", "entry_extra_days",
+                                                         "entry_prices", "ndays", "prices", "extra_days",
+                                                         "mention_index")}
+        atomic_write_file(path, lambda f: np.savez(f, **arrays))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(**{name: data[name] for name in data.files})
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark-relative and risk metrics of the evaluated mentions.
+Every price series is turned once into cumulative arrays: the log closes, the cumulative sum
+of the squared daily log returns, a sparse table of the running minimum and a calendar-day to
+trading-day index. The return over any window, the volatility before the entry and the worst
+close inside the holding window are then O(1) array lookups for all the mentions and horizons
+at once, instead of a slice of the price DataFrame per mention.
+"""
+import numpy as np
+import pandas as pd
+
+from service.price_downloader import PriceDownloader
+
+
+DEFAULT_BENCHMARK = "SPY"
+
+# the daily volatility before the entry is measured over this many trading days
+DEFAULT_VOL_WINDOW = 60
+
+
+class LogReturnSeries:
+    """
+    The cumulative log returns of one price series.
+    Args:
+        dates (np.ndarray): The sorted, unique datetime64[D] trading days.
+        close (np.ndarray): The closes, aligned with `dates`; the days without a positive close are dropped.
+    """
+    def __init__(self, dates, close):
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        close = np.asarray(close, dtype="f8")
+        keep = close > 0
+        self.dates = dates[keep]
+        self.log_close = np.log(close[keep])
+        squared = np.diff(self.log_close) ** 2
+        self.cum_squared = np.concatenate([[0.0], np.cumsum(squared)])
+        # the trading day on or before each calendar day of the series
+        if len(self.dates):
+            offsets = (self.dates - self.dates[0]).astype("int64")
+            self.position = np.repeat(np.arange(len(offsets)), np.diff(np.append(offsets, offsets[-1] + 1)))
+        else:
+            self.position = np.empty(0, dtype="int64")
+        # min_table[k][p] is the minimum log close of the 2**k days from p
+        self.min_table = [self.log_close]
+        while 2 ** len(self.min_table) <= len(self.log_close):
+            previous, half = self.min_table[-1], 2 ** (len(self.min_table) - 1)
+            self.min_table.append(np.minimum(previous[:-half], previous[half:]))
+
+    @classmethod
+    def from_records(cls, records):
+        return cls(records["date"], records["close"])
+
+    def __len__(self):
+        return len(self.dates)
+
+    def locate(self, dates):
+        """
+        The trading day on or before each date.
+        Returns:
+            tuple: (positions, found) arrays of the dates' shape; a date before the first or
+                after the last trading day, or NaT, is not found.
+        """
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        if not len(self.dates):
+            return np.zeros(dates.shape, dtype="int64"), np.zeros(dates.shape, dtype=bool)
+        offsets = (dates - self.dates[0]).astype("int64")
+        found = ~np.isnat(dates) & (offsets >= 0) & (offsets < len(self.position))
+        return self.position[np.where(found, offsets, 0)], found
+
+    def log_return(self, start, end):
+        return self.log_close[end] - self.log_close[start]
+
+    def volatility(self, end, window=DEFAULT_VOL_WINDOW):
+        """
+        The daily volatility of the log returns over the `window` trading days up to `end`,
+        NaN with less than two returns.
+        """
+        start = np.maximum(end - window, 0)
+        count = end - start
+        total = self.log_close[end] - self.log_close[start]
+        squares = self.cum_squared[end] - self.cum_squared[start]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            variance = (squares - total ** 2 / count) / (count - 1)
+        return np.where(count >= 2, np.sqrt(np.maximum(variance, 0)), np.nan)
+
+    def range_min(self, start, end):
+        """
+        The minimum log close of the trading days [start, end], start <= end.
+        """
+        level = np.floor(np.log2(end - start + 1)).astype("int64")
+        out = np.empty(np.shape(start))
+        for k in np.unique(level):
+            mask = level == k
+            table = self.min_table[k]
+            out[mask] = np.minimum(table[start[mask]], table[end[mask] - 2 ** k + 1])
+        return out
+
+
+def benchmark_of(tickers, benchmark=DEFAULT_BENCHMARK, sectors=None):
+    """
+    The benchmark of each ticker: its sector ETF in `sectors` ({ticker: ETF}), else `benchmark`.
+    """
+    sectors = sectors or {}
+    return np.array([sectors.get(t, benchmark) for t in np.asarray(tickers).tolist()], dtype="U")
+
+
+def mention_metrics(matrix, store, benchmark=DEFAULT_BENCHMARK, sectors=None, vol_window=DEFAULT_VOL_WINDOW,
+                    provider=None):
+    """
+    Compute the benchmark-relative and risk metrics of every mention and horizon.
+    Args:
+        matrix (ReturnMatrix): The evaluated mentions, see `evaluator.evaluate_mentions`.
+        store (PriceStore): The prices of the tickers and of the benchmarks.
+        benchmark (str): The default benchmark ticker.
+        sectors (dict): {ticker: benchmark ticker}, e.g. a sector ETF, for the tickers measured
+            against another benchmark.
+        vol_window (int): The trading days before the entry the volatility is measured on.
+        provider (PriceProvider): Fetch the missing prices of the benchmarks, and of the tickers
+            over the volatility window, from this provider first.
+    Returns:
+        dict: `benchmark` (n) and (n, h) arrays over the mentions and horizons, in percent,
+            NaN where a price is missing:
+                `return`, the close to close return of the mention;
+                `benchmark_return`, the return of its benchmark over the same days;
+                `excess_return`, the difference;
+                `vol_adjusted`, the log return over the volatility expected for the holding
+                    days from the `vol_window` days before the entry (no unit);
+                `max_adverse_excursion`, the worst close from the entry to the horizon, 0 or less.
+    """
+    n, h = matrix.prices.shape
+    benchmarks = benchmark_of(matrix.tickers, benchmark, sectors)
+    if provider is not None and n:
+        first = matrix.entry_dates.min() - vol_window * 2
+        last = matrix.entry_dates.max() + int(matrix.ndays.max(initial=0)) + int(matrix.extra_days.max(initial=0)) + 1
+        tickers = np.unique(np.concatenate([matrix.tickers, benchmarks])).tolist()
+        PriceDownloader(store, fetch=provider).download(tickers, str(first), str(last))
+
+    # the trading day of each horizon: the entry + N days + the extra days to the next trading day
+    horizon_dates = matrix.entry_dates[:, None] + (matrix.ndays[None, :] + matrix.extra_days).astype("timedelta64[D]")
+    horizon_dates = np.where(np.isnan(matrix.prices), np.datetime64("NaT"), horizon_dates)
+    metrics = {name: np.full((n, h), np.nan) for name in ("log_return", "benchmark_log_return", "vol_adjusted",
+                                                          "max_adverse_excursion")}
+
+    missing = []
+    for ticker, rows in pd.Series(np.arange(n)).groupby(matrix.tickers).indices.items():
+        records = store.load(ticker)
+        if records is None:
+            missing.append(ticker)
+            continue
+        series = LogReturnSeries.from_records(records)
+        if not len(series):
+            missing.append(ticker)
+            continue
+        entry, entry_found = series.locate(matrix.entry_dates[rows])
+        end, end_found = series.locate(horizon_dates[rows])
+        found = entry_found[:, None] & end_found & (end >= entry[:, None])
+        entry = np.broadcast_to(entry[:, None], end.shape)
+        log_return = np.where(found, series.log_return(entry, end), np.nan)
+        held_days = end - entry
+        with np.errstate(divide="ignore", invalid="ignore"):
+            expected = series.volatility(entry, vol_window) * np.sqrt(held_days)
+            vol_adjusted = np.where(held_days > 0, log_return / expected, np.nan)
+        lowest = series.range_min(np.where(found, entry, 0), np.where(found, end, 0))
+        adverse = np.where(found, np.minimum(lowest - series.log_close[np.where(found, entry, 0)], 0), np.nan)
+        metrics["log_return"][rows] = log_return
+        metrics["vol_adjusted"][rows] = vol_adjusted
+        metrics["max_adverse_excursion"][rows] = adverse
+
+    for name, rows in pd.Series(np.arange(n)).groupby(benchmarks).indices.items():
+        records = store.load(name)
+        series = None if records is None else LogReturnSeries.from_records(records)
+        if series is None or not len(series):
+            missing.append(name)
+            continue
+        entry, entry_found = series.locate(matrix.entry_dates[rows])
+        end, end_found = series.locate(horizon_dates[rows])
+        found = entry_found[:, None] & end_found
+        metrics["benchmark_log_return"][rows] = np.where(found, series.log_return(entry[:, None], end), np.nan)
+    if missing:
+        print(f"No prices for {len(missing)} tickers or benchmarks: {sorted(set(missing))}")
+
+    returns = np.expm1(metrics["log_return"]) * 100
+    benchmark_returns = np.expm1(metrics["benchmark_log_return"]) * 100
+    return {
+        "benchmark": benchmarks,
+        "return": returns,
+        "benchmark_return": benchmark_returns,
+        "excess_return": returns - benchmark_returns,
+        "vol_adjusted": metrics["vol_adjusted"],
+        "max_adverse_excursion": np.expm1(metrics["max_adverse_excursion"]) * 100,
+    }
+
+
+def metrics_frame(matrix, metrics, decimals=2):
+    """
+    The metrics as columns: `benchmark` and, for each horizon N, `nday_{N}_excess`,
+    `nday_{N}_vol_adj` and `nday_{N}_mae`, one row per mention of `matrix`.
+    """
+    columns = {"benchmark": metrics["benchmark"]}
+    for i, n in enumerate(matrix.ndays.tolist()):
+        columns[f"nday_{n}_excess"] = np.round(metrics["excess_return"][:, i], decimals)
+        columns[f"nday_{n}_vol_adj"] = np.round(metrics["vol_adjusted"][:, i], decimals)
+        columns[f"nday_{n}_mae"] = np.round(metrics["max_adverse_excursion"][:, i], decimals)
+    return pd.DataFrame(columns)
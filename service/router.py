@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+Cascade model routing for the extraction.
+Each transcript goes to the cheapest model first and is escalated to the next, stronger
+model only when the answer fails a check: invalid JSON, mentions rejected by the schema,
+companies without tickers, or candidates of the local prefilter missing from the mentions.
+"""
+import time
+
+from service.chunking import normalize_name, normalize_ticker
+from service.jsonstream import JsonArrayStreamParser, validate_mention
+from service.llm_cache import request_cache_key
+from service.metrics import call_cost
+from service.tokens import count_message_tokens, count_tokens
+
+
+# cheapest first, the last model is the strong one
+DEFAULT_CASCADE = ("gpt-4o-mini", "gpt-4.1-mini")
+
+ISSUE_INVALID_JSON = "invalid_json"
+ISSUE_MALFORMED_MENTIONS = "malformed_mentions"
+ISSUE_MISSING_TICKERS = "missing_tickers"
+ISSUE_MISSED_CANDIDATES = "missed_candidates"
+
+
+def check_tickers(mentions, max_missing=0.3):
+    """
+    Flag an answer where too many named companies have no ticker.
+    """
+    if not mentions:
+        return []
+    missing = sum(normalize_ticker(m.get("stock_code")) is None for m in mentions)
+    return [ISSUE_MISSING_TICKERS] if missing / len(mentions) > max_missing else []
+
+
+def check_candidates(mentions, candidates, min_missed=2, max_missed=0.5):
+    """
+    Flag an answer that ignores the companies and tickers found by the local prefilter.
+    Args:
+        mentions (list): The extracted mentions.
+        candidates (list): The prefilter candidates (see `Prefilter.filter`), tickers or names.
+        min_missed (int): The minimum number of missed candidates to flag.
+        max_missed (float): The fraction of missed candidates above which the answer is flagged.
+    """
+    if not candidates:
+        return []
+    found = set()
+    for m in mentions:
+        found.add(normalize_ticker(m.get("stock_code")))
+        found.add(normalize_name(m.get("stock")))
+    missed = [c for c in candidates if normalize_ticker(c) not in found and normalize_name(c) not in found]
+    if len(missed) >= min_missed and len(missed) / len(candidates) > max_missed:
+        return [ISSUE_MISSED_CANDIDATES]
+    return []
+
+
+class CascadeRouter:
+    """
+    Run the extraction through a cascade of models.
+    Args:
+        extract (callable): Called with (transcript, model), returns the raw model answer.
+        build_request (callable): Called with (transcript, model), used to estimate the prompt tokens.
+        models (list): The models, cheapest first.
+        prefilter (Prefilter): Optional prefilter for the candidates check.
+        max_missing_tickers (float): See `check_tickers`.
+        cache (LLMCache): The response cache `extract` goes through; the answers it serves cost
+            nothing and their lookup time is not counted as model latency.
+    """
+    def __init__(self, extract, build_request, models=DEFAULT_CASCADE, prefilter=None,
+                 max_missing_tickers=0.3, cache=None):
+        if not models:
+            raise ValueError("The cascade needs at least one model.")
+        self.extract = extract
+        self.build_request = build_request
+        self.models = list(models)
+        self.prefilter = prefilter
+        self.max_missing_tickers = max_missing_tickers
+        self.cache = cache
+
+    def check(self, raw, candidates):
+        """
+        Parse an answer and run the checks.
+        Returns:
+            tuple: (mentions or None, list of issues)
+        """
+        parser = JsonArrayStreamParser(validate_mention)
+        mentions = parser.feed(raw) + parser.close()
+        if not parser.found:
+            return None, [ISSUE_INVALID_JSON]
+        issues = [ISSUE_MALFORMED_MENTIONS] if parser.errors or parser.salvaged else []
+        issues += check_tickers(mentions, self.max_missing_tickers)
+        if candidates is not None:
+            issues += check_candidates(mentions, candidates)
+        return mentions, issues
+
+    def route(self, key, transcript):
+        """
+        Extract one transcript, escalating until a model passes the checks.
+        Returns:
+            dict: `key`, `model` (the accepted model), `mentions` (None if no model answered
+                valid JSON), `issues` (of the accepted answer), `escalated`, `attempts` (model,
+                issues, cache hit, latency and estimated cost of each call), `latency_s` and
+                `cost_usd` (summed over the attempts).
+        Notes:
+            When a later model fails or answers invalid JSON, the last valid answer of an
+            earlier model is kept, with its issues.
+        """
+        candidates = None
+        if self.prefilter is not None:
+            candidates = self.prefilter.filter(transcript)["candidates"]
+        attempts = []
+        accepted = None
+        for model in self.models:
+            request = self.build_request(transcript, model)
+            cache_hit = self.cache is not None and request_cache_key(request) in self.cache
+            start = time.perf_counter()
+            try:
+                raw = self.extract(transcript, model)
+            except Exception as e:
+                raw = None
+                mentions, issues = None, [f"error: {type(e).__name__}: {e}"]
+            latency = time.perf_counter() - start
+            prompt_tokens = count_message_tokens(request["messages"], model)
+            completion_tokens = count_tokens(raw or "", model)
+            if raw is not None:
+                mentions, issues = self.check(raw, candidates)
+            cost = call_cost(model, prompt_tokens, completion_tokens) or 0.0
+            attempts.append({"model": model, "issues": issues, "cache_hit": cache_hit,
+                             "latency_s": 0.0 if cache_hit else latency,
+                             "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                             "cost_usd": 0.0 if cache_hit else cost})
+            if mentions is not None or accepted is None:
+                accepted = (model, mentions, issues)
+            if not issues:
+                break
+        model, mentions, issues = accepted
+        return {
+            "key": key,
+            "model": model,
+            "mentions": mentions,
+            "issues": issues,
+            "escalated": len(attempts) > 1,
+            "attempts": attempts,
+            "latency_s": sum(a["latency_s"] for a in attempts),
+            "cost_usd": sum(a["cost_usd"] for a in attempts),
+        }
+
+
+def cascade_report(results, strong_model):
+    """
+    Compare the cascade with always using the strong model.
+    The strong model cost of a transcript that was not escalated, or whose strong answer was
+    cached, is estimated from its token counts, and its latency from the mean latency of the
+    strong calls that were made.
+    Returns:
+        dict: The escalation rate and reasons, and the average latency and cost per transcript
+            of the cascade and of the strong model alone.
+    """
+    count = len(results)
+    report = {"transcripts": count, "escalated": sum(r["escalated"] for r in results), "reasons": {}}
+    if not count:
+        return report
+    for r in results:
+        if r["escalated"]:
+            for issue in r["attempts"][0]["issues"]:
+                report["reasons"][issue] = report["reasons"].get(issue, 0) + 1
+    strong_calls = [a for r in results for a in r["attempts"] if a["model"] == strong_model and not a["cache_hit"]]
+    strong_latency = sum(a["latency_s"] for a in strong_calls) / len(strong_calls) if strong_calls else None
+    strong_cost = 0.0
+    for r in results:
+        calls = [a for a in r["attempts"] if a["model"] == strong_model and not a["cache_hit"]]
+        if calls:
+            strong_cost += calls[-1]["cost_usd"]
+        else:
+            first = r["attempts"][0]
+            strong_cost += call_cost(strong_model, first["prompt_tokens"], first["completion_tokens"]) or 0.0
+    report.update({
+        "escalation_rate": round(report["escalated"] / count, 3),
+        "failed": sum(r["mentions"] is None for r in results),
+        "avg_latency_s": round(sum(r["latency_s"] for r in results) / count, 3),
+        "avg_cost_usd": round(sum(r["cost_usd"] for r in results) / count, 6),
+        "strong_model": strong_model,
+        "strong_avg_latency_s": round(strong_latency, 3) if strong_latency is not None else None,
+        "strong_avg_cost_usd": round(strong_cost / count, 6),
+    })
+    return report
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+Compact, timestamp-preserving segment index for cleaned transcripts.
+Each cleaned `{udate}_{video_id}.txt` can have a `{udate}_{video_id}.seg` file next to it,
+holding the cue start/end times and the character and byte offsets of every segment of
+the text as parallel arrays. The arrays are memory-mapped, so a time range, a character
+range or a quote can be resolved without loading the whole transcript.
+
+File layout (little endian):
+    8 bytes  magic b"YTSEG\\x01\\x00\\x00"
+    uint64   count, total_chars, total_bytes
+    int64    start_ms[count], end_ms[count], char_off[count], byte_off[count]
+"""
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from service.vtt import VttCleaner, iter_lines
+
+
+MAGIC = b"YTSEG\x01\x00\x00"
+_HEADER = struct.Struct("<8sQQQ")
+_FIELDS = ("start_ms", "end_ms", "char_off", "byte_off")
+
+
+def segments_path_for(txt_file):
+    """
+    Get the segment file path for a cleaned transcript, e.g. `x.txt` -> `x.seg`.
+    """
+    return os.path.splitext(txt_file)[0] + ".seg"
+
+
+def iter_clean_vtt_segments(source, **kwargs):
+    """
+    Clean a VTT source and keep the cue timing of every piece of text.
+    Yields:
+        tuple: (start_ms, end_ms, piece), "".join of the pieces is the cleaned script.
+    """
+    cleaner = VttCleaner(**kwargs)
+    for piece in cleaner.feed_lines(iter_lines(source)):
+        yield cleaner.cue_start, cleaner.cue_end, piece
+
+
+class SegmentWriter:
+    """
+    Collect the segments of a transcript while it is written, consecutive pieces
+    of the same cue are merged into one segment.
+    """
+    def __init__(self):
+        self.start_ms = []
+        self.end_ms = []
+        self.char_off = []
+        self.byte_off = []
+        self.total_chars = 0
+        self.total_bytes = 0
+
+    def add(self, start_ms, end_ms, piece):
+        start_ms = -1 if start_ms is None else start_ms
+        end_ms = -1 if end_ms is None else end_ms
+        if not (self.start_ms and self.start_ms[-1] == start_ms and self.end_ms[-1] == end_ms):
+            self.start_ms.append(start_ms)
+            self.end_ms.append(end_ms)
+            self.char_off.append(self.total_chars)
+            self.byte_off.append(self.total_bytes)
+        self.total_chars += len(piece)
+        self.total_bytes += len(piece.encode("utf-8"))
+
+    def save(self, path):
+        count = len(self.start_ms)
+        with open(path, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, count, self.total_chars, self.total_bytes))
+            for values in (self.start_ms, self.end_ms, self.char_off, self.byte_off):
+                f.write(np.asarray(values, dtype="<i8").tobytes())
+
+
+def clean_vtt_file_with_segments(vtt_file, output_file, segments_file=None, **kwargs):
+    """
+    Clean a VTT file to `output_file` and write its segment index next to it.
+    Args:
+        vtt_file (str): The VTT file path.
+        output_file (str): The cleaned text file path.
+        segments_file (str): The segment file path, defaults to `output_file` with a `.seg` extension.
+    Returns:
+        str: The segment file path.
+    """
+    segments_file = segments_file or segments_path_for(output_file)
+    writer = SegmentWriter()
+    with open(output_file, "w", encoding="utf-8", newline="") as f:
+        for start_ms, end_ms, piece in iter_clean_vtt_segments(vtt_file, **kwargs):
+            f.write(piece)
+            writer.add(start_ms, end_ms, piece)
+    writer.save(segments_file)
+    return segments_file
+
+
+class TranscriptSegments:
+    """
+    Read-only, memory-mapped view of a transcript and its segment index.
+    Args:
+        txt_file (str): The cleaned transcript path.
+        segments_file (str): The segment file path, defaults to the `.seg` next to `txt_file`.
+    Notes:
+        - Times are in milliseconds, text offsets are character offsets into the cleaned text.
+        - A segment with an unknown timing has start_ms and end_ms of -1.
+    """
+    def __init__(self, txt_file, segments_file=None):
+        self.txt_file = txt_file
+        self.segments_file = segments_file or segments_path_for(txt_file)
+        with open(self.segments_file, "rb") as f:
+            magic, count, total_chars, total_bytes = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"Invalid segment file: {self.segments_file}")
+        self.count = count
+        self.total_chars = total_chars
+        self.total_bytes = total_bytes
+        for idx, name in enumerate(_FIELDS):
+            if count:
+                offset = _HEADER.size + idx * count * 8
+                array = np.memmap(self.segments_file, dtype="<i8", mode="r", offset=offset, shape=(count,))
+            else:
+                array = np.empty(0, dtype="<i8")
+            setattr(self, name, array)
+
+    def __len__(self):
+        return self.count
+
+    def _read_bytes(self, byte_start, byte_end):
+        with open(self.txt_file, "rb") as f:
+            f.seek(byte_start)
+            return f.read(byte_end - byte_start)
+
+    def _segment_text(self, first, last):
+        """
+        Returns:
+            str: The text of segments `first` to `last`, both included.
+        """
+        byte_start = int(self.byte_off[first])
+        byte_end = int(self.byte_off[last + 1]) if last + 1 < self.count else self.total_bytes
+        return self._read_bytes(byte_start, byte_end).decode("utf-8")
+
+    def segment(self, idx):
+        """
+        Returns:
+            dict: The `start_ms`, `end_ms`, `char_start`, `char_end` and `text` of one segment.
+        """
+        char_end = int(self.char_off[idx + 1]) if idx + 1 < self.count else self.total_chars
+        return {
+            "start_ms": int(self.start_ms[idx]),
+            "end_ms": int(self.end_ms[idx]),
+            "char_start": int(self.char_off[idx]),
+            "char_end": char_end,
+            "text": self._segment_text(idx, idx).strip(),
+        }
+
+    def segment_at_char(self, char_offset):
+        """
+        Get the index of the segment containing a character offset.
+        """
+        idx = int(np.searchsorted(self.char_off, char_offset, side="right")) - 1
+        return max(idx, 0)
+
+    def time_at_char(self, char_offset):
+        """
+        Get the (start_ms, end_ms) of the cue a character offset of the text comes from.
+        """
+        idx = self.segment_at_char(char_offset)
+        return int(self.start_ms[idx]), int(self.end_ms[idx])
+
+    def slice_chars(self, char_start, char_end):
+        """
+        Get the text between two character offsets, only the covering segments are read.
+        """
+        char_start = max(0, char_start)
+        char_end = min(self.total_chars, char_end)
+        if self.count == 0 or char_end <= char_start:
+            return ""
+        first = self.segment_at_char(char_start)
+        last = self.segment_at_char(char_end - 1)
+        text = self._segment_text(first, last)
+        base = int(self.char_off[first])
+        return text[char_start - base:char_end - base]
+
+    def slice_time(self, start_ms, end_ms):
+        """
+        Get the text spoken between two times.
+        Returns:
+            dict: The `text`, the `start_ms`/`end_ms` of the covering cues and the `char_start`/`char_end`,
+                None if no segment overlaps the time range.
+        """
+        # the segments are in time order, the end times of rolling captions never decrease
+        first = int(np.searchsorted(self.end_ms, start_ms, side="right"))
+        last = int(np.searchsorted(self.start_ms, end_ms, side="left")) - 1
+        if self.count == 0 or first > last:
+            return None
+        char_end = int(self.char_off[last + 1]) if last + 1 < self.count else self.total_chars
+        return {
+            "text": self._segment_text(first, last).strip(),
+            "start_ms": int(self.start_ms[first]),
+            "end_ms": int(self.end_ms[last]),
+            "char_start": int(self.char_off[first]),
+            "char_end": char_end,
+        }
+
+    def locate(self, quote):
+        """
+        Find a quote in the transcript and return the time it was said.
+        Returns:
+            dict: The `start_ms`, `end_ms` and `char_start` of the first match, None if not found.
+        Notes:
+            - An exact match is searched in the memory-mapped file first, a case-insensitive
+              match falls back to decoding the whole text.
+        """
+        needle = quote.strip()
+        if not needle or self.total_bytes == 0:
+            return None
+        with open(self.txt_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            byte_pos = mm.find(needle.encode("utf-8"))
+            if byte_pos >= 0:
+                idx = int(np.searchsorted(self.byte_off, byte_pos, side="right")) - 1
+                prefix = mm[int(self.byte_off[idx]):byte_pos].decode("utf-8", errors="ignore")
+                char_pos = int(self.char_off[idx]) + len(prefix)
+            else:
+                char_pos = mm[:].decode("utf-8").lower().find(needle.lower())
+                if char_pos < 0:
+                    return None
+                idx = self.segment_at_char(char_pos)
+        return {
+            "start_ms": int(self.start_ms[idx]),
+            "end_ms": int(self.end_ms[idx]),
+            "char_start": char_pos,
+        }
+
+    def iter_windows(self, max_chars, overlap_chars=0):
+        """
+        Split the transcript into windows of whole segments of at most `max_chars` characters;
+        a segment longer than that is a window on its own.
+        Yields:
+            dict: Each window with `text`, `start_ms`, `end_ms`, `char_start` and `char_end`.
+        """
+        # the end offset of each segment
+        ends = np.append(np.asarray(self.char_off[1:self.count]), self.total_chars)
+        idx = 0
+        while idx < self.count:
+            char_start = int(self.char_off[idx])
+            # the last segment that ends within the budget, at least one segment per window
+            last = int(np.searchsorted(ends, char_start + max_chars, side="right")) - 1
+            last = max(last, idx)
+            char_end = int(ends[last])
+            yield {
+                "text": self._segment_text(idx, last).strip(),
+                "start_ms": int(self.start_ms[idx]),
+                "end_ms": int(self.end_ms[last]),
+                "char_start": char_start,
+                "char_end": char_end,
+            }
+            if last + 1 >= self.count:
+                break
+            next_idx = self.segment_at_char(char_end - overlap_chars) if overlap_chars else last + 1
+            idx = max(next_idx, idx + 1)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Small helpers to persist JSON state files safely.
+Files are written to a temporary file in the same folder and then renamed, so a crash
+never leaves a half written file behind.
+"""
+import json
+import os
+import tempfile
+
+
+def atomic_write_file(path, write, mode="wb", encoding=None):
+    """
+    Write a file atomically.
+    Args:
+        path (str): The target file path.
+        write (callable): Called with the open file, e.g. `lambda f: np.save(f, array)`.
+        mode (str): The open mode, "wb" or "w".
+        encoding (str): The encoding of a text file.
+    """
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=".tmp_", suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, mode, encoding=encoding) as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def atomic_write_text(path, text, encoding="utf-8"):
+    """
+    Write text to a file atomically.
+    Args:
+        path (str): The target file path.
+        text (str): The content to write.
+    """
+    atomic_write_file(path, lambda f: f.write(text), mode="w", encoding=encoding)
+
+
+def atomic_write_json(path, obj, indent=2):
+    """
+    Dump an object to a JSON file atomically.
+    Args:
+        path (str): The target file path.
+        obj: A JSON serializable object.
+        indent (int): The indentation used by json.dump.
+    """
+    atomic_write_text(path, json.dumps(obj, indent=indent, ensure_ascii=False))
+
+
+def read_json(path, default=None):
+    """
+    Load a JSON file, returning `default` if the file does not exist.
+    """
+    if not os.path.exists(path):
+        return default
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
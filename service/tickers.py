@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+Local company name to ticker resolution.
+A symbol master file (name, aliases, ticker, exchange) is indexed once for exact, normalized
+and trigram fuzzy matching, and every resolution is kept in a JSON file across runs. Only the
+names that are unknown or ambiguous are left for the LLM lookup of `fillempty.py`.
+"""
+import csv
+import math
+import os
+import re
+from collections import Counter
+
+from service.storage import atomic_write_json, read_json
+
+
+DEFAULT_MASTER_PATH = "data/symbol_master.csv"
+DEFAULT_RESOLUTIONS_PATH = "output/cache/ticker_resolutions.json"
+
+METHOD_EXACT = "exact"
+METHOD_TICKER = "ticker"
+METHOD_NORMALIZED = "normalized"
+METHOD_FUZZY = "fuzzy"
+METHOD_LLM = "llm"
+
+_SUFFIXES = {
+    "inc", "incorporated", "corp", "corporation", "co", "company", "companies", "ltd", "limited", "plc",
+    "holdings", "holding", "group", "sa", "ag", "nv", "se", "llc", "lp", "the", "class", "cl", "a", "b",
+    "c", "common", "stock", "shares", "ordinary", "ads", "adr", "technologies", "technology",
+}
+_NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+# NASDAQ Trader names look like "Apple Inc. - Common Stock"
+_SECURITY_SUFFIX_RE = re.compile(r"\s+-\s+.*$")
+
+
+def normalize_company(name):
+    """
+    Normalize a company name for matching, e.g. "The Walt Disney Company" -> "walt disney".
+    A name made only of suffix words is kept as is, so "Group" does not become empty.
+    """
+    words = _NON_WORD_RE.sub(" ", str(name or "").lower().replace("&", " and ")).split()
+    kept = [w for w in words if w not in _SUFFIXES]
+    return " ".join(kept or words)
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def load_symbol_master(path):
+    """
+    Load a symbol master file.
+    Two formats are read:
+        - a CSV with the columns `name`, `ticker`, and optionally `aliases` (separated by "|") and `exchange`;
+        - the pipe separated NASDAQ Trader files (nasdaqlisted.txt / otherlisted.txt).
+    Returns:
+        list: Dicts with `name`, `aliases`, `ticker` and `exchange`.
+    """
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        header = f.readline()
+        f.seek(0)
+        if "|" in header and "Security Name" in header:
+            rows = csv.DictReader(f, delimiter="|")
+            symbol_col = "Symbol" if "Symbol" in rows.fieldnames else "ACT Symbol"
+            entries = []
+            for row in rows:
+                ticker = (row.get(symbol_col) or "").strip()
+                if not ticker or row.get("Test Issue") == "Y" or ticker.startswith("File Creation Time"):
+                    continue
+                entries.append({"name": _SECURITY_SUFFIX_RE.sub("", row["Security Name"]).strip(), "aliases": [],
+                                "ticker": ticker, "exchange": row.get("Exchange") or "NASDAQ"})
+            return entries
+        entries = []
+        for row in csv.DictReader(f):
+            ticker = (row.get("ticker") or "").strip().upper()
+            if not ticker:
+                continue
+            aliases = [a.strip() for a in (row.get("aliases") or "").split("|") if a.strip()]
+            entries.append({"name": (row.get("name") or "").strip(), "aliases": aliases,
+                            "ticker": ticker, "exchange": (row.get("exchange") or "").strip()})
+        return entries
+
+
+class SymbolIndex:
+    """
+    Prebuilt matching index over the symbol master.
+    Args:
+        entries (list): The symbol master entries, see `load_symbol_master`.
+        fuzzy_threshold (float): The minimum trigram similarity (Dice) of a fuzzy match.
+        fuzzy_margin (float): The minimum lead of the best fuzzy match over a match of another ticker.
+    """
+    def __init__(self, entries, fuzzy_threshold=0.8, fuzzy_margin=0.1):
+        self.fuzzy_threshold = fuzzy_threshold
+        self.fuzzy_margin = fuzzy_margin
+        self.exact = {}
+        self.normalized = {}
+        self.tickers = {}
+        self._keys = []
+        self._key_trigrams = []
+        self._postings = {}
+        # a fuzzy match shares at least this share of the query trigrams, see `_fuzzy`
+        floor = fuzzy_threshold - fuzzy_margin
+        self._min_common = floor / (2 - floor)
+        for entry in entries:
+            target = (entry["ticker"], entry.get("exchange", ""))
+            self.tickers.setdefault(entry["ticker"].upper(), target)
+            for name in [entry["name"]] + list(entry.get("aliases", [])):
+                if not name:
+                    continue
+                self.exact.setdefault(name.lower(), set()).add(target)
+                key = normalize_company(name)
+                if key not in self.normalized:
+                    self.normalized[key] = set()
+                    self._add_trigrams(key)
+                self.normalized[key].add(target)
+
+    def _add_trigrams(self, key):
+        idx = len(self._keys)
+        grams = trigrams(key)
+        self._keys.append(key)
+        self._key_trigrams.append(grams)
+        for gram in grams:
+            self._postings.setdefault(gram, []).append(idx)
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def lookup(self, name):
+        """
+        Match a company name.
+        Returns:
+            tuple: (targets, method, score); targets is a set of (ticker, exchange), more than
+                one target means the name is ambiguous, an empty set that it is unknown.
+        """
+        exact = self.exact.get(name.strip().lower())
+        if exact:
+            return exact, METHOD_EXACT, 1.0
+        key = normalize_company(name)
+        if key in self.normalized:
+            return self.normalized[key], METHOD_NORMALIZED, 1.0
+        bare = name.strip().lstrip("$")
+        if bare.isupper() and bare in self.tickers:
+            return {self.tickers[bare]}, METHOD_TICKER, 1.0
+        return self._fuzzy(key)
+
+    def _fuzzy(self, key):
+        # prefix filtering: a key with a Dice score of at least `floor` shares at least
+        # `_min_common` of the query trigrams, so it appears in the postings of the rarest ones;
+        # its trigram count is also bounded, which skips more candidates before scoring
+        grams = trigrams(key)
+        size = len(grams)
+        floor = self.fuzzy_threshold - self.fuzzy_margin
+        postings = self._postings
+        ordered = sorted(grams, key=lambda g: len(postings.get(g, ())))
+        min_common = math.ceil(self._min_common * size)
+        # a match misses at most `size - min_common` trigrams, so it has at least `extra + 1`
+        # of the `size - min_common + 1 + extra` rarest ones
+        extra = min(2, max(min_common - 1, 0))
+        hits = Counter()
+        for gram in ordered[:size - min_common + 1 + extra]:
+            hits.update(postings.get(gram, ()))
+        candidates = [idx for idx, count in hits.items() if count > extra]
+        low, high = size * self._min_common, size / self._min_common
+        key_trigrams = self._key_trigrams
+        scored = []
+        for idx in candidates:
+            other = key_trigrams[idx]
+            other_size = len(other)
+            if other_size < low or other_size > high:
+                continue
+            score = 2 * len(grams & other) / (size + other_size)
+            if score >= floor:
+                scored.append((score, idx))
+        if not scored:
+            return set(), METHOD_FUZZY, 0.0
+        scored.sort(reverse=True)
+        best_score, best_idx = scored[0]
+        best = self.normalized[self._keys[best_idx]]
+        if best_score < self.fuzzy_threshold:
+            return set(), METHOD_FUZZY, best_score
+        for score, idx in scored[1:]:
+            rival = self.normalized[self._keys[idx]]
+            if rival != best:
+                if best_score - score < self.fuzzy_margin:
+                    return best | rival, METHOD_FUZZY, best_score
+                break
+        return best, METHOD_FUZZY, best_score
+
+
+class TickerResolver:
+    """
+    Resolve company names to tickers locally, remembering every resolution.
+    Args:
+        index (SymbolIndex): The symbol master index, None to only use the remembered resolutions.
+        path (str): The JSON file of the remembered resolutions.
+    Notes:
+        - The remembered resolutions (including the LLM answers) win over the index.
+    """
+    def __init__(self, index=None, path=DEFAULT_RESOLUTIONS_PATH):
+        self.index = index
+        self.path = path
+        self.resolutions = read_json(path, default={})
+        self._dirty = False
+
+    @classmethod
+    def from_master(cls, master_path=DEFAULT_MASTER_PATH, path=DEFAULT_RESOLUTIONS_PATH):
+        """
+        Build the resolver from a symbol master file, without index if the file is missing.
+        """
+        index = None
+        if os.path.exists(master_path):
+            index = SymbolIndex(load_symbol_master(master_path))
+        else:
+            print(f"No symbol master at {master_path}, only the remembered resolutions are used.")
+        return cls(index, path)
+
+    def resolve(self, name):
+        """
+        Resolve one company name.
+        Returns:
+            dict: {"company", "ticker", "exchange", "method", "score"}, None if the name is
+                unknown or ambiguous.
+        """
+        key = normalize_company(name)
+        if not key:
+            return None
+        known = self.resolutions.get(key)
+        if known is not None:
+            return dict(known, company=name)
+        if self.index is None:
+            return None
+        targets, method, score = self.index.lookup(name)
+        if len(targets) != 1:
+            return None
+        ticker, exchange = next(iter(targets))
+        resolution = {"ticker": ticker, "exchange": exchange, "method": method, "score": round(score, 3)}
+        self.resolutions[key] = resolution
+        self._dirty = True
+        return dict(resolution, company=name)
+
+    def resolve_all(self, names):
+        """
+        Resolve many names.
+        Returns:
+            tuple: (list of resolutions, list of the names left for the LLM)
+        """
+        resolved = []
+        unresolved = []
+        for name in dict.fromkeys(names):
+            resolution = self.resolve(name)
+            if resolution is None:
+                unresolved.append(name)
+            else:
+                resolved.append(resolution)
+        return resolved, unresolved
+
+    def remember(self, name, ticker, exchange="", method=METHOD_LLM):
+        """
+        Remember a resolution made elsewhere, e.g. by the LLM. An empty or N/A ticker is ignored.
+        """
+        if not isinstance(ticker, str) or ticker.strip().upper() in ("", "N/A", "NA", "NONE", "UNKNOWN"):
+            return
+        self.resolutions[normalize_company(name)] = {"ticker": ticker.strip().upper(), "exchange": exchange or "",
+                                                     "method": method, "score": 1.0}
+        self._dirty = True
+
+    def save(self):
+        if self._dirty:
+            atomic_write_json(self.path, self.resolutions)
+            self._dirty = False
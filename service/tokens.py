@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Token counting helpers used for rate budgets and chunking.
+tiktoken is used when it is installed, otherwise the count is estimated from the text length.
+"""
+try:
+    import tiktoken
+except ImportError:  # optional dependency
+    tiktoken = None
+
+
+CHARS_PER_TOKEN = 4  # rough average for English text
+_encodings = {}
+
+
+def get_encoding(model="gpt-4.1-mini"):
+    """
+    Get the tiktoken encoding of a model, None if tiktoken is not available.
+    """
+    if tiktoken is None:
+        return None
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encodings[model] = tiktoken.get_encoding("o200k_base")
+        except Exception:  # the encoding files could not be downloaded
+            _encodings[model] = None
+    return _encodings[model]
+
+
+def count_tokens(text, model="gpt-4.1-mini"):
+    """
+    Count the tokens of a text for a model.
+    Args:
+        text (str): The text to count.
+        model (str): The LLM model name.
+    Returns:
+        int: The number of tokens, estimated if tiktoken is not available.
+    """
+    encoding = get_encoding(model)
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages, model="gpt-4.1-mini"):
+    """
+    Count the prompt tokens of a list of chat messages, including a small per-message overhead.
+    """
+    return sum(count_tokens(m.get("content") or "", model) + 4 for m in messages) + 3
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorized trading-day lookup.
+The trading dates of a ticker are a sorted datetime64[D] array, so "the first trading day
+on or after D" for a whole array of dates is a single `searchsorted`, instead of walking
+one calendar day at a time through the DataFrame index.
+"""
+import numpy as np
+import pandas as pd
+
+
+# the day-by-day walk of `evaluator.get_next_validate_date` gives up after 100 days
+MAX_EXTRA_DAYS = 100
+
+
+def to_days(dates):
+    """
+    Convert dates (YYYYMMDD ints or strings, date strings, Timestamps or datetime64) to a
+    datetime64[D] array. The dates that cannot be parsed become NaT.
+    """
+    values = np.asarray(dates)
+    if values.dtype.kind in "UO":
+        numbers = pd.to_numeric(pd.Series(values.ravel()), errors="coerce")
+        if numbers.notna().all():
+            values = numbers.to_numpy().reshape(values.shape)
+    if values.dtype.kind == "M":
+        return values.astype("datetime64[D]")
+    if values.dtype.kind in "iuf":
+        out = np.full(values.shape, np.datetime64("NaT"), dtype="datetime64[D]")
+        ok = np.isfinite(values) if values.dtype.kind == "f" else np.ones(values.shape, dtype=bool)
+        ints = np.where(ok, values, 0).astype("int64")
+        year, month, day = ints // 10000, ints // 100 % 100, ints % 100
+        ok &= (year >= 1) & (month >= 1) & (month <= 12) & (day >= 1) & (day <= 31)
+        months = (year[ok] - 1970) * 12 + month[ok] - 1
+        days = months.astype("datetime64[M]").astype("datetime64[D]") + (day[ok] - 1)
+        # 20240231 rolls into March: reject the days past the end of the month
+        valid = days.astype("datetime64[M]") == months.astype("datetime64[M]")
+        out[np.flatnonzero(ok)[valid]] = days[valid]
+        return out
+    return pd.to_datetime(values.ravel(), errors="coerce", format="mixed").to_numpy(
+        dtype="datetime64[D]").reshape(values.shape)
+
+
+def next_trading_days(trading_dates, targets, max_extra_days=MAX_EXTRA_DAYS):
+    """
+    Find the first trading day on or after each target date.
+    Args:
+        trading_dates (np.ndarray): The sorted, unique datetime64[D] trading dates.
+        targets (np.ndarray): The datetime64[D] target dates, of any shape; NaT is never found.
+        max_extra_days (int): The maximum number of calendar days after the target.
+    Returns:
+        tuple: (positions, extra_days, found) arrays of the targets' shape; `positions` index
+            `trading_dates` and are only meaningful where `found`.
+    """
+    targets = np.asarray(targets, dtype="datetime64[D]")
+    positions = np.searchsorted(trading_dates, targets, side="left")
+    found = (positions < len(trading_dates)) & ~np.isnat(targets)
+    positions = np.where(found, positions, 0)
+    if len(trading_dates) == 0:
+        return positions, np.zeros(targets.shape, dtype="int64"), found
+    extra_days = (trading_dates[positions] - targets).astype("int64")
+    found &= extra_days <= max_extra_days
+    extra_days = np.where(found, extra_days, 0)
+    return positions, extra_days, found
+
+
+class TradingDayLookup:
+    """
+    Entry and horizon prices of mentions, for one ticker.
+    Args:
+        dates (np.ndarray): The sorted, unique trading dates.
+        close (np.ndarray): The close prices, aligned with `dates`.
+        max_extra_days (int): See `next_trading_days`.
+    """
+    def __init__(self, dates, close, max_extra_days=MAX_EXTRA_DAYS):
+        self.dates = np.asarray(dates, dtype="datetime64[D]")
+        self.close = np.asarray(close, dtype="f8")
+        self.max_extra_days = max_extra_days
+
+    @classmethod
+    def from_records(cls, records, max_extra_days=MAX_EXTRA_DAYS):
+        """
+        Build the lookup from the records of `PriceStore.load`, without copying them.
+        """
+        return cls(records["date"], records["close"], max_extra_days)
+
+    def lookup(self, mention_dates, ndays_list):
+        """
+        Resolve the entry day (first trading day on or after the mention) and, from it, the
+        first trading day on or after each horizon.
+        Args:
+            mention_dates: The mention dates, see `to_days`.
+            ndays_list (list): The horizons in calendar days.
+        Returns:
+            dict: Arrays over the n mentions and h horizons:
+                `entry_found` (n), `entry_date` (n), `entry_extra_days` (n), `entry_price` (n),
+                `price` (n, h, NaN when not found or not available) and `extra_days` (n, h,
+                0 when the price is NaN).
+        """
+        mention_days = to_days(mention_dates)
+        pos, entry_extra, entry_found = next_trading_days(self.dates, mention_days, self.max_extra_days)
+        entry_date = np.where(entry_found, self.dates[pos] if len(self.dates) else mention_days,
+                              np.datetime64("NaT"))
+        entry_price = np.where(entry_found, self.close[pos] if len(self.close) else np.nan, np.nan)
+        horizons = np.asarray(ndays_list, dtype="int64")
+        targets = entry_date[:, None] + horizons[None, :].astype("timedelta64[D]")
+        h_pos, h_extra, h_found = next_trading_days(self.dates, targets, self.max_extra_days)
+        price = np.where(h_found, self.close[h_pos] if len(self.close) else np.nan, np.nan)
+        extra_days = np.where(np.isnan(price), 0, h_extra)
+        return {
+            "entry_found": entry_found,
+            "entry_date": entry_date,
+            "entry_extra_days": entry_extra,
+            "entry_price": entry_price,
+            "price": price,
+            "extra_days": extra_days,
+        }
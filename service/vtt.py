@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming, single-pass WebVTT cleaner.
+It works as a generator over the lines (or file chunks) of a VTT file, strips the header,
+cue timings and inline tags in one pass, and collapses the rolling-caption overlap of
+YouTube auto-captions by matching the tail of the emitted text with the head of each new line.
+"""
+import html
+import re
+
+
+_TAG_RE = re.compile(r"<[^>]*>")
+_SPACE_PUNCT_RE = re.compile(r" (?=[.,?!])")
+_PUNCT = frozenset(".,?!")
+_BLOCK_KEYWORDS = ("NOTE", "STYLE", "REGION")
+
+
+def iter_lines(source, chunk_size=1 << 16):
+    """
+    Yield the lines of a VTT source without loading it all at once.
+    Args:
+        source: A file path, an open text file, a VTT string or an iterable of lines.
+        chunk_size (int): The read size when reading from a file.
+    """
+    if isinstance(source, str) and "\n" not in source and not source.startswith("WEBVTT"):
+        with open(source, "r", encoding="utf-8", buffering=chunk_size) as f:
+            yield from f
+    elif isinstance(source, str):
+        yield from source.splitlines()
+    elif hasattr(source, "read"):
+        yield from iter_chunked_lines(iter(lambda: source.read(chunk_size), ""))
+    elif hasattr(source, "__fspath__"):
+        yield from iter_lines(str(source), chunk_size)
+    else:
+        yield from source
+
+
+def iter_chunked_lines(chunks):
+    """
+    Split a stream of text chunks into lines, lines may span chunk boundaries.
+    """
+    rest = ""
+    for chunk in chunks:
+        lines = (rest + chunk).split("\n")
+        rest = lines.pop()
+        yield from lines
+    if rest:
+        yield rest
+
+
+def parse_timestamp(value):
+    """
+    Convert a VTT timestamp such as `01:02:03.456` or `02:03.456` to milliseconds.
+    """
+    hms, _, ms = value.strip().partition(".")
+    parts = hms.split(":")
+    seconds = 0
+    for part in parts:
+        seconds = seconds * 60 + int(part)
+    return seconds * 1000 + int(ms.ljust(3, "0")[:3] or 0)
+
+
+class VttCleaner:
+    """
+    Stateful single-pass cleaner over the lines of a VTT file.
+    Args:
+        max_overlap (int): The number of trailing emitted words kept to detect rolling-caption overlap.
+        min_overlap (int): The minimum number of words a partial overlap must have to be dropped,
+            a new line that repeats completely is always dropped.
+    Notes:
+        - The pieces returned by `feed` and `feed_lines` are already prefixed with the separator,
+          so "".join of all the pieces is the cleaned script.
+        - `cue_start` and `cue_end` give the timing (in ms) of the cue the last piece came from,
+          the timing line is only parsed when they are read.
+    """
+    def __init__(self, max_overlap=32, min_overlap=2):
+        self.max_overlap = max_overlap
+        self.min_overlap = min_overlap
+        self._tail = []
+        self._in_header = True
+        self._in_block = False
+        self._block_start = True
+        self._started = False
+        self._timing = None
+
+    @property
+    def cue_start(self):
+        return self._parse_timing()[0]
+
+    @property
+    def cue_end(self):
+        return self._parse_timing()[1]
+
+    def _parse_timing(self):
+        if self._timing is None:
+            return None, None
+        start, _, end = self._timing.partition("-->")
+        try:
+            return parse_timestamp(start), parse_timestamp(end.split(None, 1)[0])
+        except (ValueError, IndexError):
+            return None, None
+
+    def feed(self, line):
+        """
+        Process one line of the VTT file.
+        Returns:
+            str: The new text for this line, an empty string if nothing new.
+        """
+        return "".join(self.feed_lines((line,)))
+
+    def feed_lines(self, lines):
+        """
+        Process the lines of a VTT file.
+        Yields:
+            str: The new text of each line that adds something to the script.
+        """
+        for line in lines:
+            line = line.strip()
+            if not line:
+                self._in_block = False
+                self._block_start = True
+                continue
+            if "-->" in line:
+                self._in_header = False
+                self._in_block = False
+                self._block_start = False
+                self._timing = line
+                continue
+            if self._in_block or self._in_header or line.isdigit():
+                # WEBVTT, Kind: and Language: lines before the first cue are skipped too
+                continue
+            if self._block_start and line.startswith(_BLOCK_KEYWORDS):
+                # NOTE, STYLE and REGION blocks run until the next empty line
+                self._in_block = True
+                continue
+
+            if "<" in line:
+                line = _TAG_RE.sub("", line)
+            if "&" in line:
+                line = html.unescape(line)
+            words = line.split()
+            if not words:
+                continue
+            tail = self._tail
+            if tail[-len(words):] == words:
+                # the whole line repeats, the common case for rolling captions
+                continue
+            k = self._overlap(words)
+            if k:
+                words = words[k:]
+            tail.extend(words)
+            if len(tail) > 2 * self.max_overlap:
+                del tail[:-self.max_overlap]
+            yield self._join(words)
+
+    def _overlap(self, words):
+        # the longest suffix of the emitted text that is also a prefix of the new line
+        tail = self._tail
+        first = words[0]
+        n = len(words)
+        # k == n was already checked by the caller
+        for k in range(min(n - 1, len(tail), self.max_overlap), max(self.min_overlap, 1) - 1, -1):
+            if tail[-k] == first and tail[-k:] == words[:k]:
+                return k
+        return 0
+
+    def _join(self, words):
+        text = " ".join(words)
+        if _SPACE_PUNCT_RE.search(text):
+            text = _SPACE_PUNCT_RE.sub("", text)
+        if self._started and text[0] not in _PUNCT:
+            text = " " + text
+        self._started = True
+        return text
+
+
+def iter_clean_vtt(source, max_overlap=32, min_overlap=2):
+    """
+    Generator version of `clean_vtt_to_script`.
+    Args:
+        source: A file path, an open text file, a VTT string or an iterable of lines.
+    Yields:
+        str: Pieces of the cleaned script, "".join of them is the whole script.
+    """
+    cleaner = VttCleaner(max_overlap=max_overlap, min_overlap=min_overlap)
+    yield from cleaner.feed_lines(iter_lines(source))
+
+
+def clean_vtt(source, **kwargs):
+    """
+    Clean a VTT source to a script string in one pass.
+    """
+    return "".join(iter_clean_vtt(source, **kwargs))
+
+
+def clean_vtt_file(vtt_file, output_file, **kwargs):
+    """
+    Clean a VTT file and stream the script to `output_file`.
+    Returns:
+        int: The number of characters written.
+    """
+    written = 0
+    with open(output_file, "w", encoding="utf-8") as f:
+        for piece in iter_clean_vtt(vtt_file, **kwargs):
+            f.write(piece)
+            written += len(piece)
+    return written
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+A local fake OpenAI-compatible HTTP server for the tests.
+It answers POST /v1/chat/completions with whatever the `responder` returns.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def completion_payload(content, model="gpt-4.1-mini", prompt_tokens=100, completion_tokens=20):
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt_tokens + completion_tokens},
+    }
+
+
+def stream_payload(content, pieces=5, model="gpt-4.1-mini", prompt_tokens=100, completion_tokens=20):
+    """
+    Build the server-sent events of a streamed completion, `content` cut into `pieces` deltas.
+    """
+    size = max(1, -(-len(content) // pieces))
+    events = []
+    for i in range(0, len(content), size):
+        events.append({"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                       "model": model, "choices": [{"index": 0, "delta": {"content": content[i:i + size]},
+                                                    "finish_reason": None}]})
+    events.append({"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                   "model": model, "choices": [],
+                   "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                             "total_tokens": prompt_tokens + completion_tokens}})
+    return "".join(f"data: {json.dumps(e)}\n\n" for e in events) + "data: [DONE]\n\n"
+
+
+class FakeOpenAIServer:
+    """
+    Run the fake server in a background thread.
+    Args:
+        responder (callable): Called with the parsed request body, returns (status, payload, headers).
+            A dict payload is sent as JSON, a str payload is sent as is.
+        delay (float): Seconds to wait before answering, to observe concurrency.
+    """
+    def __init__(self, responder, delay=0.0):
+        self.responder = responder
+        self.delay = delay
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                with server._lock:
+                    server.requests.append(body)
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                try:
+                    if server.delay:
+                        time.sleep(server.delay)
+                    status, payload, headers = server.responder(body)
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+                if isinstance(payload, (dict, list)):
+                    data = json.dumps(payload).encode("utf-8")
+                    content_type = "application/json"
+                else:
+                    data = payload.encode("utf-8")
+                    content_type = (headers or {}).pop("Content-Type", "text/plain")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,188 @@
+# create a unit test
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from yt_dlp.utils import DownloadError
+
+from service.manifest import VideoManifest
+from service.metadata import MetadataCache, MetadataFetcher
+from service.downloader import TranscriptDownloader, STATUS_OK, STATUS_MISSING, STATUS_ERROR
+from service.ratelimit import RateLimiter, HostRateLimiter
+
+
+VTT = """WEBVTT
+
+00:00:00.000 --> 00:00:02.000
+hello world
+
+00:00:02.000 --> 00:00:04.000
+tesla is a buy
+"""
+
+
+class FakeYoutubeDL:
+    """
+    Stand-in for yt_dlp.YoutubeDL, writes a subtitle file and fires the progress hooks.
+    """
+    instances = []
+    lock = threading.Lock()
+
+    def __init__(self, params):
+        self.params = params
+        with FakeYoutubeDL.lock:
+            FakeYoutubeDL.instances.append(self)
+
+    def extract_info(self, url, download=False):
+        video_id = url.split("v=")[-1]
+        if video_id == "broken":
+            raise DownloadError("ERROR: Private video")
+        info = {"id": video_id, "upload_date": "20250601", "requested_subtitles": {}}
+        if video_id == "nosubs":
+            return info
+        time.sleep(0.01)
+        base = self.params["outtmpl"].replace("%(upload_date)s", info["upload_date"]).replace("%(id)s", video_id)
+        filename = f"{base}.en.vtt"
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write(VTT)
+        for hook in self.params["progress_hooks"]:
+            hook({"status": "finished", "filename": filename})
+        return info
+
+
+class TestDownloader(unittest.TestCase):
+    def setUp(self):
+        FakeYoutubeDL.instances = []
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_download_all_reports_per_video(self):
+        downloader = TranscriptDownloader(output_dir=self.tmp.name, max_workers=3,
+                                          requests_per_second=1000, ydl_class=FakeYoutubeDL)
+        videos = [{"id": "a1"}, {"id": "broken"}, {"id": "nosubs"}, {"id": "b2"}]
+        seen = []
+        results = downloader.download_all(videos, on_result=seen.append)
+
+        self.assertEqual([r["video_id"] for r in results], ["a1", "broken", "nosubs", "b2"])
+        self.assertEqual([r["status"] for r in results], [STATUS_OK, STATUS_ERROR, STATUS_MISSING, STATUS_OK])
+        self.assertEqual(len(seen), 4)
+        self.assertIn("Private video", results[1]["error"])
+        clean_file = os.path.join(self.tmp.name, "cleaned", "20250601_a1.txt")
+        self.assertEqual(results[0]["clean_file"], clean_file)
+        with open(clean_file, "r", encoding="utf-8") as f:
+            self.assertIn("tesla is a buy", f.read())
+        # one YoutubeDL per worker thread, not one per video
+        self.assertLessEqual(len(FakeYoutubeDL.instances), 3)
+
+    def test_rate_limiter(self):
+        limiter = RateLimiter(rate=20, per=1.0, burst=1)
+        start = time.monotonic()
+        for _ in range(5):
+            limiter.acquire()
+        elapsed = time.monotonic() - start
+        self.assertGreaterEqual(elapsed, 0.15)
+
+        hosts = HostRateLimiter(rate=1)
+        self.assertIs(hosts.limiter_for("https://www.youtube.com/watch?v=1"),
+                      hosts.limiter_for("https://www.youtube.com/watch?v=2"))
+        self.assertIsNot(hosts.limiter_for("https://www.youtube.com/"),
+                         hosts.limiter_for("https://query1.finance.yahoo.com/"))
+
+
+class FakeMetadataYoutubeDL:
+    calls = []
+
+    def __init__(self, params):
+        self.params = params
+
+    def extract_info(self, url, download=False):
+        video_id = url.split("v=")[-1]
+        FakeMetadataYoutubeDL.calls.append(video_id)
+        if video_id == "gone":
+            raise DownloadError("ERROR: Video unavailable")
+        return {"id": video_id, "title": f"title {video_id}", "upload_date": "20250601",
+                "view_count": 100, "webpage_url": url}
+
+
+class TestMetadata(unittest.TestCase):
+    def setUp(self):
+        FakeMetadataYoutubeDL.calls = []
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.tmp.name, "cache", "meta.json")
+        self.csv_path = os.path.join(self.tmp.name, "video_metadata.csv")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_fetch_all_uses_cache(self):
+        videos = [{"id": "v1", "view_count": 5}, {"id": "gone"}, {"id": "v2", "view_count": 7}]
+        fetcher = MetadataFetcher(cache=MetadataCache(self.cache_path), max_workers=2,
+                                  requests_per_second=1000, ydl_class=FakeMetadataYoutubeDL)
+        results = fetcher.fetch_all(videos, output_csv=self.csv_path)
+        self.assertEqual(results[0]["title"], "title v1")
+        self.assertIsNone(results[1])
+        self.assertEqual(fetcher.stats["fetched"], 2)
+        self.assertEqual(fetcher.stats["failed"], 1)
+        with open(self.csv_path, "r", encoding="utf-8-sig") as f:
+            self.assertEqual(len(f.read().strip().splitlines()), 3)
+
+        # a second run only fetches the new and the failed videos
+        FakeMetadataYoutubeDL.calls = []
+        videos.append({"id": "v3"})
+        fetcher = MetadataFetcher(cache=MetadataCache(self.cache_path), max_workers=2,
+                                  requests_per_second=1000, ydl_class=FakeMetadataYoutubeDL)
+        fetcher.fetch_all(videos, output_csv=self.csv_path)
+        self.assertEqual(sorted(FakeMetadataYoutubeDL.calls), ["gone", "v3"])
+        self.assertEqual(fetcher.stats["cached"], 2)
+
+    def test_stale_view_count_refreshed_from_listing(self):
+        cache = MetadataCache(self.cache_path, ttl=60)
+        cache.put("v1", {"title": "t", "view_count": 1}, fetched_at=0)
+        cache.put("v2", {"title": "t", "view_count": 1}, fetched_at=0)
+        fetcher = MetadataFetcher(cache=cache, requests_per_second=1000, ydl_class=FakeMetadataYoutubeDL)
+        results = fetcher.fetch_all([{"id": "v1", "view_count": 42}, {"id": "v2", "view_count": float("nan")}])
+        self.assertEqual(results[0]["view_count"], 42)
+        self.assertEqual(results[1]["view_count"], 100)
+        self.assertEqual(FakeMetadataYoutubeDL.calls, ["v2"])
+        self.assertEqual(fetcher.stats["refreshed"], 1)
+
+
+class TestManifest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "manifest.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_stages_and_persistence(self):
+        manifest = VideoManifest(self.path)
+        self.assertEqual(manifest.add_listed([{"id": "old1"}, {"id": "old2"}]), ["old1", "old2"])
+        manifest.advance("old1", "cleaned", upload_date="20250101")
+        manifest.advance("old2", "metadata")
+        manifest.save()
+
+        manifest = VideoManifest(self.path)
+        self.assertEqual(manifest.add_listed([{"id": "new1"}, {"id": "old1"}]), ["new1"])
+        self.assertEqual(manifest.behind("metadata"), ["new1"])
+        self.assertEqual(manifest.behind("cleaned"), ["new1", "old2"])
+        self.assertEqual(manifest.get("old1")["upload_date"], "20250101")
+
+        # a stage never moves backwards unless reset
+        manifest.advance("old1", "metadata")
+        self.assertEqual(manifest.get("old1")["stage"], "cleaned")
+        manifest.fail("new1", "metadata", "Video unavailable")
+        self.assertEqual(manifest.get("new1")["error"]["stage"], "metadata")
+        manifest.reset("old1", "transcript")
+        self.assertEqual(manifest.get("old1")["stage"], "metadata")
+        self.assertEqual(manifest.summary()["metadata"], 2)
+        with self.assertRaises(ValueError):
+            manifest.behind("downloaded")
+
+
+if __name__ == "__main__":
+    unittest.main()
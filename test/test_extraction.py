@@ -0,0 +1,552 @@
+# create a unit test
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+os.environ["LLM_METRICS_PATH"] = ""  # the tests that check the metrics use their own store
+
+from openai import AsyncOpenAI, OpenAI
+
+import extracter
+from extracter import build_request, parse_extraction
+from fake_openai import FakeOpenAIServer, completion_payload, stream_payload
+from service import llm_cache
+from service.batch import read_requests, split_custom_id
+from service.checkpoint import ExtractionCheckpoint
+from service.chunking import extract_chunked, merge_mentions, split_transcript
+from service.extraction import AsyncExtractionEngine, STATUS_OK, STATUS_PARSE_ERROR, STATUS_ERROR
+from service.jsonstream import JsonArrayStreamParser, parse_json_array, validate_mention
+from service.llm import StreamedArray, chat_completion
+from service.prefilter import AhoCorasick, Prefilter, evaluate
+from service.router import CascadeRouter, cascade_report
+from service.metrics import MetricsStore, call_context, percentile, summarize
+from service.llm_cache import LLMCache, cache_key, request_cache_key
+
+
+MENTIONS = [{"stock": "Tesla", "stock_code": "TSLA", "opinion": "positive", "source": "host",
+             "quote": "tesla is a buy"}]
+
+
+class ScriptedResponder:
+    """
+    Answer according to the marker found in the transcript.
+    """
+    def __init__(self):
+        self.rate_limited = set()
+
+    def __call__(self, body):
+        prompt = body["messages"][-1]["content"]
+        if "SERVER_ERROR" in prompt:
+            return 500, {"error": {"message": "boom", "type": "server_error"}}, {}
+        if "RATE_LIMIT_ONCE" in prompt and prompt not in self.rate_limited:
+            self.rate_limited.add(prompt)
+            return 429, {"error": {"message": "slow down", "type": "rate_limit"}}, {"retry-after": "0"}
+        if "BAD_JSON" in prompt:
+            return 200, completion_payload("Sure! Here are the stocks: Tesla (TSLA)"), {}
+        return 200, completion_payload("```json\n" + json.dumps(MENTIONS) + "\n```", model=body["model"]), {}
+
+
+class TestAsyncExtraction(unittest.TestCase):
+    def run_engine(self, items, server, **kwargs):
+        client = AsyncOpenAI(api_key="test-key", base_url=server.base_url, max_retries=0)
+        engine = AsyncExtractionEngine(client, build_request=lambda t: build_request(t, "gpt-4.1-mini"),
+                                       parse=parse_extraction, base_delay=0.01, **kwargs)
+        return asyncio.run(engine.run(items))
+
+    def test_errors_are_isolated(self):
+        items = [("ok1", "tesla is a buy"), ("rl", "RATE_LIMIT_ONCE tesla"), ("bad", "BAD_JSON"),
+                 ("down", "SERVER_ERROR"), ("ok2", "tesla again")]
+        with FakeOpenAIServer(ScriptedResponder()) as server:
+            results, stats = self.run_engine(items, server, concurrency=3, max_retries=2)
+        by_key = {r["key"]: r for r in results}
+        self.assertEqual([r["key"] for r in results], [k for k, _ in items])
+        self.assertEqual(by_key["ok1"]["output"], MENTIONS)
+        self.assertEqual(by_key["rl"]["status"], STATUS_OK)
+        self.assertEqual(by_key["rl"]["retries"], 1)
+        self.assertEqual(by_key["bad"]["status"], STATUS_PARSE_ERROR)
+        self.assertIn("Tesla (TSLA)", by_key["bad"]["raw"])
+        self.assertEqual(by_key["down"]["status"], STATUS_ERROR)
+        self.assertEqual(by_key["down"]["retries"], 2)
+        self.assertEqual(stats[STATUS_OK], 3)
+        self.assertEqual(stats["prompt_tokens"], 400)
+        self.assertGreater(stats["transcripts_per_minute"], 0)
+
+    def test_concurrency_and_request_budget(self):
+        items = [(f"v{i}", f"transcript {i}") for i in range(8)]
+        with FakeOpenAIServer(ScriptedResponder(), delay=0.05) as server:
+            results, stats = self.run_engine(items, server, concurrency=4)
+        self.assertEqual(stats[STATUS_OK], 8)
+        self.assertLessEqual(server.max_in_flight, 4)
+        self.assertGreater(server.max_in_flight, 1)
+
+        # 600 requests per minute with a burst of 600 would not wait, a small burst does
+        with FakeOpenAIServer(ScriptedResponder()) as server:
+            client = AsyncOpenAI(api_key="test-key", base_url=server.base_url, max_retries=0)
+            engine = AsyncExtractionEngine(client, build_request=lambda t: build_request(t, "gpt-4o-mini"),
+                                           concurrency=8, requests_per_minute=600)
+            engine.request_limiter.capacity = 1
+            engine.request_limiter._tokens = 1
+            results, stats = asyncio.run(engine.run(items[:4]))
+        self.assertGreaterEqual(stats["elapsed_s"], 0.25)
+        self.assertEqual(server.requests[0]["temperature"], 0.2)
+
+
+class TestLLMCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "llm_cache.sqlite")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_key_and_eviction(self):
+        request = build_request("tesla is a buy", "gpt-4.1-mini")
+        self.assertEqual(request_cache_key(request),
+                         cache_key("gpt-4.1-mini", request["messages"][0]["content"],
+                                   request["messages"][1]["content"], 0.2))
+        self.assertNotEqual(request_cache_key(request), request_cache_key(build_request("tesla is a buy", "o4-mini")))
+
+        cache = LLMCache(self.path, max_bytes=25)
+        cache.put("a", "m", "x" * 10)
+        cache.put("b", "m", "y" * 10)
+        self.assertEqual(cache.get("a")["content"], "x" * 10)  # "a" is now the most recently used
+        cache.put("c", "m", "z" * 10)
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["entries"], stats["bytes"]), (2, 1, 2, 20))
+        cache.close()
+        # the entries survive a restart
+        self.assertIsNotNone(LLMCache(self.path).get("c"))
+
+    def test_sync_and_async_calls_go_through_cache(self):
+        cache = LLMCache(self.path)
+        items = [("v1", "tesla is a buy"), ("v2", "BAD_JSON")]
+        with FakeOpenAIServer(ScriptedResponder()) as server:
+            client = AsyncOpenAI(api_key="test-key", base_url=server.base_url, max_retries=0)
+            engine = AsyncExtractionEngine(client, build_request=lambda t: build_request(t, "gpt-4.1-mini"),
+                                           parse=parse_extraction, cache=cache)
+            asyncio.run(engine.run(items))
+            self.assertEqual(len(server.requests), 2)
+            results, stats = asyncio.run(engine.run(items))
+            # the well formed answer is served from the cache, the malformed one is asked again
+            self.assertEqual(len(server.requests), 3)
+            self.assertEqual(stats["cache_hits"], 1)
+            self.assertEqual(results[0]["output"], MENTIONS)
+
+            sync_client = OpenAI(api_key="test-key", base_url=server.base_url, max_retries=0)
+            request = build_request("tesla is a buy", "gpt-4.1-mini")
+            self.assertEqual(parse_extraction(chat_completion(sync_client, request, cache=cache)), MENTIONS)
+            self.assertEqual(len(server.requests), 3)
+            request = build_request("tesla once more", "gpt-4.1-mini")
+            chat_completion(sync_client, request, cache=cache)
+            chat_completion(sync_client, request, cache=cache)
+            self.assertEqual(len(server.requests), 4)
+
+            # with a validator, the sync path does not cache a malformed answer either
+            request = build_request("BAD_JSON again", "gpt-4.1-mini")
+            for _ in range(2):
+                self.assertIn("Tesla (TSLA)", chat_completion(sync_client, request, cache=cache,
+                                                              validate=parse_extraction))
+            self.assertEqual(len(server.requests), 6)
+            request = build_request("tesla validated", "gpt-4.1-mini")
+            for _ in range(2):
+                chat_completion(sync_client, request, cache=cache, validate=parse_extraction)
+            self.assertEqual(len(server.requests), 7)
+            cache.close()
+
+
+class TestChunking(unittest.TestCase):
+    def test_windows_overlap_and_cover_text(self):
+        text = " ".join(f"Sentence number {i} talks about stocks." for i in range(400))
+        windows = split_transcript(text, max_tokens=300, overlap_tokens=40)
+        self.assertGreater(len(windows), 3)
+        self.assertEqual(windows[0]["char_start"], 0)
+        self.assertEqual(windows[-1]["char_end"], len(text))
+        for prev, cur in zip(windows, windows[1:]):
+            self.assertLess(cur["char_start"], prev["char_end"])   # consecutive windows overlap
+            self.assertGreater(cur["char_start"], prev["char_start"])
+        self.assertTrue(all(len(w["text"]) <= 300 * 4 + 1 for w in windows))
+        self.assertEqual(len(split_transcript("short text")), 1)
+
+    def test_merge_keeps_strongest_quote(self):
+        results = [
+            (1, [{"stock": "Tesla, Inc.", "stock_code": "TSLA", "opinion": "positive", "source": "host",
+                  "quote": "tesla is my top pick"},
+                 {"stock": "Apple", "stock_code": "AAPL", "opinion": "neutral", "source": "guest", "quote": "apple"}]),
+            (0, [{"stock": "Tesla", "stock_code": "N/A", "opinion": "neutral", "source": "guest", "quote": "tesla"},
+                 {"stock": "Nvidia", "stock_code": "nvda", "opinion": "positive", "source": "guest", "quote": "nvda"}]),
+            (2, [{"stock": "NVIDIA Corp", "stock_code": "NVDA", "opinion": "positive", "source": "host",
+                  "quote": "I keep buying nvidia"}]),
+        ]
+        merged = merge_mentions(results)
+        self.assertEqual(merged, merge_mentions(list(reversed(results))))  # deterministic
+        self.assertEqual([m["stock_code"] for m in merged], ["TSLA", "NVDA", "AAPL"])
+        tesla, nvidia = merged[0], merged[1]
+        self.assertEqual((tesla["quote"], tesla["chunk"], tesla["chunks"]), ("tesla is my top pick", 1, [0, 1]))
+        self.assertEqual((nvidia["quote"], nvidia["chunk"], nvidia["chunks"]), ("I keep buying nvidia", 2, [0, 2]))
+
+    def test_failed_window_does_not_lose_others(self):
+        windows = [{"index": i, "text": f"window {i}", "start_ms": i * 1000} for i in range(3)]
+
+        def extract_window(text):
+            if text == "window 1":
+                raise ValueError("bad json")
+            return [dict(MENTIONS[0], quote=text)]
+
+        mentions, errors = extract_chunked(windows, extract_window, max_workers=3)
+        self.assertEqual(list(errors), [1])
+        self.assertEqual(len(mentions), 1)
+        self.assertEqual((mentions[0]["chunks"], mentions[0]["chunk_start_ms"]), ([0, 2], 0))
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        os.makedirs("output/cleaned")
+        for video_id in ("20250101_ok", "20250102_bad", "20250103_down", "20250104_lost"):
+            with open(f"output/cleaned/{video_id}.txt", "w", encoding="utf-8") as f:
+                f.write(f"transcript of {video_id}")
+        self.old_cache = os.environ.get("LLM_CACHE_PATH")
+        os.environ["LLM_CACHE_PATH"] = os.path.join(self.tmp.name, "llm_cache.sqlite")
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        # close the temporary cache and forget it, before the env points back at the default path
+        extracter.get_default_cache().close()
+        llm_cache._default_cache = None
+        if self.old_cache is None:
+            os.environ.pop("LLM_CACHE_PATH", None)
+        else:
+            os.environ["LLM_CACHE_PATH"] = self.old_cache
+        self.tmp.cleanup()
+
+    def fabricate_results(self, request_file, path):
+        answers = {"20250101_ok": completion_payload(json.dumps(MENTIONS)),
+                   "20250102_bad": completion_payload("not json")}
+        with open(path, "w", encoding="utf-8") as f:
+            for custom_id in read_requests(request_file):
+                video_id, _ = split_custom_id(custom_id)
+                if video_id in answers:
+                    response = {"status_code": 200, "body": answers[video_id]}
+                elif video_id == "20250103_down":
+                    response = {"status_code": 500, "body": {"error": {"message": "boom"}}}
+                else:
+                    continue  # the batch expired before this request ran
+                f.write(json.dumps({"id": "r", "custom_id": custom_id, "response": response, "error": None}) + "\n")
+
+    def test_write_ingest_and_resubmit(self):
+        request_file = extracter.write_batch("gpt-4.1-mini")
+        requests = read_requests(request_file)
+        self.assertEqual(len(requests), 4)
+        line = requests["20250101_ok|gpt-4.1-mini"]
+        self.assertEqual((line["method"], line["url"]), ("POST", "/v1/chat/completions"))
+        self.assertEqual(line["body"], build_request("transcript of 20250101_ok", "gpt-4.1-mini"))
+
+        results_file = os.path.join("output/batch", "results.jsonl")
+        self.fabricate_results(request_file, results_file)
+        succeeded, failed, retry_file = extracter.ingest_batch([results_file], request_file)
+        self.assertEqual(succeeded, ["20250101_ok|gpt-4.1-mini"])
+        self.assertEqual(sorted(split_custom_id(c)[0] for c in failed), ["20250102_bad", "20250103_down", "20250104_lost"])
+        with open("output/extracted/20250101_ok_gpt-4.1-mini.json", encoding="utf-8") as f:
+            self.assertEqual(json.load(f), MENTIONS)
+        self.assertEqual(set(read_requests(retry_file)), set(failed))
+
+        # the ingested answer is served from the cache by the synchronous path
+        self.assertEqual(parse_extraction(extracter.extract_stocks_from_transcript("transcript of 20250101_ok")), MENTIONS)
+
+
+class TestPrefilter(unittest.TestCase):
+    def test_automaton_matches_whole_words(self):
+        automaton = AhoCorasick(["he", "she", "hers", "tesla", "nvidia corp"])
+        text = "She said hers is Tesla, Nvidia Corp. and teslas or ushers"
+        found = [(text[s:e], automaton.patterns[i]) for s, e, i in automaton.finditer(text)]
+        self.assertEqual(found, [("She", "she"), ("hers", "hers"), ("Tesla", "tesla"),
+                                 ("Nvidia Corp", "nvidia corp")])
+
+    def test_filter_windows_skip_and_report(self):
+        prefilter = Prefilter({"tesla": ("company", "TSLA"), "nvda": ("ticker", "NVDA")},
+                              cue_phrases=["price target"], context_chars=30)
+        filler = " ".join(["macro talk"] * 200)
+        text = f"{filler} i think tesla is a great bet {filler} my price target for nvda is high {filler}"
+        result = prefilter.filter(text)
+        self.assertFalse(result["skipped"])
+        self.assertEqual(len(result["windows"]), 2)   # the price target and nvda windows merge
+        self.assertEqual(result["candidates"], ["NVDA", "TSLA"])
+        self.assertIn("i think tesla is a great bet", result["text"])
+        self.assertLess(result["filtered_tokens"], result["original_tokens"] / 5)
+        self.assertTrue(prefilter.filter(filler)["skipped"])
+
+        samples = [("v1", text, [{"stock": "Tesla", "stock_code": "TSLA", "quote": "tesla is a great bet"},
+                                 {"stock": "Apple", "stock_code": "AAPL", "quote": "apple is fine"}]),
+                   ("v2", filler, [])]
+        report = evaluate(prefilter, samples)
+        self.assertEqual((report["skipped"], report["mentions"], report["recalled"]), (1, 2, 1))
+        self.assertEqual(report["recall"], 0.5)
+        self.assertEqual(report["missed"], [("v1", "Apple", "AAPL")])
+        self.assertGreater(report["token_reduction"], 0.9)
+
+
+class TestStreamingParse(unittest.TestCase):
+    ANSWER = ('Here you go:\n```json\n[{"stock": "Tesla", "stock_code": "TSLA", "opinion": "Positive", '
+              '"source": "host", "quote": "a [b] {c} \\" d"},\n {"stock": "Apple", "opinion": "neutral", '
+              '"quote": "ok",},\n {"stock": "Nvidia", "opinion": "bullish"},\n'
+              ' {"stock": "AMD", "stock_code": "AMD", "opinion": "negative", "source": "host", "quote": "I would not bu')
+
+    def test_incremental_parse_and_salvage(self):
+        parser = JsonArrayStreamParser(validate_mention)
+        seen = []
+        for i in range(0, len(self.ANSWER), 7):
+            seen.append(parser.feed(self.ANSWER[i:i + 7]))
+        self.assertEqual(sum(seen, [])[0]["quote"], 'a [b] {c} " d')
+        self.assertEqual(sum(seen, [])[0]["opinion"], "positive")
+        items = sum(seen, []) + parser.close()
+        self.assertEqual([m["stock"] for m in items], ["Tesla", "Apple", "AMD"])
+        self.assertEqual(items[1]["stock_code"], "N/A")                # trailing comma repaired
+        self.assertEqual(items[2]["quote"], "I would not bu")          # truncated tail salvaged
+        self.assertEqual((len(parser.errors), parser.salvaged), (1, 2))  # "bullish" is rejected
+        self.assertEqual(parse_json_array('{"mentions": [{"stock": "A", "opinion": "neutral"}]}',
+                                          validate_mention)[0]["stock"], "A")
+        self.assertEqual(parse_json_array("```json\n[]\n```"), [])
+        with self.assertRaises(ValueError):
+            parse_extraction("Sure! Tesla (TSLA)")
+
+    def test_streamed_completion(self):
+        content = json.dumps(MENTIONS * 3)
+        with tempfile.TemporaryDirectory() as tmp, \
+                FakeOpenAIServer(lambda body: (200, stream_payload(content, pieces=9),
+                                               {"Content-Type": "text/event-stream"})) as server:
+            client = OpenAI(api_key="test-key", base_url=server.base_url, max_retries=0)
+            cache = LLMCache(os.path.join(tmp, "llm_cache.sqlite"))
+            request = build_request("tesla is a buy", "gpt-4.1-mini")
+            stream = StreamedArray(client, request, validate=validate_mention, cache=cache)
+            self.assertEqual(list(stream), MENTIONS * 3)
+            self.assertTrue(server.requests[0]["stream"])
+            self.assertEqual((stream.content, stream.usage.prompt_tokens), (content, 100))
+            self.assertIsNotNone(stream.first_item_s)
+            again = StreamedArray(client, request, validate=validate_mention, cache=cache)
+            self.assertEqual(list(again), MENTIONS * 3)
+            self.assertTrue(again.cache_hit)
+            self.assertEqual(len(server.requests), 1)
+            cache.close()
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        os.makedirs("output/cleaned")
+        for video_id in ("20250101_a", "20250102_b", "20250103_c"):
+            self.write_transcript(video_id, f"tesla talk in {video_id}")
+        self.calls = []
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def write_transcript(self, video_id, text):
+        with open(f"output/cleaned/{video_id}.txt", "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def extract(self, transcript, llm_model):
+        if "CRASH" in transcript:
+            raise RuntimeError("network down")
+        self.calls.append(transcript)
+        return json.dumps(MENTIONS)
+
+    def test_resume_and_invalidate(self):
+        self.write_transcript("20250102_b", "CRASH")
+        with self.assertRaises(RuntimeError):
+            extracter.main(self.extract, "gpt-4.1-mini", checkpoint=ExtractionCheckpoint())
+        self.assertEqual(len(self.calls), 1)
+
+        # the rerun resumes after the transcript that was done before the crash
+        self.write_transcript("20250102_b", "tesla talk in 20250102_b")
+        extracter.main(self.extract, "gpt-4.1-mini", checkpoint=ExtractionCheckpoint())
+        self.assertEqual(self.calls[1:], ["tesla talk in 20250102_b", "tesla talk in 20250103_c"])
+        extracter.main(self.extract, "gpt-4.1-mini", checkpoint=ExtractionCheckpoint())
+        self.assertEqual(len(self.calls), 3)
+        with open("output/extracted/20250103_c_gpt-4.1-mini.json", encoding="utf-8") as f:
+            self.assertEqual(json.load(f), MENTIONS)
+
+        # an edited transcript, a new model and a new prompt only redo what they affect
+        self.write_transcript("20250103_c", "tesla talk, re-cleaned")
+        extracter.main(self.extract, "gpt-4.1-mini", checkpoint=ExtractionCheckpoint())
+        self.assertEqual(self.calls[3:], ["tesla talk, re-cleaned"])
+        extracter.main(self.extract, "gpt-4o-mini", checkpoint=ExtractionCheckpoint())
+        self.assertEqual(len(self.calls), 7)
+        old_version = extracter.PROMPT_VERSION
+        try:
+            extracter.PROMPT_VERSION = "edited-prompt"
+            extracter.main(self.extract, "gpt-4.1-mini", checkpoint=ExtractionCheckpoint())
+            self.assertEqual(len(self.calls), 10)
+            checkpoint = ExtractionCheckpoint()
+            self.assertEqual(checkpoint.prune("gpt-4.1-mini", extracter.prompt_version("extract")), 3)
+            self.assertEqual(len(checkpoint), 6)
+        finally:
+            extracter.PROMPT_VERSION = old_version
+
+    def test_failed_chunk_is_not_checkpointed(self):
+        long_text = " ".join(f"Sentence {i} is about tesla." for i in range(300))
+        self.write_transcript("20250101_a", long_text)
+        failing = {"window": None}
+
+        def extract_window(text, llm_model):
+            if failing["window"] is None:
+                failing["window"] = text            # the first window asked fails once
+                raise RuntimeError("network down")
+            return json.dumps(MENTIONS)
+
+        def extract_chunked_video(transcript, llm_model):
+            return extracter.extract_stocks_chunked(transcript, llm_model, max_tokens=200, overlap_tokens=20)
+
+        old_extract = extracter.extract_stocks_from_transcript
+        extracter.extract_stocks_from_transcript = extract_window
+        try:
+            checkpoint = ExtractionCheckpoint()
+            with self.assertRaises(RuntimeError):
+                extracter.main(extract_chunked_video, "gpt-4.1-mini", checkpoint=checkpoint)
+            self.assertEqual(len(checkpoint), 0)
+            extracter.main(extract_chunked_video, "gpt-4.1-mini", checkpoint=checkpoint)
+            self.assertEqual(len(checkpoint), 3)
+        finally:
+            extracter.extract_stocks_from_transcript = old_extract
+
+    def test_empty_checkpoint_is_used(self):
+        # an empty checkpoint has len() 0, it must not be swapped for the default one
+        checkpoint = ExtractionCheckpoint("custom/checkpoint.json")
+        extracter.main(self.extract, "gpt-4.1-mini", checkpoint=checkpoint)
+        self.assertEqual(len(ExtractionCheckpoint("custom/checkpoint.json")), 3)
+        self.assertFalse(os.path.exists("output/extracted/checkpoint.json"))
+
+
+class TestMetrics(unittest.TestCase):
+    def test_calls_are_recorded_and_summarized(self):
+        with tempfile.TemporaryDirectory() as tmp, FakeOpenAIServer(ScriptedResponder(), delay=0.02) as server:
+            metrics = MetricsStore(os.path.join(tmp, "metrics", "llm_calls.jsonl"))
+            cache = LLMCache(os.path.join(tmp, "llm_cache.sqlite"))
+            sync_client = OpenAI(api_key="test-key", base_url=server.base_url, max_retries=0)
+            request = build_request("tesla is a buy", "gpt-4.1-mini")
+            with call_context(key="v1", operation="extract"):
+                chat_completion(sync_client, request, cache=cache, metrics=metrics)
+                chat_completion(sync_client, request, cache=cache, metrics=metrics)
+            # the retries of the client itself are recorded
+            retrying_client = OpenAI(api_key="test-key", base_url=server.base_url, max_retries=1)
+            with call_context(key="v1r", operation="extract"):
+                chat_completion(retrying_client, build_request("RATE_LIMIT_ONCE b", "gpt-4.1-mini"), metrics=metrics)
+
+            client = AsyncOpenAI(api_key="test-key", base_url=server.base_url, max_retries=0)
+            engine = AsyncExtractionEngine(client, build_request=lambda t: build_request(t, "gpt-4o-mini"),
+                                           parse=parse_extraction, base_delay=0.01, max_retries=1, metrics=metrics)
+            asyncio.run(engine.run([("v2", "RATE_LIMIT_ONCE a"), ("v3", "SERVER_ERROR"), ("v4", "tesla")]))
+            entries = metrics.read()
+            cache.close()
+
+        first, hit = entries[:2]
+        self.assertEqual((first["key"], first["operation"], first["cache_hit"]), ("v1", "extract", False))
+        self.assertGreaterEqual(first["wall_s"], 0.02)
+        self.assertEqual((first["prompt_tokens"], first["cost_usd"]), (100, (100 * 0.40 + 20 * 1.60) / 1e6))
+        self.assertEqual((hit["cache_hit"], hit["cost_usd"], hit["prompt_tokens"]), (True, 0.0, 0))
+        by_key = {e["key"]: e for e in entries[2:]}
+        self.assertEqual((by_key["v2"]["retries"], by_key["v3"]["status"]), (1, STATUS_ERROR))
+        self.assertEqual((by_key["v1r"]["retries"], by_key["v1r"]["status"]), (1, "ok"))
+
+        summary = summarize(entries)
+        self.assertEqual(set(summary), {"gpt-4.1-mini", "gpt-4o-mini"})
+        self.assertEqual((summary["gpt-4.1-mini"]["calls"], summary["gpt-4.1-mini"]["cache_hits"]), (3, 1))
+        self.assertEqual(summary["gpt-4.1-mini"]["transcripts"], 2)
+        self.assertEqual(summary["gpt-4o-mini"]["errors"], 1)
+        self.assertEqual(summary["gpt-4o-mini"]["tokens_per_transcript_p95"], 120)
+        self.assertEqual(percentile([1, 2, 3, 4, 5], 50), 3)
+        self.assertAlmostEqual(percentile([1, 2, 3, 4, 5], 95), 4.8)
+
+    def test_chunk_calls_keep_the_transcript_key(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            metrics = MetricsStore(os.path.join(tmp, "llm_calls.jsonl"))
+            windows = [{"index": i, "text": f"window {i}"} for i in range(4)]
+
+            def extract_window(text):
+                metrics.record("gpt-4.1-mini", 0.1, 0.1, 1000, 100)
+                return []
+
+            with call_context(key="long_video"):
+                extract_chunked(windows, extract_window, max_workers=4)
+            summary = summarize(metrics.read())["gpt-4.1-mini"]
+        self.assertEqual((summary["calls"], summary["transcripts"]), (4, 1))
+        self.assertEqual(summary["tokens_per_transcript_p50"], 4400)
+
+
+class TestCascade(unittest.TestCase):
+    def test_escalation_and_report(self):
+        answers = {
+            "good": json.dumps(MENTIONS),
+            "prose": "Tesla looks good to me",
+            "no_ticker": json.dumps([dict(MENTIONS[0], stock_code="N/A"), dict(MENTIONS[0], stock="Rivian", stock_code="")]),
+            "missed": json.dumps(MENTIONS),
+        }
+        calls = []
+
+        def extract(transcript, model):
+            calls.append((transcript, model))
+            return json.dumps(MENTIONS) if model == "gpt-4.1-mini" else answers[transcript]
+
+        class StubPrefilter:
+            def filter(self, text, model="gpt-4.1-mini"):
+                return {"candidates": ["NVDA", "PLTR", "TSLA"] if text == "missed" else []}
+
+        router = CascadeRouter(extract, build_request, models=["gpt-4o-mini", "gpt-4.1-mini"], prefilter=StubPrefilter())
+        results = [router.route(key, key) for key in answers]
+
+        by_key = {r["key"]: r for r in results}
+        self.assertFalse(by_key["good"]["escalated"])
+        self.assertEqual(by_key["prose"]["attempts"][0]["issues"], ["invalid_json"])
+        self.assertEqual(by_key["no_ticker"]["attempts"][0]["issues"], ["missing_tickers"])
+        self.assertEqual(by_key["missed"]["attempts"][0]["issues"], ["missed_candidates"])
+        self.assertEqual(by_key["missed"]["issues"], ["missed_candidates"])  # the strong model misses them too
+        self.assertEqual(by_key["prose"]["model"], "gpt-4.1-mini")
+        self.assertEqual(by_key["prose"]["mentions"], MENTIONS)
+
+        report = cascade_report(results, "gpt-4.1-mini")
+        self.assertEqual((report["transcripts"], report["escalated"], report["escalation_rate"]), (4, 3, 0.75))
+        self.assertEqual(report["reasons"], {"invalid_json": 1, "missing_tickers": 1, "missed_candidates": 1})
+        self.assertGreater(report["strong_avg_cost_usd"], 0)
+        self.assertIsNotNone(report["strong_avg_latency_s"])
+
+    def test_failed_escalation_and_cache_hits(self):
+        def extract(transcript, model):
+            if model == "gpt-4.1-mini":
+                raise RuntimeError("strong model down")
+            return json.dumps([dict(MENTIONS[0], stock_code="N/A")])
+
+        router = CascadeRouter(extract, build_request, models=["gpt-4o-mini", "gpt-4.1-mini"])
+        result = router.route("v1", "no ticker")
+        # the strong model failed: the answer of the cheap model is kept with its issues
+        self.assertEqual((result["model"], result["issues"]), ("gpt-4o-mini", ["missing_tickers"]))
+        self.assertEqual(result["mentions"][0]["stock"], "Tesla")
+        self.assertTrue(result["attempts"][1]["issues"][0].startswith("error: RuntimeError"))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = LLMCache(os.path.join(tmp, "llm_cache.sqlite"))
+            request = build_request("tesla is a buy", "gpt-4o-mini")
+            cache.put(request_cache_key(request), "gpt-4o-mini", json.dumps(MENTIONS))
+            router = CascadeRouter(lambda transcript, model: cache.get(request_cache_key(request))["content"],
+                                   build_request, models=["gpt-4o-mini", "gpt-4.1-mini"], cache=cache)
+            result = router.route("v2", "tesla is a buy")
+            self.assertEqual(cache.stats()["hits"], 1)  # the check is not a lookup
+            cache.close()
+        self.assertEqual(result["mentions"], MENTIONS)
+        self.assertTrue(result["attempts"][0]["cache_hit"])
+        self.assertEqual((result["cost_usd"], result["latency_s"]), (0.0, 0.0))
+        report = cascade_report([result], "gpt-4.1-mini")
+        self.assertIsNone(report["strong_avg_latency_s"])
+        self.assertGreater(report["strong_avg_cost_usd"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
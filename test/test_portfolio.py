@@ -0,0 +1,132 @@
+# create a unit test
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from evaluator import evaluate_mentions, main1
+from service.portfolio import PortfolioBacktest, PortfolioRules, summarize
+from service.price_providers import SyntheticMarket, trading_calendar
+from service.prices import PriceStore, close_matrix, forward_fill
+
+
+def make_mentions(tickers, count, start="2023-01-01", end="2024-06-01", seed=0):
+    rng = np.random.default_rng(seed)
+    days = trading_calendar(start, end).strftime("%Y%m%d").astype(int)
+    return pd.DataFrame({
+        "stock_code": rng.choice(tickers, count),
+        "date": rng.choice(days, count),
+        "opinion": rng.choice(["positive", "neutral", "negative"], count, p=[0.6, 0.3, 0.1]),
+        "source": rng.choice(["host", "Quoted", "analyst", np.nan], count),
+        "channel": rng.choice(["a", "b"], count),
+    })
+
+
+class TestPortfolio(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = PriceStore(os.path.join(self.tmp.name, "prices"))
+        self.market = SyntheticMarket(seed=5, nan_run_rate=1.0)
+        self.tickers = self.market.tickers(15)
+        self.mentions = make_mentions(self.tickers, 300)
+        self.matrix = evaluate_mentions(self.mentions, [30], store=self.store, provider=self.market,
+                                        missing_file=os.path.join(self.tmp.name, "none.json"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_close_matrix(self):
+        tickers = self.store.tickers()[:3] + ["NONE"]
+        dates, close = close_matrix(self.store, tickers, "2023-03-01", "2023-04-01")
+        self.assertEqual(close.shape, (len(dates), 4))
+        self.assertTrue(dates[0] >= np.datetime64("2023-03-01") and dates[-1] < np.datetime64("2023-04-01"))
+        self.assertTrue(np.isnan(close[:, 3]).all())
+        frame = self.store.frame(tickers[0])
+        for date, value in zip(dates, close[:, 0]):
+            expected = frame["Close"].get(str(date), np.nan)
+            self.assertTrue(np.isnan(value) if np.isnan(expected) else value == expected)
+        filled = forward_fill(np.array([[np.nan, 1.0], [2.0, np.nan], [np.nan, 3.0]]))
+        np.testing.assert_array_equal(filled, [[np.nan, 1.0], [2.0, 1.0], [2.0, 3.0]])
+
+    def reference_weights(self, backtest, rules):
+        """
+        The weights of the rules, day by day and mention by mention.
+        """
+        mentions = self.mentions.iloc[self.matrix.mention_index].reset_index(drop=True)
+        trades = []
+        for i, row in mentions.iterrows():
+            source = "host" if str(row["source"]).strip().lower() == "host" else "quoted"
+            if str(row["opinion"]).lower() not in rules.opinions or \
+                    (rules.sources is not None and source not in rules.sources):
+                continue
+            entry = self.matrix.entry_dates[i]
+            exit_days = backtest.dates[backtest.dates >= entry + np.timedelta64(rules.holding_days, "D")]
+            score = rules.conviction[source] if rules.weighting == "conviction" else 1.0
+            sign = -1.0 if row["opinion"] == "negative" else 1.0
+            trades.append((self.matrix.tickers[i], entry, exit_days[0] if len(exit_days) else None, sign * score))
+        weights = np.zeros((len(backtest.dates), len(backtest.tickers)))
+        for day_idx, day in enumerate(backtest.dates):
+            held = {}
+            for ticker, entry, exit_day, score in trades:
+                if entry <= day and (exit_day is None or day < exit_day):
+                    held[ticker] = held.get(ticker, 0.0) + score
+            if rules.weighting == "equal":
+                held = {t: np.sign(v) for t, v in held.items()}
+            gross = sum(abs(v) for v in held.values())
+            for ticker, value in held.items():
+                if gross:
+                    weights[day_idx, list(backtest.tickers).index(ticker)] = value / gross
+        return weights
+
+    def test_positions_and_nav(self):
+        backtest = PortfolioBacktest(self.mentions, self.matrix, self.store)
+        for rules in (PortfolioRules(holding_days=30),
+                      PortfolioRules(opinions=("positive", "negative"), sources=None, holding_days=10,
+                                     weighting="conviction")):
+            weights = backtest.positions(rules)
+            np.testing.assert_allclose(weights, self.reference_weights(backtest, rules), atol=1e-12)
+
+        rules = PortfolioRules(sources=None, holding_days=20, cost_bps=10)
+        result = backtest.run(rules)
+        daily = result["daily"]
+        weights = result["weights"]
+        # one day at a time: yesterday's weights earn today's close to close returns
+        _, close = close_matrix(self.store, backtest.tickers.tolist(), str(backtest.dates[0]))
+        close = pd.DataFrame(close).ffill().to_numpy()
+        nav = peak = 1 - np.abs(weights[0]).sum() * 0.001
+        for day_idx in range(1, len(backtest.dates)):
+            day_return = 0.0
+            for col in np.flatnonzero(weights[day_idx - 1]):
+                day_return += weights[day_idx - 1, col] * (close[day_idx, col] / close[day_idx - 1, col] - 1)
+            turnover = np.abs(weights[day_idx] - weights[day_idx - 1]).sum()
+            nav *= 1 + day_return - turnover * 0.001
+            peak = max(peak, nav)
+            self.assertAlmostEqual(daily["nav"].iloc[day_idx], nav, places=9)
+            self.assertAlmostEqual(daily["drawdown"].iloc[day_idx], nav / peak - 1, places=9)
+        self.assertTrue(np.allclose(np.abs(weights).sum(axis=1)[daily["exposure"] > 0], 1.0))
+        self.assertEqual(result["trades"], int(backtest.select(rules).sum()))
+
+        summary = summarize(result)
+        self.assertAlmostEqual(summary["total_return"], nav - 1, places=9)
+        self.assertLessEqual(summary["max_drawdown"], 0)
+        compared = backtest.compare([rules, PortfolioRules(channels=("a",))])
+        self.assertEqual(list(compared.index), [rules.name, "positive/host/30d/equal"])
+        self.assertLess(compared["trades"].iloc[1], compared["trades"].iloc[0])
+        with self.assertRaises(ValueError):
+            PortfolioRules(weighting="kelly")
+
+    def test_main1_records(self):
+        records = main1(self.mentions, [30], store=self.store, missing_file=os.path.join(self.tmp.name, "none.json"))
+        rules = PortfolioRules(sources=None, holding_days=20)
+        expected = PortfolioBacktest(self.mentions, self.matrix, self.store).positions(rules)
+        # the records have no mention index: the kept mentions are matched one for one
+        kept = self.mentions.iloc[self.matrix.mention_index]
+        np.testing.assert_array_equal(PortfolioBacktest(kept, records, self.store).positions(rules), expected)
+        with self.assertRaises(ValueError):
+            PortfolioBacktest(self.mentions.iloc[:10], records, self.store)
+
+
+if __name__ == "__main__":
+    unittest.main()
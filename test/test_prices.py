@@ -0,0 +1,454 @@
+# create a unit test
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from evaluator import evaluate_mentions, get_return_by_sticker, get_stock_info, get_stock_info_by_ticker, main1, main2
+from service.price_downloader import (STATUS_CACHED, STATUS_INCOMPLETE, STATUS_MISSING, STATUS_OK, STATUS_SKIPPED,
+                                      MissingTickerRegistry, PriceDownloader)
+from service.price_providers import LocalFileProvider, SyntheticMarket, trading_calendar
+from service.prices import PriceStore, merge_ranges, migrate_group_csv, missing_ranges, ticker_filename
+from service.returns import ReturnMatrix
+from service.tradingdays import TradingDayLookup, next_trading_days, to_days
+
+
+def make_group_frame(tickers, start="2024-04-08", days=30, seed=0):
+    """
+    A yfinance multi-ticker download: (Price, Ticker) columns and one row per business day.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start, periods=days)
+    columns = pd.MultiIndex.from_product([["Close", "High", "Low", "Open", "Volume"], tickers],
+                                         names=["Price", "Ticker"])
+    values = rng.uniform(10, 100, size=(days, len(columns))).round(2)
+    df = pd.DataFrame(values, index=pd.Index(dates, name="Date"), columns=columns)
+    return df
+
+
+class TestPriceStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = PriceStore(os.path.join(self.tmp.name, "prices"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_write_load_and_catalog(self):
+        df = make_group_frame(["AAPL", "BRK-B"]).xs("AAPL", level=1, axis=1)
+        # unsorted, a repeated date and a row without close
+        messy = pd.concat([df.iloc[5:], df.iloc[:5], df.iloc[[3]]])
+        messy.iloc[0, messy.columns.get_loc("Close")] = np.nan
+        self.assertEqual(self.store.write("AAPL", messy), 29)
+
+        records = self.store.load("AAPL")
+        self.assertIsInstance(records, np.memmap)
+        self.assertTrue((np.diff(records["date"].astype("int64")) > 0).all())
+        self.assertEqual(records["close"][0], df["Close"].iloc[0])
+        self.assertIsNone(self.store.load("MSFT"))
+        self.assertEqual(ticker_filename("^GSPC"), "IDX_GSPC.npy")
+
+        reopened = PriceStore(self.store.root)
+        self.assertEqual(reopened.catalog["AAPL"]["rows"], 29)
+        self.assertEqual(reopened.catalog["AAPL"]["start"], "2024-04-08")
+        frame = reopened.frame("AAPL")
+        self.assertEqual(list(frame.columns), ["Open", "High", "Low", "Close", "Volume"])
+        self.assertIn("2024-04-09", frame.index)
+
+    def test_migrate_group_csv(self):
+        folder = os.path.join(self.tmp.name, "downloaded")
+        os.makedirs(folder)
+        old = make_group_frame(["AAPL", "NVDA"], days=10)
+        new = make_group_frame(["AAPL", "NVDA"], days=20, seed=1)
+        new.loc[:, ("Close", "NVDA")] = np.nan                      # a failed download
+        gone = make_group_frame(["DEAD"], days=5)
+        gone.loc[:, :] = np.nan
+        paths = []
+        for name, df in [("stock_group0_2025_06_08_00_47_58.csv", new), ("stock_group0_2025_06_01_00_00_00.csv", old),
+                         ("stock_group1_2025_06_08_00_47_58.csv", gone)]:
+            paths.append(os.path.join(folder, name))
+            df.to_csv(paths[-1], encoding="utf-8-sig")
+
+        migrated, empty = migrate_group_csv(paths, self.store)
+        self.assertEqual(migrated, ["AAPL", "NVDA"])
+        self.assertEqual(empty, ["DEAD"])
+        self.assertEqual(self.store.catalog["AAPL"]["rows"], 20)    # the newest download wins
+        self.assertEqual(self.store.catalog["NVDA"]["rows"], 10)    # an empty download keeps the older one
+
+        # the evaluator reads the store as it read the group CSV files
+        df_stock_info = get_stock_info_by_ticker("AAPL", store=self.store)
+        expected = new.xs("AAPL", level=1, axis=1)
+        mentioned, price_list, _ = get_return_by_sticker("AAPL", 20240413, df_stock_info, [7])
+        self.assertEqual(mentioned[:2], ("2024-04-15", 2))
+        self.assertEqual(mentioned[2], expected.loc["2024-04-15", "Close"])
+        self.assertEqual(price_list, [float(expected.loc["2024-04-22", "Close"])])
+        self.assertIsNone(get_stock_info_by_ticker("DEAD", store=self.store))
+
+
+class TestTradingDays(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = PriceStore(os.path.join(self.tmp.name, "prices"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_trading_day_lookup_matches_day_walk(self):
+        df = make_group_frame(["AAPL"], days=120).xs("AAPL", level=1, axis=1)
+        df = df.drop(df.index[[10, 11, 40]])                           # holidays
+        self.store.write("AAPL", df)
+        frame = get_stock_info_by_ticker("AAPL", store=self.store)
+        lookup = TradingDayLookup.from_records(self.store.load("AAPL"))
+        mentions = [20240406, 20240408, 20240420, 20240601, 20240915, 20250101, 20240231]
+        ndays_list = [7, 14, 30, 90]
+        result = lookup.lookup(mentions, ndays_list)
+        for idx, date in enumerate(mentions):
+            expected = get_return_by_sticker("AAPL", date, frame, ndays_list)
+            if not expected or not expected[0]:
+                self.assertFalse(result["entry_found"][idx])
+                continue
+            mentioned, price_list, extra_day_list = expected
+            self.assertEqual(str(result["entry_date"][idx]), mentioned[0])
+            self.assertEqual(result["entry_extra_days"][idx], mentioned[1])
+            self.assertEqual(result["entry_price"][idx], mentioned[2])
+            self.assertEqual([None if np.isnan(p) else p for p in result["price"][idx]], price_list)
+            self.assertEqual(result["extra_days"][idx].tolist(), extra_day_list)
+
+        dates = to_days(["2024-01-02", "2024-06-03"])
+        _, extra_days, found = next_trading_days(dates, to_days([20240101, 20240102, 20240103, 20240604]))
+        self.assertEqual(found.tolist(), [True, True, False, False])   # more than 100 days, past the end
+        self.assertEqual(extra_days.tolist(), [1, 0, 0, 0])
+
+
+class TestEvaluator(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = PriceStore(os.path.join(self.tmp.name, "prices"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_main1_groups_by_ticker(self):
+        group = make_group_frame(["AAPL", "NVDA"], days=120)
+        for ticker in ("AAPL", "NVDA"):
+            self.store.write(ticker, group.xs(ticker, level=1, axis=1))
+        missing_file = os.path.join(self.tmp.name, "missing.json")
+        with open(missing_file, "w", encoding="utf-8") as f:
+            json.dump({"0": {"count": 1, "missing_codes": ["GONE"]}}, f)
+        mentions = pd.DataFrame({
+            "stock": ["Apple", "Nvidia", "Apple", "Tesla", "Gone", "Bad", "Short", "Nothing", "Apple", "Nvidia"],
+            "stock_code": [" aapl", "NVDA", "AAPL", "TSLA", "GONE", "BRK B", "NVDA", "N/A", np.nan, "NVDA"],
+            "date": [20240413, 20240502, 20240601, 20240502, 20240502, 20240502, 20240502, 20240502, 20240502,
+                     20250101],
+            "opinion": ["positive", "neutral", np.nan, "positive", "positive", "positive", "Negative", "positive",
+                        "positive", "positive"],
+        }, index=[5, 5, 6, 7, 8, 9, 10, 11, 12, 13])
+        ndays_list = [7, 30, 90]
+        return_info = main1(mentions, ndays_list, store=self.store, missing_file=missing_file)
+
+        # the rows the per-row path keeps, in order: TSLA has no prices, 20250101 no trading day
+        expected = []
+        for ticker, date in [("AAPL", 20240413), ("NVDA", 20240502), ("AAPL", 20240601)]:
+            frame = get_stock_info_by_ticker(ticker, store=self.store)
+            mentioned, price_list, extra_day_list = get_return_by_sticker(ticker, date, frame, ndays_list)
+            expected.append({"ticker": ticker, "date_mentioned": mentioned[0], "extra_days": mentioned[1],
+                             "price_on_mentioned": mentioned[2], "ndays_list": ndays_list,
+                             "price_list": price_list, "extra_day_list": extra_day_list})
+        self.assertEqual(return_info, expected)
+        self.assertEqual(json.loads(json.dumps(return_info)), expected)
+
+
+class TestReturnMatrix(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = PriceStore(os.path.join(self.tmp.name, "prices"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_return_matrix(self):
+        group = make_group_frame(["AAPL", "NVDA"], days=120)
+        for ticker in ("AAPL", "NVDA"):
+            self.store.write(ticker, group.xs(ticker, level=1, axis=1))
+        mentions = pd.DataFrame({
+            "stock_code": ["NVDA", "AAPL", "TSLA", "NVDA", "AAPL"],
+            "date": [20240502, 20240413, 20240502, 20240601, 20240801],
+            "opinion": "positive",
+        })
+        ndays_list = [7, 30, 90]
+        matrix = evaluate_mentions(mentions, ndays_list, store=self.store,
+                                   missing_file=os.path.join(self.tmp.name, "none.json"))
+        self.assertEqual(matrix.mention_index.tolist(), [0, 1, 3, 4])
+        self.assertEqual(matrix.prices.shape, (4, 3))
+        self.assertEqual(np.isnan(matrix.prices[3]).tolist(), [False, False, True])   # past the end of the prices
+
+        records = matrix.to_records()
+        self.assertEqual(ReturnMatrix.from_records(records).to_records(), records)
+        path = os.path.join(self.tmp.name, "return_info.npz")
+        matrix.save(path)
+        loaded = ReturnMatrix.load(path)
+        self.assertEqual(loaded.to_records(), records)
+        np.testing.assert_array_equal(loaded.mention_index, matrix.mention_index)
+
+        # the CSV of the older runs, with the lists as strings, gives the same returns
+        legacy_csv = os.path.join(self.tmp.name, "return_info.csv")
+        pd.DataFrame(records).to_csv(legacy_csv, index=False, encoding="utf-8-sig")
+        legacy = pd.read_csv(legacy_csv, encoding="utf-8-sig")
+        output_file = os.path.join(self.tmp.name, "out", "return_info2.csv")
+        df = main2(legacy, output_file)
+        pd.testing.assert_frame_equal(pd.read_csv(output_file, encoding="utf-8-sig"), df, check_dtype=False)
+        pd.testing.assert_frame_equal(main2(path, output_file), df)
+        self.assertEqual([c for c in df.columns if c.startswith("nday_7")], ["nday_7_price", "nday_7_extra", "nday_7_r"])
+        for info, (_, row) in zip(records, df.iterrows()):
+            for n, p, extra in zip(ndays_list, info["price_list"], info["extra_day_list"]):
+                expected = round((p - info["price_on_mentioned"]) / info["price_on_mentioned"] * 100, 2) \
+                    if p is not None else None
+                if expected is None:
+                    self.assertTrue(np.isnan(row[f"nday_{n}_r"]))
+                else:
+                    self.assertAlmostEqual(row[f"nday_{n}_r"], expected, places=9)
+                self.assertEqual(row[f"nday_{n}_extra"], extra)
+
+
+class FakeProvider:
+    """
+    A local yfinance stand-in: FLAKY comes back all-NaN in a group, BAD always does, and
+    BOOM makes the whole group request fail.
+    """
+    def __init__(self):
+        self.calls = []
+        self.ranges = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, tickers, start, end):
+        with self.lock:
+            self.calls.append(list(tickers))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.02)
+        with self.lock:
+            self.in_flight -= 1
+        if "BOOM" in tickers and len(tickers) > 1:
+            raise ConnectionError("rate limited")
+        self.ranges.append((start, end))
+        if start is None:
+            df = make_group_frame(list(tickers), days=10)
+        else:
+            # the same prices for a date whatever the requested range
+            dates = pd.bdate_range(start, end, inclusive="left")
+            columns = pd.MultiIndex.from_product([["Close", "High", "Low", "Open", "Volume"], list(tickers)],
+                                                 names=["Price", "Ticker"])
+            values = np.repeat(dates.dayofyear.to_numpy(dtype="f8")[:, None], len(columns), axis=1)
+            df = pd.DataFrame(values, index=pd.Index(dates, name="Date"), columns=columns)
+        for ticker in tickers:
+            if ticker == "BAD" or (ticker == "FLAKY" and len(tickers) > 1):
+                df.loc[:, (slice(None), ticker)] = np.nan
+        return df
+
+
+class TestPriceDownloader(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = PriceStore(os.path.join(self.tmp.name, "prices"))
+        self.registry_path = os.path.join(self.tmp.name, "missing_tickers.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_concurrent_download_with_retries_and_registry(self):
+        provider = FakeProvider()
+        waits = []
+        downloader = PriceDownloader(self.store, provider, MissingTickerRegistry(self.registry_path), max_workers=3,
+                                     chunk_size=3, retries=2, backoff=0.5, requests_per_second=1000,
+                                     sleep=waits.append)
+        tickers = ["AAPL", "FLAKY", "MSFT", "BAD", "NVDA", "TSLA", "BOOM", "AMD", "META"]
+        results = downloader.download(tickers, "2024-04-08", "2024-04-20")
+        self.assertEqual([r["ticker"] for r in results], tickers)
+        status = {r["ticker"]: r["status"] for r in results}
+        self.assertEqual(status["BAD"], STATUS_MISSING)
+        self.assertEqual([t for t, s in status.items() if s == STATUS_OK], [t for t in tickers if t != "BAD"])
+        self.assertGreater(provider.max_in_flight, 1)
+        self.assertIn(["FLAKY"], provider.calls)
+        # BAD: the group, then 2 individual attempts with exponential backoff
+        self.assertEqual(provider.calls.count(["BAD"]), 2)
+        self.assertEqual(waits.count(1.0), 1)
+        self.assertEqual(len(PriceStore(self.store.root)), 8)
+        registry = MissingTickerRegistry(self.registry_path)
+        self.assertEqual(registry.tickers(), ["BAD"])
+        self.assertEqual(registry.entries["BAD"]["attempts"], 3)
+
+        # the next run skips the registry, unless asked to retry it
+        provider.calls.clear()
+        downloader.registry = registry
+        self.assertEqual(downloader.download(["BAD"])[0]["status"], STATUS_SKIPPED)
+        self.assertEqual(provider.calls, [])
+
+    def test_get_stock_info_missing_group(self):
+        provider = FakeProvider()
+        downloader = PriceDownloader(self.store, provider, MissingTickerRegistry(self.registry_path),
+                                     retries=1, requests_per_second=1000, sleep=lambda s: None)
+        codes = [f"T{i:02d}" for i in range(25)]
+        reverse_lut = get_stock_info(codes, "2024-04-08", "2024-04-20", missing_group=1, store=self.store,
+                                     downloader=downloader)
+        self.assertEqual(reverse_lut["T24"], 1)
+        self.assertEqual(self.store.tickers(), codes[20:])
+
+    def test_incremental_gaps(self):
+        self.assertEqual(merge_ranges([("2024-05-01", "2024-05-03"), ("2024-04-01", "2024-05-01"),
+                                       ("2024-06-01", "2024-06-02")]),
+                         [["2024-04-01", "2024-05-03"], ["2024-06-01", "2024-06-02"]])
+        self.assertEqual(missing_ranges([["2024-04-08", "2024-05-01"]], "2024-04-01", "2024-05-03"),
+                         [("2024-04-01", "2024-04-08"), ("2024-05-01", "2024-05-03")])
+        self.assertEqual(missing_ranges([["2024-04-01", "2024-05-03"]], "2024-04-08", "2024-05-01"), [])
+
+        provider = FakeProvider()
+        downloader = PriceDownloader(self.store, provider, MissingTickerRegistry(self.registry_path),
+                                     retries=1, requests_per_second=1000, sleep=lambda s: None)
+        tickers = ["AAPL", "MSFT", "NVDA"]
+        downloader.download(tickers, "2024-04-08", "2024-05-01")
+        self.assertEqual(self.store.catalog["AAPL"]["rows"], 17)
+
+        # extending the window fetches only the two gaps, once for all the tickers
+        provider.calls.clear()
+        provider.ranges.clear()
+        results = downloader.download(tickers + ["AMD"], "2024-04-01", "2024-05-04")
+        self.assertEqual(sorted(provider.ranges), [("2024-04-01", "2024-04-08"), ("2024-04-01", "2024-05-04"),
+                                                   ("2024-05-01", "2024-05-04")])
+        self.assertEqual(provider.calls.count(tickers), 2)
+        self.assertEqual([r["rows"] for r in results], [25, 25, 25, 25])
+        records = self.store.load("MSFT")
+        self.assertTrue((np.diff(records["date"].astype("int64")) > 0).all())
+        self.assertEqual(self.store.coverage("MSFT"), [["2024-04-01", "2024-05-04"]])
+
+        # a weekend has no bar: covered without retries, then cached
+        provider.calls.clear()
+        results = downloader.download(tickers, "2024-05-04", "2024-05-06")
+        self.assertEqual([r["status"] for r in results], [STATUS_OK] * 3)
+        self.assertEqual(provider.calls, [tickers])
+        results = downloader.download(tickers, "2024-04-01", "2024-05-06")
+        self.assertEqual([r["status"] for r in results], [STATUS_CACHED] * 3)
+        self.assertEqual(len(provider.calls), 1)
+        self.assertEqual(len(MissingTickerRegistry(self.registry_path)), 0)
+
+    def test_stored_ticker_missing_a_gap_is_not_registered(self):
+        provider = FakeProvider()
+        halted = {"HALT": ("2024-05-01", "2024-05-08")}
+
+        def fetch(tickers, start, end):
+            df = provider(tickers, start, end)
+            for ticker, (first, last) in halted.items():
+                if ticker in tickers:
+                    df.loc[(df.index >= first) & (df.index < last), (slice(None), ticker)] = np.nan
+            return df
+
+        registry = MissingTickerRegistry(self.registry_path)
+        downloader = PriceDownloader(self.store, fetch, registry, retries=1, requests_per_second=1000,
+                                     sleep=lambda s: None)
+        downloader.download(["AAPL", "HALT"], "2024-03-01", "2024-05-01")
+        rows = self.store.catalog["HALT"]["rows"]
+
+        # the rest of the group has the week, HALT has none even alone
+        results = downloader.download(["AAPL", "HALT"], "2024-03-01", "2024-05-08")
+        self.assertEqual([r["status"] for r in results], [STATUS_OK, STATUS_INCOMPLETE])
+        self.assertEqual(results[1]["rows"], rows)
+        self.assertNotIn("HALT", MissingTickerRegistry(self.registry_path))
+        self.assertEqual(self.store.gaps("HALT", "2024-03-01", "2024-05-08"), [("2024-05-01", "2024-05-08")])
+
+        # the next run fetches the week again, the late bars arrive
+        del halted["HALT"]
+        results = downloader.download(["AAPL", "HALT"], "2024-03-01", "2024-05-15")
+        self.assertEqual([r["status"] for r in results], [STATUS_OK, STATUS_OK])
+        self.assertEqual(self.store.catalog["HALT"]["rows"], rows + 10)
+
+        # a ticker without any stored price is still registered
+        halted["NEW"] = ("2024-01-01", "2025-01-01")
+        results = downloader.download(["AAPL", "NEW"], "2024-03-01", "2024-05-20")
+        self.assertEqual(results[1]["status"], STATUS_MISSING)
+        self.assertIn("NEW", MissingTickerRegistry(self.registry_path))
+
+
+class TestPriceProviders(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = PriceStore(os.path.join(self.tmp.name, "prices"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_synthetic_market(self):
+        calendar = trading_calendar("2024-01-01", "2025-01-01")
+        self.assertEqual(len(calendar), 252)
+        self.assertNotIn(pd.Timestamp("2024-07-04"), calendar)
+        self.assertNotIn(pd.Timestamp("2024-03-29"), calendar)              # Good Friday
+
+        market = SyntheticMarket(seed=7, unknown_rate=0.2, delisting_rate=0.3, nan_run_rate=1.0)
+        tickers = market.tickers(50)
+        df = market.fetch(tickers, "2024-01-01", "2024-07-01")
+        # a ticker's prices do not depend on the range nor on the other tickers
+        alone = market.fetch(["S0003"], "2024-03-01", "2024-04-01")
+        pd.testing.assert_series_equal(alone[("Close", "S0003")], df.loc["2024-03-01":"2024-03-31", ("Close", "S0003")])
+        pd.testing.assert_frame_equal(SyntheticMarket(seed=7, unknown_rate=0.2, delisting_rate=0.3,
+                                                      nan_run_rate=1.0).fetch(tickers, "2024-01-01", "2024-07-01"), df)
+        close = df["Close"]
+        unknown = [t for t in tickers if not market.is_known(t)]
+        self.assertTrue(unknown)
+        self.assertTrue(close[unknown].isna().all().all())
+        self.assertTrue(close.isna().any().sum() > len(unknown))              # NaN runs, gaps and delistings
+        known = close.drop(columns=unknown).stack().dropna()
+        self.assertTrue((known > 0).all())
+        self.assertTrue((df["High"] >= df["Low"])[close.notna()].all().all())
+        self.assertFalse(market.fetch(["SPY"], "2024-01-01", "2024-07-01")["Close"].isna().any().any())
+
+    def test_local_file_provider(self):
+        path = os.path.join(self.tmp.name, "stock_group0_2025_06_08_00_47_58.csv")
+        group = make_group_frame(["AAPL", "NVDA"], days=20)
+        group.to_csv(path, encoding="utf-8-sig")
+        provider = LocalFileProvider(os.path.join(self.tmp.name, "stock_group*.csv"))
+        self.assertEqual(sorted(provider.files), ["AAPL", "NVDA"])
+        frame = get_stock_info_by_ticker("NVDA", provider=provider, start_date="2024-04-10", end_date="2024-04-15")
+        self.assertEqual(list(frame.index), ["2024-04-10", "2024-04-11", "2024-04-12"])
+        self.assertEqual(frame.loc["2024-04-11", "Close"], group.loc["2024-04-11", ("Close", "NVDA")])
+        self.assertIsNone(get_stock_info_by_ticker("MSFT", provider=provider))
+
+        get_stock_info(["AAPL", "NVDA", "MSFT"], "2024-04-08", "2024-05-01", store=self.store, provider=provider)
+        self.assertEqual(self.store.tickers(), ["AAPL", "NVDA"])
+
+    def test_open_ended_download_is_covered(self):
+        downloader = PriceDownloader(self.store, SyntheticMarket(seed=0), requests_per_second=1000)
+        downloader.download(["SPY", "AAA"])
+        entry = self.store.catalog["SPY"]
+        self.assertEqual(self.store.coverage("SPY"), [[entry["start"], str(np.datetime64(entry["end"]) + 1)]])
+        self.assertEqual(self.store.gaps("SPY", "2016-01-01", "2017-01-01"), [])
+        results = downloader.download(["SPY"], "2016-01-01", "2017-01-01")
+        self.assertEqual(results[0]["status"], STATUS_CACHED)
+
+    def test_main1_offline(self):
+        market = SyntheticMarket(seed=3)
+        tickers = [t for t in market.tickers(30) if market.is_known(t)]
+        rng = np.random.default_rng(0)
+        mentions = pd.DataFrame({
+            "stock_code": rng.choice(tickers, 200),
+            "date": rng.choice(trading_calendar("2023-01-01", "2024-06-01").strftime("%Y%m%d").astype(int), 200),
+            "opinion": "positive",
+        })
+        ndays_list = [7, 30]
+        return_info = main1(mentions, ndays_list, store=self.store, provider=market,
+                            missing_file=os.path.join(self.tmp.name, "none.json"))
+        self.assertGreater(len(return_info), 150)
+        for info in return_info[:20]:
+            frame = get_stock_info_by_ticker(info["ticker"], provider=market, start_date="2022-06-01")
+            date = int(info["date_mentioned"].replace("-", "")) - info["extra_days"]
+            mentioned, price_list, extra_day_list = get_return_by_sticker(info["ticker"], date, frame, ndays_list)
+            self.assertEqual(mentioned[2], info["price_on_mentioned"])
+            self.assertEqual(price_list, info["price_list"])
+
+
+if __name__ == "__main__":
+    unittest.main()
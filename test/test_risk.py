@@ -0,0 +1,79 @@
+# create a unit test
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from evaluator import evaluate_mentions, main2
+from service.price_providers import SyntheticMarket, trading_calendar
+from service.prices import PriceStore
+from service.risk import LogReturnSeries, mention_metrics
+from test_portfolio import make_mentions
+
+
+class TestRiskMetrics(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = PriceStore(os.path.join(self.tmp.name, "prices"))
+        self.market = SyntheticMarket(seed=11, nan_run_rate=1.0)
+        mentions = make_mentions(self.market.tickers(12), 150, seed=3)
+        self.matrix = evaluate_mentions(mentions, [7, 30, 90], store=self.store, provider=self.market,
+                                        missing_file=os.path.join(self.tmp.name, "none.json"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_log_return_series(self):
+        rng = np.random.default_rng(0)
+        dates = np.array(trading_calendar("2024-01-01", "2024-04-01"), dtype="datetime64[D]")
+        close = np.exp(np.cumsum(rng.normal(0, 0.02, len(dates)))) * 50
+        series = LogReturnSeries(dates, close)
+        positions, found = series.locate(np.array(["2023-12-31", "2024-01-02", "2024-01-06", "2024-04-01"],
+                                                  dtype="datetime64[D]"))
+        self.assertEqual(found.tolist(), [False, True, True, False])
+        self.assertEqual(positions[1:3].tolist(), [0, 3])                   # Saturday -> Friday
+        start = rng.integers(0, len(dates), 200)
+        end = np.minimum(start + rng.integers(0, 40, 200), len(dates) - 1)
+        expected = [np.log(close[a:b + 1]).min() for a, b in zip(start, end)]
+        np.testing.assert_allclose(series.range_min(start, end), expected)
+        returns = np.diff(np.log(close))
+        np.testing.assert_allclose(series.volatility(np.array([30, 1, 2])),
+                                   [returns[:30].std(ddof=1), np.nan, returns[:2].std(ddof=1)])
+
+    def test_mention_metrics(self):
+        sectors = {"S0001": "XLK"}
+        metrics = mention_metrics(self.matrix, self.store, "SPY", sectors, provider=self.market)
+        np.testing.assert_allclose(metrics["return"], self.matrix.returns(decimals=12), atol=1e-8)
+        self.assertTrue((metrics["max_adverse_excursion"][~np.isnan(metrics["return"])] <= 0).all())
+        for i in range(0, len(self.matrix), 7):
+            ticker = self.matrix.tickers[i]
+            self.assertEqual(metrics["benchmark"][i], "XLK" if ticker == "S0001" else "SPY")
+            close = self.store.frame(ticker)["Close"]
+            benchmark = self.store.frame(metrics["benchmark"][i])["Close"]
+            entry = str(self.matrix.entry_dates[i])
+            for j, n in enumerate(self.matrix.ndays):
+                if np.isnan(self.matrix.prices[i, j]):
+                    self.assertTrue(np.isnan(metrics["excess_return"][i, j]))
+                    continue
+                end = str(self.matrix.entry_dates[i] + n + self.matrix.extra_days[i, j])
+                window = close[entry:end]
+                ret = (window.iloc[-1] / window.iloc[0] - 1) * 100
+                bench = (benchmark[:end].iloc[-1] / benchmark[:entry].iloc[-1] - 1) * 100
+                self.assertAlmostEqual(metrics["excess_return"][i, j], ret - bench, places=8)
+                self.assertAlmostEqual(metrics["max_adverse_excursion"][i, j],
+                                       min(window.min() / window.iloc[0] - 1, 0) * 100, places=8)
+                before = np.diff(np.log(close[:entry].to_numpy()))[-60:]
+                expected = np.log(window.iloc[-1] / window.iloc[0]) / (before.std(ddof=1) * np.sqrt(len(window) - 1)) \
+                    if len(before) >= 2 and len(window) > 1 else np.nan
+                np.testing.assert_allclose(metrics["vol_adjusted"][i, j], expected)
+
+        df = main2(self.matrix, os.path.join(self.tmp.name, "return_info2.csv"), benchmark="SPY", store=self.store)
+        self.assertEqual(list(df.columns[-3:]), ["nday_90_excess", "nday_90_vol_adj", "nday_90_mae"])
+        self.assertEqual(set(df["benchmark"]), {"SPY"})
+        spy_metrics = mention_metrics(self.matrix, self.store, "SPY")
+        np.testing.assert_array_equal(df["nday_30_excess"], np.round(spy_metrics["excess_return"][:, 1], 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
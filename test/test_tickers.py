@@ -0,0 +1,147 @@
+# create a unit test
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+import pandas as pd
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+os.environ["LLM_METRICS_PATH"] = ""
+
+from fillempty import fill_company_codes, fill_stock_codes
+from service.tickers import (SymbolIndex, TickerResolver, load_symbol_master, normalize_company,
+                             METHOD_EXACT, METHOD_FUZZY, METHOD_LLM, METHOD_NORMALIZED, METHOD_TICKER)
+
+
+MASTER_CSV = """name,aliases,ticker,exchange
+PayPal Holdings Inc.,PayPal,PYPL,NASDAQ
+The Walt Disney Company,Disney,DIS,NYSE
+Palantir Technologies Inc.,,PLTR,NASDAQ
+Alphabet Inc. Class A,Google,GOOGL,NASDAQ
+Alphabet Inc. Class C,Google,GOOG,NASDAQ
+Advanced Micro Devices Inc.,AMD,AMD,NASDAQ
+"""
+NASDAQ_LISTED = """Symbol|Security Name|Market Category|Test Issue|Financial Status|Round Lot Size|ETF|NextShares
+NVDA|NVIDIA Corporation - Common Stock|Q|N|N|100|N|N
+ZXZZT|NASDAQ TEST STOCK|G|Y|N|100|N|N
+File Creation Time: 0618202521:32|||||||
+"""
+
+
+class TestTickerResolver(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.master = os.path.join(self.tmp.name, "symbol_master.csv")
+        with open(self.master, "w", encoding="utf-8") as f:
+            f.write(MASTER_CSV)
+        self.resolutions = os.path.join(self.tmp.name, "ticker_resolutions.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_master_formats_and_matching(self):
+        nasdaq = os.path.join(self.tmp.name, "nasdaqlisted.txt")
+        with open(nasdaq, "w", encoding="utf-8") as f:
+            f.write(NASDAQ_LISTED)
+        self.assertEqual(load_symbol_master(nasdaq), [{"name": "NVIDIA Corporation", "aliases": [],
+                                                       "ticker": "NVDA", "exchange": "NASDAQ"}])
+        self.assertEqual(normalize_company("The Walt Disney Company"), "walt disney")
+
+        index = SymbolIndex(load_symbol_master(self.master) + load_symbol_master(nasdaq))
+        self.assertEqual(index.lookup("paypal")[:2], ({("PYPL", "NASDAQ")}, METHOD_EXACT))
+        self.assertEqual(index.lookup("Palantir Corp")[:2], ({("PLTR", "NASDAQ")}, METHOD_NORMALIZED))
+        self.assertEqual(index.lookup("Nvidia")[:2], ({("NVDA", "NASDAQ")}, METHOD_NORMALIZED))
+        self.assertEqual(index.lookup("PLTR")[:2], ({("PLTR", "NASDAQ")}, METHOD_TICKER))
+        targets, method, score = index.lookup("Palantirr")
+        self.assertEqual((targets, method), ({("PLTR", "NASDAQ")}, METHOD_FUZZY))
+        self.assertGreaterEqual(score, 0.8)
+        self.assertEqual(len(index.lookup("Google")[0]), 2)      # two share classes: ambiguous
+        self.assertEqual(index.lookup("Rivian")[0], set())
+
+    def test_resolutions_persist_and_llm_fallback(self):
+        asked = []
+
+        def lookup(names, llm_model):
+            asked.append(list(names))
+            return "```json\n" + json.dumps([{"company": n, "ticker": "GOOGL" if n == "Google" else "N/A",
+                                              "exchange": "NASDAQ"} for n in names]) + "\n```"
+
+        resolver = TickerResolver.from_master(self.master, self.resolutions)
+        names = ["PayPal", "Disney", "Google", "Palantirr", "Rivian", "PayPal"]
+        result = fill_company_codes(names, resolver=resolver, lookup=lookup)
+        self.assertEqual(asked, [["Google", "Rivian"]])
+        self.assertEqual({r["company"]: r["ticker"] for r in result},
+                         {"PayPal": "PYPL", "Disney": "DIS", "Palantirr": "PLTR", "Google": "GOOGL", "Rivian": "N/A"})
+
+        # a new run resolves everything but the unknown name without the master
+        resolver = TickerResolver(None, self.resolutions)
+        resolved, unresolved = resolver.resolve_all(names)
+        self.assertEqual(unresolved, ["Rivian"])
+        self.assertEqual([r["method"] for r in resolved if r["company"] == "Google"], [METHOD_LLM])
+
+    def test_concurrent_chunks_dedupe_and_bisect(self):
+        lock = threading.Lock()
+        asked = []
+        in_flight = [0, 0]
+
+        def lookup(names, llm_model):
+            with lock:
+                asked.append(list(names))
+                in_flight[0] += 1
+                in_flight[1] = max(in_flight)
+            time.sleep(0.05)
+            with lock:
+                in_flight[0] -= 1
+            if "Broken Co" in names:
+                return "I could not find these companies."
+            return json.dumps([{"company": n.upper(), "ticker": n.split()[0][:4].upper(), "exchange": "NYSE"}
+                               for n in names])
+
+        resolver = TickerResolver(None, self.resolutions)
+        names = [f"Company{i} Inc." for i in range(12)] + ["company3", "Broken Co", "Company5 Corp"]
+        result = fill_company_codes(names, resolver=resolver, lookup=lookup, chunk_size=4, max_workers=3,
+                                    requests_per_minute=6000)
+        by_name = {r["company"]: r["ticker"] for r in result}
+        # the variants of a name are asked once and answered for every spelling
+        self.assertEqual(sum(len(chunk) for chunk in asked if "Broken Co" not in chunk), 12)
+        self.assertEqual(by_name["company3"], "COMP")
+        self.assertEqual(by_name["Company5 Corp"], by_name["Company5 Inc."])
+        self.assertNotIn("Broken Co", by_name)
+        self.assertEqual(len(by_name), 14)
+        # the bad chunk was bisected down to the bad name
+        self.assertIn(["Broken Co"], asked)
+        self.assertGreater(in_flight[1], 1)
+        self.assertEqual(TickerResolver(None, self.resolutions).resolve("Company11")["ticker"], "COMP")
+
+    def test_failed_chunk_keeps_other_answers(self):
+        def lookup(names, llm_model=None):
+            if "Down Co" in names:
+                raise RuntimeError("connection reset")
+            return json.dumps([{"company": n, "ticker": n[:4].upper(), "exchange": "NYSE"} for n in names])
+
+        names = [f"Company{i} Inc." for i in range(6)] + ["Down Co"]
+        result = fill_company_codes(names, resolver=TickerResolver(None, self.resolutions), lookup=lookup,
+                                    chunk_size=3, max_workers=2, requests_per_minute=None)
+        self.assertEqual(len(result), 6)
+        self.assertNotIn("Down Co", {r["company"] for r in result})
+        # the answers of the other chunks were saved
+        resolver = TickerResolver(None, self.resolutions)
+        self.assertEqual(resolver.resolve("Company0 Inc.")["ticker"], "COMP")
+        self.assertIsNone(resolver.resolve("Down Co"))
+
+    def test_fill_stock_codes(self):
+        resolver = TickerResolver.from_master(self.master, self.resolutions)
+        resolver.remember("Rivian", "RIVN", "NASDAQ")
+        df = pd.DataFrame({"stock": ["PayPal", "Rivian", "Tesla", "Disney", "Unknown Co"],
+                           "stock_code": ["N/A", None, "TSLA", "", "N/A"]})
+        filled, empty = fill_stock_codes(df, resolver)
+        self.assertEqual(filled["stock_code"].tolist(), ["PYPL", "RIVN", "TSLA", "DIS", "N/A"])
+        self.assertEqual(empty, ["Unknown Co"])
+        self.assertEqual(df["stock_code"].tolist()[0], "N/A")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+# create a unit test
+import io
+import os
+import tempfile
+import unittest
+
+from service.helper import clean_vtt_to_script
+from service.segments import TranscriptSegments, clean_vtt_file_with_segments, segments_path_for
+from service.vtt import VttCleaner, clean_vtt, clean_vtt_file, iter_chunked_lines, iter_clean_vtt, parse_timestamp
+
+
+ROLLING_VTT = """WEBVTT
+Kind: captions
+Language: en
+
+00:00:00.080 --> 00:00:02.590 align:start position:0%
+
+hey<00:00:00.400><c> guys</c><00:00:00.640><c> welcome</c><00:00:01.000><c> back</c>
+
+00:00:02.590 --> 00:00:02.600 align:start position:0%
+hey guys welcome back
+
+
+00:00:02.600 --> 00:00:05.110 align:start position:0%
+hey guys welcome back
+today<00:00:03.000><c> we</c><00:00:03.200><c> talk</c><00:00:03.500><c> about</c><00:00:04.000><c> tesla</c>
+
+00:00:05.110 --> 00:00:05.120 align:start position:0%
+today we talk about tesla
+
+
+NOTE this block is a comment
+
+00:00:05.120 --> 00:00:07.000 align:start position:0%
+about tesla and nvidia &amp; apple .
+"""
+
+
+class TestVtt(unittest.TestCase):
+    def test_rolling_captions_collapsed(self):
+        cleaned = clean_vtt(ROLLING_VTT)
+        self.assertEqual(cleaned, "hey guys welcome back today we talk about tesla and nvidia & apple.")
+        old = clean_vtt_to_script(ROLLING_VTT, is_file_path=False)
+        self.assertLess(len(cleaned), len(old))
+
+    def test_sources_give_same_result(self):
+        expected = clean_vtt(ROLLING_VTT)
+        self.assertEqual(clean_vtt(ROLLING_VTT.splitlines()), expected)
+        self.assertEqual(clean_vtt(io.StringIO(ROLLING_VTT)), expected)
+        with tempfile.TemporaryDirectory() as tmp:
+            vtt_file = os.path.join(tmp, "a.en.vtt")
+            txt_file = os.path.join(tmp, "a.txt")
+            with open(vtt_file, "w", encoding="utf-8") as f:
+                f.write(ROLLING_VTT)
+            self.assertEqual(clean_vtt(vtt_file), expected)
+            self.assertEqual(clean_vtt_file(vtt_file, txt_file), len(expected))
+            with open(txt_file, "r", encoding="utf-8") as f:
+                self.assertEqual(f.read(), expected)
+        self.assertEqual("".join(iter_clean_vtt(ROLLING_VTT)), expected)
+
+    def test_chunked_lines(self):
+        chunks = ["WEB", "VTT\n\n00:00:00.000 --> 00:00:01", ".000\nhel", "lo\n"]
+        self.assertEqual(list(iter_chunked_lines(chunks)),
+                         ["WEBVTT", "", "00:00:00.000 --> 00:00:01.000", "hello"])
+
+    def test_short_overlap_kept(self):
+        # a single repeated word at a line boundary is a real repetition, not caption overlap
+        cleaner = VttCleaner()
+        pieces = [cleaner.feed(line) for line in ["00:00:00.000 --> 00:00:01.000", "i know that",
+                                                  "that is true", "is true"]]
+        self.assertEqual("".join(pieces), "i know that that is true")
+        self.assertEqual((cleaner.cue_start, cleaner.cue_end), (0, 1000))
+
+    def test_parse_timestamp(self):
+        self.assertEqual(parse_timestamp("01:02:03.456"), 3723456)
+        self.assertEqual(parse_timestamp("02:03.5"), 123500)
+
+
+class TestSegments(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        vtt_file = os.path.join(self.tmp.name, "20250601_abc.en.vtt")
+        self.txt_file = os.path.join(self.tmp.name, "20250601_abc.txt")
+        with open(vtt_file, "w", encoding="utf-8") as f:
+            f.write(ROLLING_VTT.replace("nvidia", "nvidiä"))
+        self.seg_file = clean_vtt_file_with_segments(vtt_file, self.txt_file)
+        with open(self.txt_file, "r", encoding="utf-8") as f:
+            self.text = f.read()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_index_matches_text(self):
+        self.assertEqual(self.seg_file, segments_path_for(self.txt_file))
+        segs = TranscriptSegments(self.txt_file)
+        self.assertEqual(len(segs), 3)
+        self.assertEqual(segs.total_chars, len(self.text))
+        self.assertEqual(list(segs.start_ms), [80, 2600, 5120])
+        self.assertEqual(segs.segment(1)["text"], "today we talk about tesla")
+        for start, end in [(0, 5), (10, 40), (30, len(self.text)), (50, 60)]:
+            self.assertEqual(segs.slice_chars(start, end), self.text[start:end])
+
+    def test_time_lookups(self):
+        segs = TranscriptSegments(self.txt_file)
+        window = segs.slice_time(3000, 4000)
+        self.assertEqual(window["text"], "today we talk about tesla")
+        self.assertEqual((window["start_ms"], window["end_ms"]), (2600, 5110))
+        self.assertEqual(segs.slice_time(0, 10000)["text"], self.text)
+        self.assertIsNone(segs.slice_time(8000, 9000))
+
+        found = segs.locate("nvidiä & apple")
+        self.assertEqual(found["start_ms"], 5120)
+        self.assertEqual(self.text[found["char_start"]:].split()[0], "nvidiä")
+        self.assertEqual(segs.locate("TODAY we")["start_ms"], 2600)
+        self.assertIsNone(segs.locate("microsoft"))
+
+    def test_windows_cover_text(self):
+        segs = TranscriptSegments(self.txt_file)
+        windows = list(segs.iter_windows(max_chars=30, overlap_chars=5))
+        self.assertEqual(windows[0]["char_start"], 0)
+        self.assertEqual(windows[-1]["char_end"], len(self.text))
+        for w in windows:
+            self.assertEqual(w["text"], self.text[w["char_start"]:w["char_end"]].strip())
+        for max_chars in (20, 30, 40):
+            for w in segs.iter_windows(max_chars=max_chars):
+                # only a single segment may be longer than the budget
+                if segs.segment_at_char(w["char_end"] - 1) > segs.segment_at_char(w["char_start"]):
+                    self.assertLessEqual(w["char_end"] - w["char_start"], max_chars)
+
+
+if __name__ == "__main__":
+    unittest.main()